@@ -0,0 +1,74 @@
+import io
+from contextlib import redirect_stdout
+from datetime import timedelta
+
+from django.utils import timezone
+
+from assessments.models import Answer, Assessment, Question
+from classrooms.models import Batch, Classroom, Department
+from users.models import Student, Teacher, User
+
+
+def quiet_views():
+    """Swallow the debug output the views print, so it does not break up a report."""
+    return redirect_stdout(io.StringIO())
+
+
+def seed_classroom(label, student_count):
+    """Create a teacher, a department batch with ``student_count`` students and a classroom."""
+    teacher_user = User.objects.create_user(
+        email=f"teacher-{label}@bdu.edu.et", password="benchmark", role="teacher"
+    )
+    teacher = Teacher.objects.create(
+        user=teacher_user, first_name="Bench", last_name="Teacher", phone="0", faculty="Bench"
+    )
+    department = Department.objects.create(name=f"Benchmark {label}")
+    batch = Batch.objects.create(section="A", year=1, department=department)
+    classroom = Classroom.objects.create(
+        name=f"Benchmark {label}", courseNo=f"BM-{label}", description="", teacher=teacher
+    )
+    classroom.batches.add(batch)
+
+    users = User.objects.bulk_create([
+        User(email=f"student-{label}-{i}@bdu.edu.et", role="student")
+        for i in range(student_count)
+    ])
+    students = Student.objects.bulk_create([
+        Student(user=user, student_id=f"BM{i}", first_name="Bench", last_name=str(i), phone="0", batch=batch)
+        for i, user in enumerate(users)
+    ])
+    return classroom, students
+
+
+def seed_assessment(classroom, question_count, options_per_question=4):
+    """Create a published multiple choice assessment; the first option is always correct."""
+    assessment = Assessment.objects.create(
+        name=f"Benchmark {question_count} questions",
+        tag="benchmark",
+        classroom=classroom,
+        is_published=True,
+        deadline=timezone.now() + timedelta(days=1),
+    )
+    questions = Question.objects.bulk_create([
+        Question(text=f"Question {i}", weight=1.0, assessment=assessment)
+        for i in range(question_count)
+    ])
+    Answer.objects.bulk_create([
+        Answer(question=question, text=f"Option {j}", is_correct=(j == 0))
+        for question in questions
+        for j in range(options_per_question)
+    ])
+    return assessment
+
+
+def build_answers(assessment, correct_every=2):
+    """Answer every ``correct_every``-th question correctly and the rest with a wrong option."""
+    answers = {}
+    options = Answer.objects.filter(question__assessment=assessment).order_by("question_id", "id")
+    by_question = {}
+    for option in options:
+        by_question.setdefault(option.question_id, []).append(option)
+    for i, (question_id, question_options) in enumerate(sorted(by_question.items())):
+        chosen = question_options[0] if i % correct_every == 0 else question_options[-1]
+        answers[str(question_id)] = str(chosen.id)
+    return answers
@@ -0,0 +1,110 @@
+import statistics
+import time
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from assessments.models import Submission
+from assessments.services.grading_service import GradingService
+from assessments.views import AddSubmissionView
+
+from ._seed import build_answers, quiet_views, seed_assessment, seed_classroom
+
+
+def naive_score(assessment, answers):
+    """The per-question grading loop AddSubmissionView used before the answer-key index."""
+    total_score = 0
+    for question in assessment.questions.all().order_by("id"):
+        response = answers.get(str(question.id))
+        if not response:
+            continue
+        if question.question_type == "multiple_choice":
+            correct = question.answers.filter(is_correct=True).first()
+            if correct and str(correct.id) == response:
+                total_score += question.weight
+    return total_score
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark queries and latency per submission: the old per-question grading loop, "
+        "the answer-key index, a full AddSubmissionView request (cold cache first) and "
+        "per-submission cost of scoring the whole assessment in one vectorized pass. "
+        "Runs against a throwaway test database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--questions", type=int, nargs="+", default=[10, 50, 200])
+        parser.add_argument("--submissions", type=int, default=20)
+
+    def handle(self, *args, **options):
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            self.stdout.write(
+                f"{'questions':>9} {'path':>8} {'queries':>8} {'p50 ms':>8} {'mean ms':>8}"
+            )
+            for question_count in options["questions"]:
+                self.run_case(question_count, options["submissions"])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def run_case(self, question_count, submission_count):
+        classroom, students = seed_classroom(f"q{question_count}", submission_count)
+        assessment = seed_assessment(classroom, question_count)
+        answers = build_answers(assessment)
+        cache.delete(GradingService.answer_key_cache_key(assessment.id))
+
+        naive = self.measure(lambda: naive_score(assessment, answers), submission_count)
+        self.report(question_count, "naive", *naive)
+
+        def indexed_score():
+            answer_key = GradingService.get_answer_key(assessment.id)
+            return GradingService.score_submission(answer_key, answers)
+
+        assert indexed_score() == naive_score(assessment, answers)
+        indexed = self.measure(indexed_score, submission_count)
+        self.report(question_count, "indexed", *indexed)
+
+        factory = APIRequestFactory()
+        view = AddSubmissionView.as_view()
+        pending = iter(students)
+
+        def submit():
+            student = next(pending)
+            request = factory.post(
+                "/add-submission/",
+                {"studentId": student.id, "assessmentId": assessment.id, "answers": answers},
+                format="json",
+            )
+            force_authenticate(request, user=student.user)
+            with quiet_views():
+                response = view(request, classroom_id=classroom.id)
+            assert response.status_code == 201, response.data
+
+        cache.delete(GradingService.answer_key_cache_key(assessment.id))
+        request_stats = self.measure(submit, submission_count)
+        self.report(question_count, "view", *request_stats)
+        assert Submission.objects.filter(assessment=assessment).count() == submission_count
+
+        def batch_score():
+            submissions = Submission.objects.filter(assessment=assessment).values_list("answers", "graded_details")
+            GradingService.score_submissions(GradingService.get_answer_key(assessment.id), list(submissions))
+
+        queries, p50, mean = self.measure(batch_score, 3)
+        self.report(question_count, "batch", queries, p50 / submission_count, mean / submission_count)
+
+    def measure(self, func, repeat):
+        timings, queries = [], []
+        for _ in range(repeat):
+            with CaptureQueriesContext(connection) as ctx:
+                start = time.perf_counter()
+                func()
+                timings.append((time.perf_counter() - start) * 1000)
+            queries.append(len(ctx.captured_queries))
+        return statistics.median(queries), statistics.median(timings), statistics.mean(timings)
+
+    def report(self, question_count, path, queries, p50, mean):
+        self.stdout.write(f"{question_count:>9} {path:>8} {queries:>8.0f} {p50:>8.2f} {mean:>8.2f}")
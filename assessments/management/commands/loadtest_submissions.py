@@ -0,0 +1,145 @@
+import math
+import os
+import queue
+import statistics
+import tempfile
+import threading
+import time
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from assessments.models import Submission
+from assessments.services.grading_service import GradingService
+
+from ._seed import build_answers, quiet_views, seed_assessment, seed_classroom
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100 * len(values)))
+    return values[rank - 1]
+
+
+class Command(BaseCommand):
+    help = (
+        "Replay a deadline-rush submission storm: seed a classroom with N students and an "
+        "M-question assessment, then have every student POST add-submission concurrently "
+        "through the test client with a real JWT. Reports p50/p95/p99 latency, queries per "
+        "request and throughput for each concurrency level. Runs against a throwaway test "
+        "database on the configured engine (a file-backed one for SQLite, so threads share it)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--students", type=int, default=200)
+        parser.add_argument("--questions", type=int, default=50)
+        parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+        parser.add_argument(
+            "--warm-cache", action="store_true",
+            help="Build the answer key before the storm instead of letting the first requests race for it.",
+        )
+
+    def handle(self, *args, **options):
+        settings_dict = connection.settings_dict
+        old_name, old_test_name = settings_dict["NAME"], settings_dict["TEST"]["NAME"]
+        temp_dir = None
+        if connection.vendor == "sqlite":
+            # The default in-memory test database cannot be shared across threads.
+            temp_dir = tempfile.TemporaryDirectory()
+            settings_dict["TEST"]["NAME"] = os.path.join(temp_dir.name, "loadtest.sqlite3")
+            settings_dict["OPTIONS"].setdefault("timeout", 30)
+            settings_dict["OPTIONS"].setdefault("transaction_mode", "IMMEDIATE")
+
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            self.stdout.write(
+                f"{connection.vendor}: {options['students']} students, {options['questions']} questions"
+            )
+            self.stdout.write(
+                f"{'conc':>5} {'ok':>6} {'errors':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+                f"{'q/req':>6} {'q max':>6} {'req/s':>8}"
+            )
+            errors = sum(
+                self.run_case(concurrency, options["students"], options["questions"], options["warm_cache"])
+                for concurrency in options["concurrency"]
+            )
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            settings_dict["TEST"]["NAME"] = old_test_name
+            if temp_dir is not None:
+                temp_dir.cleanup()
+        if errors:
+            raise CommandError(f"{errors} submission(s) failed; the latencies above only cover the rest.")
+
+    def run_case(self, concurrency, student_count, question_count, warm_cache):
+        classroom, students = seed_classroom(f"c{concurrency}", student_count)
+        assessment = seed_assessment(classroom, question_count)
+        answers = build_answers(assessment)
+        cache.delete(GradingService.answer_key_cache_key(assessment.id))
+        if warm_cache:
+            GradingService.get_answer_key(assessment.id)
+
+        url = reverse("add-submission", kwargs={"classroom_id": classroom.id})
+        pending = queue.Queue()
+        for student in students:
+            pending.put((student.id, str(AccessToken.for_user(student.user))))
+
+        results = []
+        results_lock = threading.Lock()
+        start_barrier = threading.Barrier(concurrency + 1)
+
+        def worker():
+            # A host from ALLOWED_HOSTS; the test client's default "testserver" is only
+            # allowed under the test runner. Crashing requests count as errors (500s).
+            client = APIClient(SERVER_NAME="localhost", raise_request_exception=False)
+            samples = []
+            try:
+                start_barrier.wait()
+                while True:
+                    try:
+                        student_id, token = pending.get_nowait()
+                    except queue.Empty:
+                        break
+                    body = {"studentId": student_id, "assessmentId": assessment.id, "answers": answers}
+                    with CaptureQueriesContext(connections["default"]) as ctx:
+                        started = time.perf_counter()
+                        response = client.post(url, body, format="json", HTTP_AUTHORIZATION=f"Bearer {token}")
+                        elapsed = (time.perf_counter() - started) * 1000
+                    samples.append((response.status_code, elapsed, len(ctx.captured_queries)))
+            finally:
+                connections.close_all()
+                with results_lock:
+                    results.extend(samples)
+
+        threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        with quiet_views():
+            start_barrier.wait()
+            started = time.perf_counter()
+            for thread in threads:
+                thread.join()
+            wall_seconds = time.perf_counter() - started
+
+        ok = [(elapsed, queries) for code, elapsed, queries in results if code == 201]
+        errors = len(results) - len(ok)
+        latencies = sorted(elapsed for elapsed, _ in ok)
+        query_counts = [queries for _, queries in ok]
+        stored = Submission.objects.filter(assessment=assessment).count()
+        if stored != len(ok):
+            self.stderr.write(f"{stored} submissions stored for {len(ok)} successful requests")
+
+        self.stdout.write(
+            f"{concurrency:>5} {len(ok):>6} {errors:>6} "
+            f"{percentile(latencies, 50):>8.2f} {percentile(latencies, 95):>8.2f} {percentile(latencies, 99):>8.2f} "
+            f"{statistics.mean(query_counts) if query_counts else 0:>6.1f} {max(query_counts, default=0):>6} "
+            f"{len(ok) / wall_seconds if wall_seconds else 0:>8.1f}"
+        )
+        return errors
@@ -0,0 +1,62 @@
+import math
+
+from django.core.management.base import BaseCommand, CommandError
+
+from assessments.models import Assessment, AssessmentScoreChange, AssessmentStats
+
+FIELDS = ("count", "score_sum", "score_sum_squares", "min_score", "max_score", "histogram")
+
+
+def drifted_fields(stored, fresh, tolerance=1e-6):
+    drift = []
+    for field in FIELDS:
+        stored_value, fresh_value = getattr(stored, field), getattr(fresh, field)
+        if isinstance(fresh_value, float) and isinstance(stored_value, float):
+            if not math.isclose(stored_value, fresh_value, rel_tol=tolerance, abs_tol=tolerance):
+                drift.append(field)
+        elif stored_value != fresh_value:
+            drift.append(field)
+    return drift
+
+
+class Command(BaseCommand):
+    help = "Rebuild AssessmentStats from the submissions table, or with --check only report drift."
+
+    def add_arguments(self, parser):
+        parser.add_argument("assessment_ids", nargs="*", type=int, help="Limit to these assessments.")
+        parser.add_argument("--check", action="store_true", help="Report drift without writing.")
+
+    def handle(self, *args, **options):
+        assessments = Assessment.objects.order_by("id")
+        if options["assessment_ids"]:
+            assessments = assessments.filter(id__in=options["assessment_ids"])
+        stored_rows = AssessmentStats.objects.in_bulk(field_name="assessment_id")
+        pending = AssessmentStats.pending_changes(list(stored_rows)) if options["check"] else {}
+
+        drifted = 0
+        for assessment_id in assessments.values_list("id", flat=True):
+            if not options["check"]:
+                AssessmentStats.rebuild(assessment_id)
+                continue
+
+            fresh = AssessmentStats.recompute(assessment_id)
+            stored = stored_rows.get(assessment_id)
+            if stored is None:
+                drift = ["missing"] if fresh.count else []
+            else:
+                # Logged changes not folded yet are not drift.
+                stored.apply_changes((old, new) for _, old, new in pending.get(assessment_id, []))
+                drift = drifted_fields(stored, fresh)
+            if drift:
+                drifted += 1
+                self.stdout.write(f"Assessment {assessment_id}: drift in {', '.join(drift)}")
+
+        if not options["check"]:
+            if not options["assessment_ids"]:
+                # Changes logged by submissions deleted along with their assessment.
+                AssessmentScoreChange.objects.exclude(assessment_id__in=Assessment.objects.values("id")).delete()
+            self.stdout.write(self.style.SUCCESS(f"Rebuilt stats for {assessments.count()} assessment(s)."))
+        elif drifted:
+            raise CommandError(f"{drifted} assessment(s) have drifted stats; run without --check to rebuild.")
+        else:
+            self.stdout.write(self.style.SUCCESS("No drift found."))
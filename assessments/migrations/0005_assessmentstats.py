@@ -0,0 +1,45 @@
+# Generated by Django 5.2.1 on 2026-10-18 12:53
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_assessment_stats(apps, schema_editor):
+    Submission = apps.get_model('assessments', 'Submission')
+    AssessmentStats = apps.get_model('assessments', 'AssessmentStats')
+
+    stats = {}
+    for assessment_id, score in Submission.objects.values_list('assessment_id', 'score').iterator():
+        row = stats.setdefault(assessment_id, AssessmentStats(assessment_id=assessment_id, histogram={}))
+        key = repr(float(score))
+        row.histogram[key] = row.histogram.get(key, 0) + 1
+        row.count += 1
+        row.score_sum += score
+        row.score_sum_squares += score * score
+        row.min_score = score if row.min_score is None else min(row.min_score, score)
+        row.max_score = score if row.max_score is None else max(row.max_score, score)
+    AssessmentStats.objects.bulk_create(stats.values(), batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('assessments', '0004_submission_graded_details'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AssessmentStats',
+            fields=[
+                ('assessment', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='assessments.assessment')),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('score_sum', models.FloatField(default=0)),
+                ('score_sum_squares', models.FloatField(default=0)),
+                ('min_score', models.FloatField(blank=True, null=True)),
+                ('max_score', models.FloatField(blank=True, null=True)),
+                ('histogram', models.JSONField(blank=True, default=dict)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(backfill_assessment_stats, migrations.RunPython.noop),
+    ]
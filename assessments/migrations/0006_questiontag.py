@@ -0,0 +1,39 @@
+# Generated by Django 5.2.1 on 2026-10-18 12:54
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_question_tags(apps, schema_editor):
+    Question = apps.get_model('assessments', 'Question')
+    QuestionTag = apps.get_model('assessments', 'QuestionTag')
+
+    rows = []
+    for question_id, assessment_id, tags in Question.objects.values_list('id', 'assessment_id', 'tags').iterator():
+        for tag in dict.fromkeys(tag[:255] for tag in tags or [] if isinstance(tag, str) and tag):
+            rows.append(QuestionTag(question_id=question_id, assessment_id=assessment_id, tag=tag))
+    QuestionTag.objects.bulk_create(rows, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('assessments', '0005_assessmentstats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuestionTag',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tag', models.CharField(max_length=255)),
+                ('assessment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='question_tags', to='assessments.assessment')),
+                ('question', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tag_index', to='assessments.question')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['tag', 'assessment'], name='assessments_tag_b19507_idx')],
+                'unique_together': {('question', 'tag')},
+            },
+        ),
+        migrations.RunPython(backfill_question_tags, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.1 on 2026-10-18 13:37
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('assessments', '0006_questiontag'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AssessmentScoreChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('old_score', models.FloatField(blank=True, null=True)),
+                ('new_score', models.FloatField(blank=True, null=True)),
+                ('assessment', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='assessments.assessment')),
+            ],
+        ),
+    ]
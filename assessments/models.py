@@ -1,4 +1,8 @@
-from django.db import models
+import math
+
+from django.db import models, transaction
+from django.db.models import Count, Value
+from django.utils import timezone
 from classrooms.models import Classroom
 from users.models import Teacher, Student
 
@@ -37,6 +41,31 @@ class Question(models.Model):
     def __str__(self):
         return self.text
 
+class QuestionTag(models.Model):
+    """Normalized copy of Question.tags so tag lookups can use an index."""
+    question = models.ForeignKey(Question, on_delete=models.CASCADE, related_name='tag_index')
+    assessment = models.ForeignKey(Assessment, on_delete=models.CASCADE, related_name='question_tags')
+    tag = models.CharField(max_length=255)
+
+    class Meta:
+        unique_together = ('question', 'tag')
+        indexes = [
+            models.Index(fields=['tag', 'assessment']),
+        ]
+
+    def __str__(self):
+        return self.tag
+
+    @classmethod
+    def sync_question(cls, question):
+        cls.objects.filter(question=question).delete()
+        cls.objects.bulk_create([
+            cls(question_id=question.id, assessment_id=question.assessment_id, tag=tag)
+            for tag in dict.fromkeys(
+                tag[:255] for tag in question.tags or [] if isinstance(tag, str) and tag
+            )
+        ])
+
 class Answer(models.Model):
     question = models.ForeignKey(Question, on_delete=models.CASCADE, related_name='answers')
     text = models.CharField(max_length=255)
@@ -63,28 +92,233 @@ class Submission(models.Model):
     def __str__(self):
         return f"{self.student} - {self.assessment.name}"
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored score so AssessmentStats can apply the difference on save.
+        if 'score' in field_names:
+            instance._loaded_score = instance.score
+        return instance
+
     def calculate_total_score(self):
-        new_total_score = 0
-        assessment_questions = self.assessment.questions.all().prefetch_related('answers')
-
-        for question in assessment_questions:
-            if question.question_type == 'multiple_choice':
-                student_answer_id = self.answers.get(str(question.id))
-                correct_answer_option = question.answers.filter(is_correct=True).first()
-                if correct_answer_option and student_answer_id == str(correct_answer_option.id):
-                    new_total_score += question.weight
-        
-        if self.graded_details:
-            for question_id_str, assigned_score in self.graded_details.items():
-                try:
-                    question = Question.objects.get(id=question_id_str)
-                    if question.question_type == 'short_answer':
-                         if isinstance(assigned_score, (int, float)):
-                            new_total_score += assigned_score
-                except Question.DoesNotExist:
-                    pass
-                except ValueError:
-                    pass
-
-
-        self.score = new_total_score
+        from assessments.services.grading_service import GradingService
+
+        answer_key = GradingService.get_answer_key(self.assessment_id)
+        self.score = GradingService.score_submission(answer_key, self.answers, self.graded_details)
+
+
+class AssessmentStats(models.Model):
+    """
+    Running score statistics for an assessment, kept in step with its submissions so
+    analytics never rescan them. The histogram maps each distinct score to its count.
+    Submission writes only log their changes (``AssessmentScoreChange``); readers
+    fold the log into the row with ``fold_pending``.
+    """
+    assessment = models.OneToOneField(Assessment, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    count = models.PositiveIntegerField(default=0)
+    score_sum = models.FloatField(default=0)
+    score_sum_squares = models.FloatField(default=0)
+    min_score = models.FloatField(null=True, blank=True)
+    max_score = models.FloatField(null=True, blank=True)
+    histogram = models.JSONField(default=dict, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    STAT_FIELDS = ['count', 'score_sum', 'score_sum_squares', 'min_score', 'max_score', 'histogram', 'updated_at']
+
+    def __str__(self):
+        return f"Stats for assessment {self.assessment_id}"
+
+    @staticmethod
+    def histogram_key(score):
+        return repr(float(score))
+
+    def apply_changes(self, changes):
+        """Apply (old_score, new_score) pairs; None means no score on that side."""
+        for old_score, new_score in changes:
+            if old_score is not None:
+                key = self.histogram_key(old_score)
+                remaining = self.histogram.get(key, 0) - 1
+                if remaining > 0:
+                    self.histogram[key] = remaining
+                else:
+                    self.histogram.pop(key, None)
+                self.count -= 1
+                self.score_sum -= old_score
+                self.score_sum_squares -= old_score * old_score
+            if new_score is not None:
+                key = self.histogram_key(new_score)
+                self.histogram[key] = self.histogram.get(key, 0) + 1
+                self.count += 1
+                self.score_sum += new_score
+                self.score_sum_squares += new_score * new_score
+
+        scores = [float(key) for key in self.histogram]
+        self.min_score = min(scores) if scores else None
+        self.max_score = max(scores) if scores else None
+        if not self.count:
+            self.score_sum = self.score_sum_squares = 0
+
+    @staticmethod
+    def record_score_changes(assessment_id, changes):
+        """
+        Log score changes for a later ``fold_pending``. This is a plain insert, so
+        concurrent submissions to one assessment never wait on its stats row.
+        """
+        AssessmentScoreChange.objects.bulk_create([
+            AssessmentScoreChange(assessment_id=assessment_id, old_score=old, new_score=new)
+            for old, new in changes
+            if old != new
+        ])
+
+    @staticmethod
+    def pending_changes(assessment_ids):
+        """{assessment_id: [(change_id, old_score, new_score)]} of logged changes not yet folded."""
+        pending = {}
+        rows = AssessmentScoreChange.objects.filter(assessment_id__in=assessment_ids).order_by('id')
+        for change_id, assessment_id, old_score, new_score in rows.values_list(
+            'id', 'assessment_id', 'old_score', 'new_score'
+        ):
+            pending.setdefault(assessment_id, []).append((change_id, old_score, new_score))
+        return pending
+
+    @classmethod
+    def fold_pending(cls, **filters):
+        """
+        Fold the logged changes matching ``filters`` into their stats rows, locking
+        each row only for the fold. Assessments that have no row yet get one built
+        from their submissions.
+        """
+        assessment_ids = set(
+            AssessmentScoreChange.objects.filter(**filters).values_list('assessment_id', flat=True).distinct()
+        )
+        if not assessment_ids:
+            return
+        with transaction.atomic():
+            existing = set(cls.objects.filter(assessment_id__in=assessment_ids).values_list('assessment_id', flat=True))
+            missing = set(Assessment.objects.filter(id__in=assessment_ids - existing).values_list('id', flat=True))
+            cls.create_missing(missing)
+            rows = cls.objects.select_for_update().filter(assessment_id__in=assessment_ids).order_by('assessment_id')
+            stats_rows = {stats.assessment_id: stats for stats in rows}
+            for assessment_id in missing:
+                # Built by us, or by a concurrent fold that got here first; either way
+                # rebuilding under the lock is correct.
+                cls.rebuild_locked(assessment_id)
+            pending = cls.pending_changes(list(stats_rows.keys() - missing))
+            if not pending:
+                return
+            now = timezone.now()
+            for assessment_id, changes in pending.items():
+                stats = stats_rows[assessment_id]
+                stats.apply_changes((old, new) for _, old, new in changes)
+                stats.updated_at = now
+            cls.objects.bulk_update([stats_rows[a_id] for a_id in pending], cls.STAT_FIELDS)
+            AssessmentScoreChange.objects.filter(
+                id__in=[change_id for changes in pending.values() for change_id, _, _ in changes]
+            ).delete()
+
+    @classmethod
+    def create_missing(cls, assessment_ids):
+        """Insert empty rows for ``assessment_ids``, skipping any a concurrent writer inserted."""
+        cls.objects.bulk_create([cls(assessment_id=assessment_id) for assessment_id in assessment_ids], ignore_conflicts=True)
+
+    @classmethod
+    def recompute(cls, assessment_id):
+        """Build an unsaved stats row straight from the submissions table."""
+        return cls.snapshot(assessment_id)[0]
+
+    @classmethod
+    def snapshot(cls, assessment_id):
+        """
+        An unsaved row built from the submissions table and the ids of the logged
+        changes it already reflects. Both are read by one statement, so they agree
+        even under READ COMMITTED while submissions keep arriving.
+        """
+        scores = Submission.objects.filter(assessment_id=assessment_id).order_by().values('score').annotate(
+            occurrences=Count('id')
+        ).values_list(Value(False, output_field=models.BooleanField()), 'score', 'occurrences')
+        changes = AssessmentScoreChange.objects.filter(assessment_id=assessment_id).order_by().values_list(
+            Value(True, output_field=models.BooleanField()), Value(None, output_field=models.FloatField()), 'id'
+        )
+        stats = cls(assessment_id=assessment_id)
+        change_ids = []
+        for is_change, score, number in scores.union(changes, all=True):
+            if is_change:
+                change_ids.append(number)
+                continue
+            stats.histogram[cls.histogram_key(score)] = number
+            stats.count += number
+            stats.score_sum += score * number
+            stats.score_sum_squares += score * score * number
+            stats.min_score = score if stats.min_score is None else min(stats.min_score, score)
+            stats.max_score = score if stats.max_score is None else max(stats.max_score, score)
+        return stats, change_ids
+
+    @classmethod
+    def rebuild(cls, assessment_id):
+        """Recompute the row and drop the logged changes it already reflects."""
+        with transaction.atomic():
+            cls.create_missing([assessment_id])
+            cls.objects.select_for_update().filter(assessment_id=assessment_id).first()
+            return cls.rebuild_locked(assessment_id)
+
+    @classmethod
+    def rebuild_locked(cls, assessment_id):
+        """``rebuild`` for a caller already holding the row's lock."""
+        stats, change_ids = cls.snapshot(assessment_id)
+        stats.save()
+        AssessmentScoreChange.objects.filter(id__in=change_ids).delete()
+        return stats
+
+    @property
+    def mean(self):
+        return self.score_sum / self.count if self.count else None
+
+    @property
+    def variance(self):
+        if not self.count:
+            return None
+        return max(self.score_sum_squares / self.count - self.mean ** 2, 0.0)
+
+    @property
+    def standard_deviation(self):
+        return math.sqrt(self.variance) if self.count else None
+
+    def sorted_histogram(self):
+        return sorted((float(key), occurrences) for key, occurrences in self.histogram.items())
+
+    @property
+    def median(self):
+        if not self.count:
+            return None
+        lower_rank, upper_rank = (self.count - 1) // 2, self.count // 2
+        lower = upper = None
+        seen = 0
+        for score, occurrences in self.sorted_histogram():
+            seen += occurrences
+            if lower is None and seen > lower_rank:
+                lower = score
+            if seen > upper_rank:
+                upper = score
+                break
+        return (lower + upper) / 2
+
+    @property
+    def mode(self):
+        histogram = self.sorted_histogram()
+        if not histogram:
+            return None
+        # Ties go to the lowest score.
+        return max(histogram, key=lambda item: (item[1], -item[0]))[0]
+
+
+class AssessmentScoreChange(models.Model):
+    """
+    A submission score change not yet folded into ``AssessmentStats``. The foreign key
+    has no database constraint so a submission deleted along with its assessment can
+    still log its change; ``rebuild_assessment_stats`` clears those leftovers.
+    """
+    assessment = models.ForeignKey(
+        Assessment, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+'
+    )
+    old_score = models.FloatField(null=True, blank=True)
+    new_score = models.FloatField(null=True, blank=True)
@@ -1,4 +1,6 @@
 from rest_framework import serializers
+from django.db.models import Count, Prefetch, Sum, Value
+from django.db.models.functions import Coalesce
 from .models import Assessment, Question, Answer, Submission
 from classrooms.models import Classroom
 from users.models import Student
@@ -68,6 +70,78 @@ class AssessmentSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['created_at', 'updated_at']
 
+    @staticmethod
+    def setup_eager_loading(queryset):
+        """Load questions and their answers with one Prefetch chain."""
+        return queryset.prefetch_related(
+            Prefetch('questions', queryset=Question.objects.order_by('id')),
+            Prefetch('questions__answers', queryset=Answer.objects.order_by('id')),
+        )
+
+class AssessmentSummarySerializer(serializers.ModelSerializer):
+    question_count = serializers.IntegerField(read_only=True)
+    total_weight = serializers.FloatField(read_only=True)
+
+    class Meta:
+        model = Assessment
+        fields = [
+            'id',
+            'name',
+            'description',
+            'tag',
+            'classroom',
+            'is_published',
+            'deadline',
+            'question_count',
+            'total_weight',
+            'created_at',
+            'updated_at',
+        ]
+        read_only_fields = fields
+
+    @staticmethod
+    def setup_eager_loading(queryset):
+        return queryset.annotate(
+            question_count=Count('questions'),
+            total_weight=Coalesce(Sum('questions__weight'), Value(0.0)),
+        )
+
+class StudentAnswerSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Answer
+        fields = ['id', 'text']
+
+class StudentQuestionSerializer(serializers.ModelSerializer):
+    """Question as a student taking the assessment sees it: no correct answers or model answer."""
+    answers = StudentAnswerSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = Question
+        fields = ['id', 'text', 'weight', 'tags', 'assessment', 'question_type', 'answers']
+
+class StudentAssessmentSerializer(serializers.ModelSerializer):
+    questions = StudentQuestionSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = Assessment
+        fields = [
+            'id',
+            'name',
+            'description',
+            'tag',
+            'classroom',
+            'is_published',
+            'deadline',
+            'questions',
+            'created_at',
+            'updated_at',
+        ]
+        read_only_fields = fields
+
+    @staticmethod
+    def setup_eager_loading(queryset):
+        return AssessmentSerializer.setup_eager_loading(queryset)
+
 class CreateSubmissionSerializer(serializers.Serializer):
     studentId = serializers.IntegerField()
     assessmentId = serializers.IntegerField()
@@ -105,6 +179,10 @@ class GradeShortAnswerSerializer(serializers.Serializer):
     )
 
     def validate_question_scores(self, value):
+        answer_key = self.context.get("answer_key")
+        if answer_key is not None:
+            return self._validate_against_answer_key(value, answer_key)
+
         for question_id_str, score in value.items():
             try:
                 question = Question.objects.get(id=question_id_str)
@@ -122,6 +200,22 @@ class GradeShortAnswerSerializer(serializers.Serializer):
                 raise serializers.ValidationError(f"Invalid format for question ID {question_id_str}.")
         return value
 
+    def _validate_against_answer_key(self, value, answer_key):
+        for question_id_str, score in value.items():
+            question_type = answer_key.question_type(question_id_str)
+            if question_type is None:
+                raise serializers.ValidationError(f"Question with ID {question_id_str} not found.")
+            if question_type != 'short_answer':
+                raise serializers.ValidationError(
+                    f"Question ID {question_id_str} is not a short answer question."
+                )
+            weight = answer_key.weight(question_id_str)
+            if score > weight:
+                raise serializers.ValidationError(
+                    f"Score {score} for question ID {question_id_str} exceeds its maximum weight of {weight}."
+                )
+        return value
+
 class AnalyticsSerializer(serializers.Serializer):
     title = serializers.CharField()
     description = serializers.CharField()
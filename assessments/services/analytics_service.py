@@ -1,44 +1,136 @@
-import numpy as np
-from statistics import mode, StatisticsError
-from assessments.models import Assessment, Submission
+from assessments.models import Assessment, AssessmentStats, QuestionTag, Submission
+from assessments.services.grading_service import GradingService
+
 
 class AnalyticsService:
     @staticmethod
-    def perform_class_analysis(assessment_id):
-        submissions = Submission.objects.filter(assessment_id=assessment_id)
-        assessment = Assessment.objects.get(id=assessment_id)
-        scores = [s.score for s in submissions]
-        if not scores:
-            return None
-
+    def build_analysis(title, description, stats):
         return {
-            "title": assessment.name,
-            "description": assessment.description,
-            "meanScore": np.mean(scores),
-            "medianScore": np.median(scores),
-            "modeScore": AnalyticsService.get_mode(scores),
-            "standardDeviation": np.std(scores),
-            "variance": np.var(scores),
-            "highestScore": max(scores),
-            "lowestScore": min(scores),
-            "range": max(scores) - min(scores),
-            "totalSubmissions": len(scores),
+            "title": title,
+            "description": description,
+            "meanScore": stats.mean,
+            "medianScore": stats.median,
+            "modeScore": stats.mode,
+            "standardDeviation": stats.standard_deviation,
+            "variance": stats.variance,
+            "highestScore": stats.max_score,
+            "lowestScore": stats.min_score,
+            "range": stats.max_score - stats.min_score,
+            "totalSubmissions": stats.count,
         }
 
     @staticmethod
-    def get_mode(scores):
-        try:
-            return mode(scores)
-        except StatisticsError:
+    def perform_class_analysis(assessment_id):
+        AssessmentStats.fold_pending(assessment_id=assessment_id)
+        stats = AssessmentStats.objects.select_related("assessment").filter(assessment_id=assessment_id).first()
+        if stats is None:
+            # Rows are maintained on every submission change; rebuild one that was never created.
+            assessment = Assessment.objects.only("name", "description").get(id=assessment_id)
+            stats = AssessmentStats.rebuild(assessment.id)
+            stats.assessment = assessment
+        if not stats.count:
             return None
 
+        return AnalyticsService.build_analysis(stats.assessment.name, stats.assessment.description, stats)
+
+    @staticmethod
+    def perform_classroom_analysis(classroom_id):
+        """Statistics for every assessment with submissions in a classroom, keyed by assessment id."""
+        AssessmentStats.fold_pending(assessment__classroom_id=classroom_id)
+        rows = (
+            AssessmentStats.objects.filter(assessment__classroom_id=classroom_id, count__gt=0)
+            .select_related("assessment")
+            .order_by("assessment_id")
+        )
+        return {
+            stats.assessment_id: AnalyticsService.build_analysis(
+                stats.assessment.name, stats.assessment.description, stats
+            )
+            for stats in rows
+        }
+
     @staticmethod
     def perform_cross_assessment(classroom_id):
-        assessments = Assessment.objects.filter(classroom_id=classroom_id)
+        analysis = AnalyticsService.perform_classroom_analysis(classroom_id)
         return [
             {
-                "assessmentId": a.id,
-                "name": a.name,
-                **AnalyticsService.perform_class_analysis(a.id)
-            } for a in assessments
+                "assessmentId": assessment_id,
+                "name": data["title"],
+                **data
+            } for assessment_id, data in analysis.items()
+        ]
+
+    @staticmethod
+    def perform_tag_analysis(classroom_id, tags):
+        """
+        Score statistics for every classroom assessment with a question tagged with any of
+        ``tags``, plus per-student mastery of each tag (points earned over points possible
+        on the tagged questions). Runs a fixed number of queries whatever the class size.
+        """
+        tagged = list(
+            QuestionTag.objects.filter(assessment__classroom_id=classroom_id, tag__in=tags)
+            .values_list("assessment_id", "question_id", "tag")
+        )
+        tagged_questions = {}
+        for assessment_id, question_id, tag in tagged:
+            tagged_questions.setdefault(assessment_id, {}).setdefault(tag, []).append(question_id)
+        assessment_ids = sorted(tagged_questions)
+        if not assessment_ids:
+            return {"assessments": [], "tagMastery": []}
+
+        AssessmentStats.fold_pending(assessment_id__in=assessment_ids)
+        stats_rows = (
+            AssessmentStats.objects.filter(assessment_id__in=assessment_ids, count__gt=0)
+            .select_related("assessment")
+            .order_by("assessment_id")
+        )
+        assessments = [
+            {
+                "assessmentId": stats.assessment_id,
+                **AnalyticsService.build_analysis(stats.assessment.name, stats.assessment.description, stats),
+            }
+            for stats in stats_rows
+        ]
+
+        submissions_by_assessment = {}
+        submissions = Submission.objects.filter(assessment_id__in=assessment_ids).values_list(
+            "assessment_id", "student_id", "answers", "graded_details"
+        )
+        for assessment_id, student_id, answers, graded_details in submissions:
+            submissions_by_assessment.setdefault(assessment_id, []).append((student_id, answers, graded_details))
+
+        answer_keys = GradingService.get_answer_keys(assessment_ids)
+        mastery = {}
+        for assessment_id, rows in submissions_by_assessment.items():
+            answer_key = answer_keys[assessment_id]
+            earned, _ = GradingService.grade_matrix(answer_key, [(answers, details) for _, answers, details in rows])
+            student_ids = [student_id for student_id, _, _ in rows]
+            for tag, question_ids in tagged_questions[assessment_id].items():
+                columns = [
+                    answer_key.column[str(question_id)]
+                    for question_id in question_ids
+                    if str(question_id) in answer_key.column
+                ]
+                if not columns:
+                    continue
+                possible = float(answer_key.weights[columns].sum())
+                for student_id, points in zip(student_ids, earned[:, columns].sum(axis=1).tolist()):
+                    totals = mastery.setdefault(student_id, {}).setdefault(tag, [0.0, 0.0])
+                    totals[0] += points
+                    totals[1] += possible
+
+        tag_mastery = [
+            {
+                "studentId": student_id,
+                "tags": {
+                    tag: {
+                        "earned": earned_points,
+                        "possible": possible,
+                        "mastery": earned_points / possible if possible else None,
+                    }
+                    for tag, (earned_points, possible) in student_tags.items()
+                },
+            }
+            for student_id, student_tags in sorted(mastery.items())
         ]
+        return {"assessments": assessments, "tagMastery": tag_mastery}
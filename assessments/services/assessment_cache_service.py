@@ -0,0 +1,64 @@
+import time
+
+from django.core.cache import cache
+from django.utils import timezone
+
+from assessments.models import Assessment
+
+STUDENT_PAYLOAD_CACHE_TIMEOUT = 60 * 60
+BUILD_LOCK_TIMEOUT = 10
+BUILD_WAIT_SECONDS = 2
+BUILD_POLL_INTERVAL = 0.05
+
+
+class AssessmentCacheService:
+    """
+    Versioned cache of rendered student-facing assessment payloads. The version is
+    the assessment's ``updated_at``, which any change to the assessment, its
+    questions or answers moves forward in the same transaction, so every process
+    agrees on it even with a per-process cache; stale payloads are simply never
+    read again and expire on their own.
+    """
+
+    @staticmethod
+    def version_of(updated_at):
+        return int(updated_at.timestamp() * 1_000_000)
+
+    @staticmethod
+    def bump_version(assessment_id):
+        Assessment.objects.filter(id=assessment_id).update(updated_at=timezone.now())
+
+    @staticmethod
+    def student_payload_cache_key(assessment_id, version):
+        return f"assessment:{assessment_id}:student_payload:{version}"
+
+    @staticmethod
+    def get_student_payload(assessment_id, version, build):
+        """
+        Return the cached payload for ``version``, calling ``build`` on a miss.
+        Concurrent misses wait briefly for the first builder instead of all rebuilding.
+        """
+        key = AssessmentCacheService.student_payload_cache_key(assessment_id, version)
+        payload = cache.get(key)
+        if payload is not None:
+            return payload
+
+        lock_key = f"{key}:lock"
+        acquired = cache.add(lock_key, 1, BUILD_LOCK_TIMEOUT)
+        if not acquired:
+            deadline = time.monotonic() + BUILD_WAIT_SECONDS
+            while time.monotonic() < deadline:
+                time.sleep(BUILD_POLL_INTERVAL)
+                payload = cache.get(key)
+                if payload is not None:
+                    return payload
+
+        try:
+            payload = build()
+            cache.set(key, payload, STUDENT_PAYLOAD_CACHE_TIMEOUT)
+        finally:
+            # A caller that gave up waiting builds without the lock and must
+            # not release the one the first builder still holds.
+            if acquired:
+                cache.delete(lock_key)
+        return payload
@@ -0,0 +1,227 @@
+import numbers
+import time
+
+import numpy as np
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Min, Q
+from django.utils import timezone
+
+from assessments.models import AssessmentStats, Question, Submission
+
+ANSWER_KEY_CACHE_TIMEOUT = 60 * 60
+REGRADE_BATCH_SIZE = 500
+NO_ANSWER = -1
+
+
+class AnswerKey:
+    """Per-assessment grading vectors, one column per question ordered by question id."""
+
+    def __init__(self, rows):
+        self.question_ids = np.array([row[0] for row in rows], dtype=np.int64)
+        self.correct_answer_ids = np.array(
+            [NO_ANSWER if row[1] is None else row[1] for row in rows], dtype=np.int64
+        )
+        self.weights = np.array([row[2] for row in rows], dtype=np.float64)
+        self.question_types = [row[3] for row in rows]
+        self.is_multiple_choice = np.array(
+            [question_type == "multiple_choice" for question_type in self.question_types], dtype=bool
+        )
+        self.is_short_answer = np.array(
+            [question_type == "short_answer" for question_type in self.question_types], dtype=bool
+        )
+        self.column = {str(question_id): i for i, question_id in enumerate(self.question_ids.tolist())}
+
+    def __len__(self):
+        return len(self.question_ids)
+
+    def question_type(self, question_id):
+        column = self.column.get(str(question_id))
+        return None if column is None else self.question_types[column]
+
+    def weight(self, question_id):
+        column = self.column.get(str(question_id))
+        return None if column is None else float(self.weights[column])
+
+
+class GradingResult:
+    def __init__(self, scores, correct_counts):
+        self.scores = scores
+        self.correct_counts = correct_counts
+
+
+class GradingService:
+    @staticmethod
+    def answer_key_cache_key(assessment_id):
+        return f"assessment:{assessment_id}:answer_key"
+
+    @staticmethod
+    def answer_key_rows(assessment_ids):
+        return (
+            Question.objects.filter(assessment_id__in=assessment_ids)
+            .annotate(correct_answer_id=Min("answers__id", filter=Q(answers__is_correct=True)))
+            .order_by("assessment_id", "id")
+            .values_list("assessment_id", "id", "correct_answer_id", "weight", "question_type")
+        )
+
+    @staticmethod
+    def build_answer_key(assessment_id):
+        """Load question id, correct answer id, weight and type in one query."""
+        rows = GradingService.answer_key_rows([assessment_id])
+        return AnswerKey([row[1:] for row in rows])
+
+    @staticmethod
+    def get_answer_key(assessment_id):
+        cache_key = GradingService.answer_key_cache_key(assessment_id)
+        answer_key = cache.get(cache_key)
+        if answer_key is None:
+            answer_key = GradingService.build_answer_key(assessment_id)
+            cache.set(cache_key, answer_key, ANSWER_KEY_CACHE_TIMEOUT)
+        return answer_key
+
+    @staticmethod
+    def get_answer_keys(assessment_ids):
+        """Answer keys for several assessments: one cache round-trip and at most one query."""
+        cache_keys = {GradingService.answer_key_cache_key(a_id): a_id for a_id in assessment_ids}
+        cached = cache.get_many(cache_keys)
+        answer_keys = {cache_keys[cache_key]: answer_key for cache_key, answer_key in cached.items()}
+
+        missing = [a_id for a_id in assessment_ids if a_id not in answer_keys]
+        if missing:
+            rows_by_assessment = {a_id: [] for a_id in missing}
+            for row in GradingService.answer_key_rows(missing):
+                rows_by_assessment[row[0]].append(row[1:])
+            built = {a_id: AnswerKey(rows) for a_id, rows in rows_by_assessment.items()}
+            cache.set_many(
+                {GradingService.answer_key_cache_key(a_id): answer_key for a_id, answer_key in built.items()},
+                ANSWER_KEY_CACHE_TIMEOUT,
+            )
+            answer_keys.update(built)
+        return answer_keys
+
+    @staticmethod
+    def invalidate_answer_key(assessment_id):
+        cache.delete(GradingService.answer_key_cache_key(assessment_id))
+
+    @staticmethod
+    def build_matrices(answer_key, submissions):
+        """
+        Turn (answers, graded_details) pairs into a choice matrix of selected answer ids
+        and a matrix of manually assigned short answer scores.
+        """
+        shape = (len(submissions), len(answer_key))
+        choices = np.full(shape, NO_ANSWER, dtype=np.int64)
+        manual_scores = np.zeros(shape, dtype=np.float64)
+        column = answer_key.column
+
+        for row, (answers, graded_details) in enumerate(submissions):
+            for question_id, response in (answers or {}).items():
+                col = column.get(str(question_id))
+                if col is None or not answer_key.is_multiple_choice[col]:
+                    continue
+                try:
+                    choices[row, col] = int(response)
+                except (TypeError, ValueError):
+                    pass
+            for question_id, assigned_score in (graded_details or {}).items():
+                col = column.get(str(question_id))
+                if col is not None and isinstance(assigned_score, numbers.Real):
+                    manual_scores[row, col] = assigned_score
+
+        return choices, manual_scores
+
+    @staticmethod
+    def grade_matrix(answer_key, submissions):
+        """
+        Points earned per submission (rows) and question (columns). ``submissions`` is a
+        sequence of (answers, graded_details) pairs; multiple choice answers are compared
+        against the key vector and short answers use the manually graded score.
+        """
+        choices, manual_scores = GradingService.build_matrices(answer_key, submissions)
+        gradable = answer_key.is_multiple_choice & (answer_key.correct_answer_ids != NO_ANSWER)
+        correct = (choices == answer_key.correct_answer_ids) & gradable
+        earned = correct * answer_key.weights + manual_scores * answer_key.is_short_answer
+        return earned, correct
+
+    @staticmethod
+    def score_submissions(answer_key, submissions):
+        """Score many submissions in one pass."""
+        earned, correct = GradingService.grade_matrix(answer_key, submissions)
+        return GradingResult(scores=earned.sum(axis=1), correct_counts=correct.sum(axis=1))
+
+    @staticmethod
+    def score_submission(answer_key, answers, graded_details=None):
+        result = GradingService.score_submissions(answer_key, [(answers, graded_details)])
+        return float(result.scores[0])
+
+    @staticmethod
+    def percentage_scores(answer_key, result):
+        """Share of questions answered correctly, as GradeStudentsView reports it."""
+        if not len(answer_key):
+            return np.zeros_like(result.scores)
+        return np.round(result.correct_counts / len(answer_key) * 100, 2)
+
+    @staticmethod
+    def regrade_assessment(assessment_id, student_ids=None, scoring="weighted", batch_size=REGRADE_BATCH_SIZE):
+        """
+        Re-score an assessment's submissions (optionally only ``student_ids``) in batches,
+        writing changed scores back with ``bulk_update`` inside a single transaction.
+        ``scoring`` is "weighted" (the submission score) or "percentage".
+        """
+        started = time.perf_counter()
+        answer_key = GradingService.get_answer_key(assessment_id)
+        submissions = (
+            Submission.objects.filter(assessment_id=assessment_id)
+            .only("id", "answers", "graded_details", "score")
+            .order_by("id")
+        )
+        if student_ids is not None:
+            submissions = submissions.filter(student_id__in=student_ids)
+
+        processed = updated = 0
+        with transaction.atomic():
+            batch = []
+            for submission in submissions.iterator(chunk_size=batch_size):
+                batch.append(submission)
+                if len(batch) == batch_size:
+                    updated += GradingService._regrade_batch(assessment_id, answer_key, batch, scoring)
+                    processed += len(batch)
+                    batch = []
+            if batch:
+                updated += GradingService._regrade_batch(assessment_id, answer_key, batch, scoring)
+                processed += len(batch)
+
+        return {
+            "assessmentId": assessment_id,
+            "processed": processed,
+            "updated": updated,
+            "durationMs": round((time.perf_counter() - started) * 1000, 2),
+        }
+
+    @staticmethod
+    def _regrade_batch(assessment_id, answer_key, submissions, scoring):
+        # The percentage mode only counts correct multiple choice answers.
+        use_manual_scores = scoring == "weighted"
+        result = GradingService.score_submissions(answer_key, [
+            (submission.answers, submission.graded_details if use_manual_scores else None)
+            for submission in submissions
+        ])
+        if scoring == "percentage":
+            new_scores = GradingService.percentage_scores(answer_key, result)
+        else:
+            new_scores = result.scores
+
+        now = timezone.now()
+        changed = []
+        score_changes = []
+        for submission, new_score in zip(submissions, new_scores.tolist()):
+            if submission.score != new_score:
+                score_changes.append((submission.score, new_score))
+                submission.score = new_score
+                submission.updated_at = now
+                changed.append(submission)
+        if changed:
+            # bulk_update sends no signals, so keep AssessmentStats in step here.
+            Submission.objects.bulk_update(changed, ["score", "updated_at"], batch_size=len(changed))
+            AssessmentStats.record_score_changes(assessment_id, score_changes)
+        return len(changed)
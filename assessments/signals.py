@@ -0,0 +1,60 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from assessments.models import Answer, AssessmentStats, Question, QuestionTag, Submission
+from assessments.services.assessment_cache_service import AssessmentCacheService
+from assessments.services.grading_service import GradingService
+
+
+def invalidate_answer_key(assessment_id):
+    # After commit, so a concurrent grader cannot cache the old key again in between.
+    transaction.on_commit(lambda: GradingService.invalidate_answer_key(assessment_id))
+
+
+@receiver([post_save, post_delete], sender=Question)
+def invalidate_answer_key_on_question_change(sender, instance, **kwargs):
+    invalidate_answer_key(instance.assessment_id)
+    AssessmentCacheService.bump_version(instance.assessment_id)
+
+
+@receiver([post_save, post_delete], sender=Answer)
+def invalidate_answer_key_on_answer_change(sender, instance, **kwargs):
+    assessment_id = (
+        Question.objects.filter(id=instance.question_id)
+        .values_list("assessment_id", flat=True)
+        .first()
+    )
+    # When the question itself is being deleted its own signal invalidates the key.
+    if assessment_id is not None:
+        invalidate_answer_key(assessment_id)
+        AssessmentCacheService.bump_version(assessment_id)
+
+
+@receiver(post_save, sender=Question)
+def sync_question_tags(sender, instance, **kwargs):
+    if kwargs.get('raw', False):
+        return
+    QuestionTag.sync_question(instance)
+
+
+@receiver(post_save, sender=Submission)
+def record_submission_score(sender, instance, created, **kwargs):
+    if kwargs.get('raw', False):
+        return
+    if created:
+        AssessmentStats.record_score_changes(instance.assessment_id, [(None, instance.score)])
+    elif hasattr(instance, '_loaded_score'):
+        AssessmentStats.record_score_changes(instance.assessment_id, [(instance._loaded_score, instance.score)])
+    else:
+        # Saved from an instance whose previous score is unknown (e.g. deferred field).
+        AssessmentStats.rebuild(instance.assessment_id)
+    instance._loaded_score = instance.score
+
+
+@receiver(post_delete, sender=Submission)
+def remove_submission_score(sender, instance, **kwargs):
+    if hasattr(instance, '_loaded_score'):
+        AssessmentStats.record_score_changes(instance.assessment_id, [(instance._loaded_score, None)])
+    elif AssessmentStats.objects.filter(assessment_id=instance.assessment_id).exists():
+        AssessmentStats.rebuild(instance.assessment_id)
@@ -1,3 +1,666 @@
-from django.test import TestCase
+import random
+import statistics
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from classrooms.testing import ClassroomTestCase, create_classroom
+from users.models import Student, User
+from .models import Answer, Assessment, AssessmentScoreChange, AssessmentStats, Question, QuestionTag, Submission
+from .services.analytics_service import AnalyticsService
+from .services.assessment_cache_service import AssessmentCacheService
+from .services.grading_service import GradingService
+
+
+class AssessmentQueryCountTests(ClassroomTestCase):
+    def create_assessments(self, count, questions=3, options=4):
+        assessments = []
+        for i in range(count):
+            assessment = Assessment.objects.create(
+                name=f"Quiz {i}",
+                tag="quiz",
+                classroom=self.classroom,
+                deadline=timezone.now() + timedelta(days=1),
+            )
+            for j in range(questions):
+                question = Question.objects.create(text=f"Q{j}", weight=2.0, assessment=assessment)
+                for k in range(options):
+                    Answer.objects.create(question=question, text=f"A{k}", is_correct=(k == 0))
+            assessments.append(assessment)
+        return assessments
+
+    def list_url(self):
+        return reverse("list-create-assessment", kwargs={"classroom_id": self.classroom.id})
+
+    def test_list_mode_returns_annotated_summaries_in_one_query(self):
+        self.create_assessments(5)
+
+        with self.assertNumQueries(1):
+            response = self.client.get(self.list_url())
+
+        self.assertEqual(response.status_code, 200)
+        first = response.data["data"][0]
+        self.assertNotIn("questions", first)
+        self.assertEqual(first["question_count"], 3)
+        self.assertEqual(first["total_weight"], 6.0)
+
+    def test_list_mode_with_questions_prefetches_the_tree(self):
+        self.create_assessments(5)
+
+        with self.assertNumQueries(3):
+            response = self.client.get(self.list_url(), {"include": "questions"})
+
+        self.assertEqual(len(response.data["data"]), 5)
+        self.assertEqual(len(response.data["data"][0]["questions"][0]["answers"]), 4)
+
+    def test_detail_mode_query_count_does_not_grow_with_questions(self):
+        small, large = self.create_assessments(2)
+        Question.objects.bulk_create([Question(text="extra", assessment=large) for _ in range(20)])
+
+        for assessment in (small, large):
+            url = reverse("get-assessment", kwargs={"classroom_id": self.classroom.id, "id": assessment.id})
+            with self.assertNumQueries(3):
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+
+
+class StudentAssessmentPayloadTests(ClassroomTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        student_user = User.objects.create_user(email="student@bdu.edu.et", password="secret", role="student")
+        cls.student = Student.objects.create(
+            user=student_user, student_id="A1", first_name="Sara", last_name="Tesfaye", phone="0"
+        )
+        cls.assessment = Assessment.objects.create(
+            name="Quiz", tag="quiz", classroom=cls.classroom, is_published=True,
+            deadline=timezone.now() + timedelta(days=1),
+        )
+        cls.question = Question.objects.create(
+            text="Q", weight=1.0, assessment=cls.assessment, question_type="short_answer", model_answer="secret"
+        )
+        cls.choice = Question.objects.create(text="MC", weight=1.0, assessment=cls.assessment)
+        for k in range(3):
+            Answer.objects.create(question=cls.choice, text=f"A{k}", is_correct=(k == 0))
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.client.force_authenticate(self.student.user)
+
+    def detail_url(self):
+        return reverse("get-assessment", kwargs={"classroom_id": self.classroom.id, "id": self.assessment.id})
+
+    def assert_no_answer_key(self, assessment):
+        for question in assessment["questions"]:
+            self.assertNotIn("model_answer", question)
+            for answer in question["answers"]:
+                self.assertNotIn("is_correct", answer)
+
+    def test_list_with_questions_hides_the_answer_key_from_students(self):
+        url = reverse("list-create-assessment", kwargs={"classroom_id": self.classroom.id})
+        response = self.client.get(url, {"include": "questions"})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data["data"]), 1)
+        self.assert_no_answer_key(response.data["data"][0])
+
+        self.client.force_authenticate(self.teacher.user)
+        response = self.client.get(url, {"include": "questions"})
+        self.assertIn("is_correct", response.data["data"][0]["questions"][1]["answers"][0])
+
+    def test_detail_hides_the_answer_key_from_students(self):
+        response = self.client.get(self.detail_url())
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()["data"]["questions"]), 2)
+        self.assert_no_answer_key(response.json()["data"])
+
+    def test_cached_payload_follows_question_and_answer_changes(self):
+        self.client.get(self.detail_url())
+        with self.assertNumQueries(1):
+            self.client.get(self.detail_url())
+
+        answer = self.choice.answers.get(text="A1")
+        answer.text = "Renamed"
+        answer.save()
+        texts = [a["text"] for a in self.client.get(self.detail_url()).json()["data"]["questions"][1]["answers"]]
+        self.assertIn("Renamed", texts)
+
+        Question.objects.create(text="New", weight=1.0, assessment=self.assessment)
+        self.assertEqual(len(self.client.get(self.detail_url()).json()["data"]["questions"]), 3)
+
+        self.assessment.name = "Renamed quiz"
+        self.assessment.save()
+        self.assertEqual(self.client.get(self.detail_url()).json()["data"]["name"], "Renamed quiz")
+
+    def test_waiting_caller_does_not_release_the_builders_lock(self):
+        key = AssessmentCacheService.student_payload_cache_key(self.assessment.id, 1)
+        cache.add(f"{key}:lock", 1)
+
+        with mock.patch("assessments.services.assessment_cache_service.BUILD_WAIT_SECONDS", 0):
+            payload = AssessmentCacheService.get_student_payload(self.assessment.id, 1, lambda: b"{}")
+
+        self.assertEqual(payload, b"{}")
+        self.assertIsNotNone(cache.get(f"{key}:lock"))
+
+
+class AnswerKeyCacheTests(ClassroomTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.assessments = []
+        for i in range(2):
+            assessment = Assessment.objects.create(
+                name=f"Quiz {i}", tag="quiz", classroom=cls.classroom, deadline=timezone.now() + timedelta(days=1)
+            )
+            for j in range(2):
+                question = Question.objects.create(text=f"Q{j}", weight=j + 1.0, assessment=assessment)
+                for k in range(3):
+                    Answer.objects.create(question=question, text=f"A{k}", is_correct=(k == 1))
+            cls.assessments.append(assessment)
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def test_answer_key_is_built_once_and_cached(self):
+        assessment = self.assessments[0]
+        with self.assertNumQueries(1):
+            answer_key = GradingService.get_answer_key(assessment.id)
+        with self.assertNumQueries(0):
+            GradingService.get_answer_key(assessment.id)
+
+        question = assessment.questions.order_by("id").first()
+        correct = question.answers.get(is_correct=True)
+        self.assertEqual(answer_key.weight(question.id), 1.0)
+        self.assertEqual(answer_key.question_type(question.id), "multiple_choice")
+        self.assertEqual(GradingService.score_submission(answer_key, {str(question.id): str(correct.id)}), 1.0)
+
+    def test_answer_keys_for_several_assessments_take_one_query(self):
+        GradingService.get_answer_key(self.assessments[0].id)
+        with self.assertNumQueries(1):
+            answer_keys = GradingService.get_answer_keys([a.id for a in self.assessments])
+        self.assertEqual({a_id: len(key) for a_id, key in answer_keys.items()}, {a.id: 2 for a in self.assessments})
+        with self.assertNumQueries(0):
+            GradingService.get_answer_keys([a.id for a in self.assessments])
+
+    def test_question_and_answer_changes_invalidate_after_commit(self):
+        assessment = self.assessments[0]
+        question = assessment.questions.order_by("id").first()
+        GradingService.get_answer_key(assessment.id)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            question.weight = 5.0
+            question.save()
+            # Still the committed key until the transaction ends.
+            self.assertEqual(GradingService.get_answer_key(assessment.id).weight(question.id), 1.0)
+        self.assertEqual(GradingService.get_answer_key(assessment.id).weight(question.id), 5.0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            question.answers.update(is_correct=False)
+            answer = question.answers.order_by("id").first()
+            answer.is_correct = True
+            answer.save()
+        answer_key = GradingService.get_answer_key(assessment.id)
+        self.assertEqual(answer_key.correct_answer_ids[answer_key.column[str(question.id)]], answer.id)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            question.delete()
+        self.assertEqual(len(GradingService.get_answer_key(assessment.id)), 1)
+
+
+def reference_score(questions, answers, graded_details):
+    """Per-submission scoring as Submission.calculate_total_score did it before grading was vectorized."""
+    score = 0
+    for question in questions:
+        if question.question_type == "multiple_choice":
+            correct = next((answer for answer in question.answers.all() if answer.is_correct), None)
+            if correct and answers.get(str(question.id)) == str(correct.id):
+                score += question.weight
+    by_id = {str(question.id): question for question in questions}
+    for question_id, assigned_score in (graded_details or {}).items():
+        question = by_id.get(question_id)
+        if question and question.question_type == "short_answer" and isinstance(assigned_score, (int, float)):
+            score += assigned_score
+    return score
+
+
+class VectorizedGradingTests(ClassroomTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.assessment = Assessment.objects.create(
+            name="Quiz", tag="quiz", classroom=cls.classroom, deadline=timezone.now() + timedelta(days=1)
+        )
+        for j, weight in enumerate([1.0, 2.5, 0.5, 3.0]):
+            question = Question.objects.create(text=f"Q{j}", weight=weight, assessment=cls.assessment)
+            for k in range(4):
+                # The last question has no correct answer and can never score.
+                Answer.objects.create(question=question, text=f"A{k}", is_correct=(k == j % 4 and j < 3))
+        for j in range(2):
+            Question.objects.create(
+                text=f"S{j}", weight=2.0, assessment=cls.assessment, question_type="short_answer", model_answer="x"
+            )
+        cls.questions = list(cls.assessment.questions.prefetch_related("answers").order_by("id"))
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def random_submissions(self, count):
+        rng = random.Random(7)
+        submissions = []
+        for _ in range(count):
+            answers, graded_details = {}, {}
+            for question in self.questions:
+                if question.question_type == "multiple_choice":
+                    answers[str(question.id)] = rng.choice(
+                        [str(answer.id) for answer in question.answers.all()] + ["", "not-a-number"]
+                    )
+                else:
+                    answers[str(question.id)] = "free text"
+                    graded_details[str(question.id)] = rng.choice([0, 1, 1.5, 2, "bad"])
+            # Scores for multiple choice questions or unknown ids are ignored.
+            graded_details[str(self.questions[0].id)] = 5
+            graded_details["999999"] = 5
+            submissions.append((answers, graded_details))
+        return submissions
+
+    def test_batch_scores_match_per_submission_scoring(self):
+        submissions = self.random_submissions(50)
+        answer_key = GradingService.get_answer_key(self.assessment.id)
+
+        result = GradingService.score_submissions(answer_key, submissions)
+
+        expected = [reference_score(self.questions, answers, details) for answers, details in submissions]
+        self.assertEqual(result.scores.tolist(), expected)
+        for (answers, details), score in zip(submissions[:5], expected):
+            self.assertEqual(GradingService.score_submission(answer_key, answers, details), score)
+
+    def test_percentage_scores_count_correct_answers_over_all_questions(self):
+        submissions = self.random_submissions(20)
+        answer_key = GradingService.get_answer_key(self.assessment.id)
+
+        result = GradingService.score_submissions(answer_key, [(answers, None) for answers, _ in submissions])
+
+        expected = []
+        for answers, _ in submissions:
+            correct = sum(
+                1 for question in self.questions
+                if any(a.is_correct and str(a.id) == answers.get(str(question.id)) for a in question.answers.all())
+            )
+            expected.append(round(correct / len(self.questions) * 100, 2))
+        self.assertEqual(GradingService.percentage_scores(answer_key, result).tolist(), expected)
+
+    def test_calculate_total_score_uses_the_same_engine(self):
+        student_user = User.objects.create_user(email="student@bdu.edu.et", password="secret", role="student")
+        student = Student.objects.create(user=student_user, student_id="A1", first_name="Sara", last_name="T", phone="0")
+        answers, details = self.random_submissions(1)[0]
+        submission = Submission.objects.create(student=student, assessment=self.assessment, answers=answers, score=0)
+        submission.graded_details = details
+
+        submission.calculate_total_score()
+
+        self.assertEqual(submission.score, reference_score(self.questions, answers, details))
+
+
+class RegradeTests(ClassroomTestCase):
+    student_count = 5
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.assessment = Assessment.objects.create(
+            name="Quiz", tag="quiz", classroom=cls.classroom, deadline=timezone.now() + timedelta(days=1)
+        )
+        cls.answers = []
+        for j in range(2):
+            question = Question.objects.create(text=f"Q{j}", weight=2.0, assessment=cls.assessment)
+            cls.answers.append([
+                Answer.objects.create(question=question, text=f"A{k}", is_correct=(k == 0)) for k in range(2)
+            ])
+        for i, student in enumerate(cls.students):
+            # Student i answers the first i % 3 questions correctly; every stored score is stale.
+            answers = {
+                str(options[0].question_id): str(options[0 if j < i % 3 else 1].id)
+                for j, options in enumerate(cls.answers)
+            }
+            Submission.objects.create(student=student, assessment=cls.assessment, answers=answers, score=-1)
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def regrade_url(self):
+        return reverse("regrade-assessment", kwargs={"classroom_id": self.classroom.id, "assessment_id": self.assessment.id})
+
+    def scores(self):
+        return dict(Submission.objects.filter(assessment=self.assessment).values_list("student_id", "score"))
+
+    def test_regrade_in_batches_writes_weighted_scores(self):
+        with CaptureQueriesContext(connection) as queries:
+            result = GradingService.regrade_assessment(self.assessment.id, batch_size=2)
+
+        self.assertEqual((result["processed"], result["updated"]), (5, 5))
+        updates = [q for q in queries.captured_queries if q["sql"].startswith('UPDATE "assessments_submission"')]
+        self.assertEqual(len(updates), 3)
+        self.assertEqual(self.scores(), {s.id: 2.0 * (i % 3) for i, s in enumerate(self.students)})
+        # Nothing changed the second time round.
+        self.assertEqual(GradingService.regrade_assessment(self.assessment.id, batch_size=2)["updated"], 0)
+
+    def test_regrade_endpoint(self):
+        response = self.client.post(
+            self.regrade_url(), {"studentIds": [s.id for s in self.students[:2]]}, format="json"
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["data"]["processed"], 2)
+        self.assertEqual(sorted(self.scores().values()), [-1.0, -1.0, -1.0, 0.0, 2.0])
+
+    def test_regrade_endpoint_rejects_bad_input(self):
+        for student_ids in ["1,2", ["x"], [{"id": 1}], 3]:
+            response = self.client.post(self.regrade_url(), {"studentIds": student_ids}, format="json")
+            self.assertEqual(response.status_code, 400, student_ids)
+
+        self.client.force_authenticate(self.students[0].user)
+        self.assertEqual(self.client.post(self.regrade_url(), {}, format="json").status_code, 403)
+        self.assertEqual(set(self.scores().values()), {-1.0})
+
+    def test_grade_students_stores_percentages(self):
+        url = reverse("grade-students", kwargs={"classroom_id": self.classroom.id})
+        response = self.client.post(
+            f"{url}?assessmentId={self.assessment.id}", {"studentIds": [s.id for s in self.students]}, format="json"
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.scores(), {s.id: 50.0 * (i % 3) for i, s in enumerate(self.students)})
+        response = self.client.post(f"{url}?assessmentId={self.assessment.id}", {"studentIds": "1"}, format="json")
+        self.assertEqual(response.status_code, 400)
+
+
+class AssessmentStatsTests(ClassroomTestCase):
+    student_count = 4
+
+    def setUp(self):
+        super().setUp()
+        self.assessment = Assessment.objects.create(
+            name="Quiz", tag="quiz", classroom=self.classroom, deadline=timezone.now() + timedelta(days=1)
+        )
+
+    def submit(self, student, score):
+        return Submission.objects.create(student=student, assessment=self.assessment, answers={}, score=score)
+
+    def assert_matches_submissions(self):
+        stats = AssessmentStats.objects.get(assessment=self.assessment)
+        fresh = AssessmentStats.recompute(self.assessment.id)
+        for field in ("count", "score_sum", "score_sum_squares", "min_score", "max_score", "histogram"):
+            self.assertEqual(getattr(stats, field), getattr(fresh, field), field)
+        return stats
+
+    def test_submission_writes_only_log_changes(self):
+        AssessmentStats.rebuild(self.assessment.id)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.submit(self.students[0], 4.0)
+        self.assertFalse([q for q in queries.captured_queries if "assessments_assessmentstats" in q["sql"]])
+        self.assertEqual(AssessmentScoreChange.objects.filter(assessment=self.assessment).count(), 1)
+
+        AssessmentStats.fold_pending(assessment_id=self.assessment.id)
+        self.assertFalse(AssessmentScoreChange.objects.filter(assessment=self.assessment).exists())
+        self.assertEqual(self.assert_matches_submissions().count, 1)
+
+    def test_signals_keep_stats_in_step_with_submissions(self):
+        for student, score in zip(self.students, [2.0, 4.0, 4.0, 9.0]):
+            self.submit(student, score)
+        analysis = AnalyticsService.perform_class_analysis(self.assessment.id)
+        self.assertEqual((analysis["meanScore"], analysis["medianScore"], analysis["modeScore"]), (4.75, 4.0, 4.0))
+
+        submission = Submission.objects.get(student=self.students[3], assessment=self.assessment)
+        submission.score = 1.0
+        submission.save()
+        Submission.objects.get(student=self.students[0], assessment=self.assessment).delete()
+        analysis = AnalyticsService.perform_class_analysis(self.assessment.id)
+
+        stats = self.assert_matches_submissions()
+        self.assertEqual(stats.histogram, {"1.0": 1, "4.0": 2})
+        self.assertEqual((analysis["lowestScore"], analysis["highestScore"], analysis["totalSubmissions"]), (1.0, 4.0, 3))
+
+    def test_fold_tolerates_a_row_built_concurrently(self):
+        self.submit(self.students[0], 3.0)
+        self.submit(self.students[1], 5.0)
+        create_missing = AssessmentStats.create_missing
+
+        def racing_fold(assessment_ids):
+            # Another reader builds the row between our check and our insert.
+            AssessmentStats.recompute(self.assessment.id).save()
+            create_missing(assessment_ids)
+
+        with mock.patch.object(AssessmentStats, "create_missing", side_effect=racing_fold):
+            AssessmentStats.fold_pending(assessment_id=self.assessment.id)
+
+        self.assertEqual(self.assert_matches_submissions().count, 2)
+        self.assertFalse(AssessmentScoreChange.objects.filter(assessment=self.assessment).exists())
+
+    def test_rebuild_consumes_the_changes_its_snapshot_reflects(self):
+        self.submit(self.students[0], 3.0)
+        logged = list(AssessmentScoreChange.objects.filter(assessment=self.assessment).values_list("id", flat=True))
+
+        stats, change_ids = AssessmentStats.snapshot(self.assessment.id)
+
+        self.assertEqual(change_ids, logged)
+        self.assertEqual((stats.count, stats.score_sum, stats.histogram), (1, 3.0, {"3.0": 1}))
+
+    def test_check_reports_drift_and_rebuild_repairs_it(self):
+        for student, score in zip(self.students, [1.0, 2.0, 3.0]):
+            self.submit(student, score)
+        AssessmentStats.rebuild(self.assessment.id)
+        # Logged but unfolded changes are not drift.
+        self.submit(self.students[3], 5.0)
+        call_command("rebuild_assessment_stats", "--check", stdout=StringIO())
+
+        AssessmentStats.objects.filter(assessment=self.assessment).update(count=10, score_sum=0.0)
+        out = StringIO()
+        with self.assertRaises(CommandError):
+            call_command("rebuild_assessment_stats", "--check", stdout=out)
+        self.assertIn("drift in count, score_sum", out.getvalue())
+
+        call_command("rebuild_assessment_stats", stdout=StringIO())
+        self.assertFalse(AssessmentScoreChange.objects.filter(assessment=self.assessment).exists())
+        self.assertEqual(self.assert_matches_submissions().count, 4)
+        call_command("rebuild_assessment_stats", "--check", stdout=StringIO())
+
+    def test_deleting_an_assessment_leaves_changes_for_the_rebuild_to_clear(self):
+        self.submit(self.students[0], 1.0)
+        assessment_id = self.assessment.id
+        self.assessment.delete()
+        self.assertTrue(AssessmentScoreChange.objects.filter(assessment_id=assessment_id).exists())
+
+        call_command("rebuild_assessment_stats", stdout=StringIO())
+        self.assertFalse(AssessmentScoreChange.objects.filter(assessment_id=assessment_id).exists())
+
+
+def create_scored_assessment(classroom, students, scores, name="Quiz"):
+    """An assessment with one submission per score, taken by ``students`` in order."""
+    assessment = Assessment.objects.create(
+        name=name, description=f"{name} description", tag="quiz", classroom=classroom,
+        deadline=timezone.now() + timedelta(days=1),
+    )
+    Submission.objects.bulk_create([
+        Submission(student=student, assessment=assessment, answers={}, score=score)
+        for student, score in zip(students, scores)
+    ])
+    # bulk_create sends no signals; build the stats row from the table.
+    AssessmentStats.rebuild(assessment.id)
+    return assessment
+
+
+class AssessmentAnalyticsTests(ClassroomTestCase):
+    student_count = 8
+
+    def analytics_url(self, assessment):
+        return reverse(
+            "single-assessment-analytics", kwargs={"classroom_id": self.classroom.id, "assessment_id": assessment.id}
+        )
+
+    def test_statistics_match_the_scores(self):
+        rng = random.Random(3)
+        scores = [rng.choice([0.0, 1.5, 2.0, 4.0, 7.5, 10.0]) for _ in range(8)]
+        assessment = create_scored_assessment(self.classroom, self.students, scores)
+
+        response = self.client.get(self.analytics_url(assessment))
+
+        self.assertEqual(response.status_code, 200)
+        data = response.data["data"]
+        self.assertEqual(data["title"], "Quiz")
+        self.assertEqual(data["totalSubmissions"], 8)
+        self.assertAlmostEqual(data["meanScore"], statistics.mean(scores))
+        self.assertEqual(data["medianScore"], statistics.median(scores))
+        self.assertEqual(data["modeScore"], min(statistics.multimode(scores)))
+        self.assertAlmostEqual(data["variance"], statistics.pvariance(scores))
+        self.assertAlmostEqual(data["standardDeviation"], statistics.pstdev(scores))
+        self.assertEqual((data["lowestScore"], data["highestScore"]), (min(scores), max(scores)))
+        self.assertEqual(data["range"], max(scores) - min(scores))
+
+    def test_assessment_without_submissions_is_not_found(self):
+        assessment = create_scored_assessment(self.classroom, self.students, [])
+        AssessmentStats.objects.filter(assessment=assessment).delete()
+
+        response = self.client.get(self.analytics_url(assessment))
+
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.data["errors"], ["No submissions found for this assessment."])
+
+
+class ClassroomAnalyticsTests(ClassroomTestCase):
+    student_count = 4
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.midterm = create_scored_assessment(cls.classroom, cls.students, [2.0, 4.0, 6.0], name="Midterm")
+        cls.final = create_scored_assessment(cls.classroom, cls.students, [5.0, 5.0], name="Final")
+        cls.empty = create_scored_assessment(cls.classroom, cls.students, [], name="Empty")
+        other = create_classroom(cls.teacher, "Other", "CS302")
+        create_scored_assessment(other, cls.students, [1.0], name="Elsewhere")
+
+    def test_aggregate_covers_each_assessment_with_submissions(self):
+        url = reverse("agregate-assessment-analytics", kwargs={"classroom_id": self.classroom.id})
+
+        response = self.client.get(url)
+
+        self.assertEqual(response.status_code, 200)
+        data = response.data["data"]
+        self.assertEqual(set(data), {str(self.midterm.id), str(self.final.id)})
+        self.assertEqual(data[str(self.midterm.id)]["data"]["meanScore"], 4.0)
+        self.assertEqual(data[str(self.midterm.id)]["data"]["medianScore"], 4.0)
+        self.assertEqual(data[str(self.final.id)]["data"]["standardDeviation"], 0.0)
+
+    def test_cross_assessment_runs_a_fixed_number_of_queries(self):
+        url = reverse("cross-assessment-analytics", kwargs={"classroom_id": self.classroom.id})
+        with self.assertNumQueries(2):
+            first = self.client.get(url).data["data"]
+
+        create_scored_assessment(self.classroom, self.students, [3.0, 3.0, 9.0, 1.0], name="Retake")
+        with self.assertNumQueries(2):
+            second = self.client.get(url).data["data"]
+
+        self.assertEqual([row["name"] for row in first], ["Midterm", "Final"])
+        self.assertEqual([row["name"] for row in second], ["Midterm", "Final", "Retake"])
+        self.assertEqual(second[2]["modeScore"], 3.0)
+
+
+class TagAnalyticsTests(ClassroomTestCase):
+    student_count = 2
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.assessment = Assessment.objects.create(
+            name="Quiz", tag="quiz", classroom=cls.classroom, deadline=timezone.now() + timedelta(days=1)
+        )
+        cls.graphs = cls.add_question(["graphs", "graphs", "", 7], weight=2.0)
+        cls.sorting = cls.add_question(["sorting"], weight=1.0)
+        cls.both = cls.add_question(["graphs", "sorting"], weight=3.0)
+        untagged = Assessment.objects.create(
+            name="Untagged", tag="quiz", classroom=cls.classroom, deadline=timezone.now() + timedelta(days=1)
+        )
+        Question.objects.create(text="Q", weight=1.0, assessment=untagged, tags=["recursion"])
+
+        # Student 0 gets everything right, student 1 only the sorting question.
+        for student, correct in zip(cls.students, [{cls.graphs, cls.sorting, cls.both}, {cls.sorting}]):
+            answers = {
+                str(question.id): str(question.answers.get(is_correct=(question in correct)).id)
+                for question in (cls.graphs, cls.sorting, cls.both)
+            }
+            Submission.objects.create(student=student, assessment=cls.assessment, answers=answers, score=0)
+
+    @classmethod
+    def add_question(cls, tags, weight):
+        question = Question.objects.create(text="Q", weight=weight, assessment=cls.assessment, tags=tags)
+        Answer.objects.create(question=question, text="right", is_correct=True)
+        Answer.objects.create(question=question, text="wrong", is_correct=False)
+        return question
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def url(self):
+        return reverse("analytics-by-tag", kwargs={"classroom_id": self.classroom.id})
+
+    def test_question_tags_are_indexed_on_save(self):
+        self.assertEqual(list(self.graphs.tag_index.values_list("tag", flat=True)), ["graphs"])
+
+        self.graphs.tags = ["trees"]
+        self.graphs.save()
+
+        self.assertEqual(
+            sorted(QuestionTag.objects.filter(assessment=self.assessment).values_list("tag", flat=True)),
+            ["graphs", "sorting", "sorting", "trees"],
+        )
+
+    def test_mastery_per_student_and_tag(self):
+        response = self.client.post(self.url(), ["graphs", "sorting", "graphs"], format="json")
+
+        self.assertEqual(response.status_code, 200)
+        data = response.data["data"]
+        self.assertEqual([row["assessmentId"] for row in data["assessments"]], [self.assessment.id])
+        mastery = {row["studentId"]: row["tags"] for row in data["tagMastery"]}
+        self.assertEqual(mastery[self.students[0].id]["graphs"], {"earned": 5.0, "possible": 5.0, "mastery": 1.0})
+        self.assertEqual(mastery[self.students[1].id]["graphs"], {"earned": 0.0, "possible": 5.0, "mastery": 0.0})
+        self.assertEqual(mastery[self.students[1].id]["sorting"], {"earned": 1.0, "possible": 4.0, "mastery": 0.25})
+
+    def test_query_count_does_not_grow_with_submissions(self):
+        self.client.post(self.url(), ["graphs"], format="json")
+        with self.assertNumQueries(4):
+            self.client.post(self.url(), ["graphs"], format="json")
+
+    def test_unknown_tags_and_bad_input(self):
+        response = self.client.post(self.url(), ["nothing"], format="json")
+        self.assertEqual(response.data["data"], {"assessments": [], "tagMastery": []})
+
+        for body in [[], {"tags": ["graphs"]}, ["graphs", 3]]:
+            self.assertEqual(self.client.post(self.url(), body, format="json").status_code, 400, body)
+
+
+@override_settings(ALLOWED_HOSTS=["localhost"])
+class LoadTestCommandTests(TransactionTestCase):
+    def test_reports_successful_submissions(self):
+        out = StringIO()
+        # Storm the test database instead of letting the command swap in its own.
+        with mock.patch.object(connection.creation, "create_test_db"), \
+                mock.patch.object(connection.creation, "destroy_test_db"):
+            call_command("loadtest_submissions", students=6, questions=3, concurrency=[1], stdout=out)
+
+        row = out.getvalue().splitlines()[-1].split()
+        self.assertEqual(row[:3], ["1", "6", "0"])
@@ -5,7 +5,8 @@ from .views import (AddQuestionView, AddSubmissionView, AssessmentAnalyticsByTag
                     CrossAssessmentAnalyticsView, DeleteQuestionView, 
                     GetSubmissionByStudentAndAssessmentView, 
                     GradeStudentsView,AssessmentUnpublishView,
-                    AgregateAssessmentAnalyticsView, GradeSubmissionView
+                    AgregateAssessmentAnalyticsView, GradeSubmissionView,
+                    RegradeAssessmentView
                     )
 
 urlpatterns = [
@@ -23,4 +24,5 @@ urlpatterns = [
     path('analytics/', AssessmentAnalyticsByTagView.as_view(), name='analytics-by-tag'),
     path('analytics/agregate/', AgregateAssessmentAnalyticsView.as_view(), name='agregate-assessment-analytics'),
     path('analytics/grade/', GradeStudentsView.as_view(), name='grade-students'),
+    path('regrade/<int:assessment_id>/', RegradeAssessmentView.as_view(), name='regrade-assessment'),
 ]
\ No newline at end of file
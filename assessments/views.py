@@ -3,15 +3,19 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.exceptions import NotFound, PermissionDenied
+from rest_framework.renderers import JSONRenderer
 
+from django.http import HttpResponse
 from django.utils import timezone
 from django.db import transaction
 
 from assessments.services.analytics_service import AnalyticsService
+from assessments.services.assessment_cache_service import AssessmentCacheService
+from assessments.services.grading_service import GradingService
 from classrooms.models import Classroom
 from users.models import Student, User
 from .models import Answer, Assessment, Question, Submission
-from .serializers import AnalyticsSerializer, AssessmentSerializer, CreateQuestionSerializer, CreateSubmissionSerializer, GradeShortAnswerSerializer, QuestionSerializer
+from .serializers import AssessmentSerializer, AssessmentSummarySerializer, CreateQuestionSerializer, CreateSubmissionSerializer, GradeShortAnswerSerializer, QuestionSerializer, StudentAssessmentSerializer
 
 class AssessmentListCreateView(APIView):
     permission_classes = [IsAuthenticated]
@@ -24,7 +28,14 @@ class AssessmentListCreateView(APIView):
         else:
             assessments = Assessment.objects.filter(classroom_id=classroom_id)
 
-        serializer = AssessmentSerializer(assessments, many=True)
+        # Summaries by default; ?include=questions returns the full question tree,
+        # without correct answers for students.
+        if request.query_params.get('include') == 'questions':
+            serializer_class = StudentAssessmentSerializer if user.role == 'student' else AssessmentSerializer
+        else:
+            serializer_class = AssessmentSummarySerializer
+        assessments = serializer_class.setup_eager_loading(assessments.order_by('id'))
+        serializer = serializer_class(assessments, many=True)
         return Response({
             "isSuccess": True,
             "message": "Assessments retrieved successfully.",
@@ -137,7 +148,9 @@ class AssessmentDetailView(generics.RetrieveAPIView):
         assessment_id = self.kwargs.get("id")
 
         try:
-            assessment = Assessment.objects.get(id=assessment_id, classroom_id=classroom_id)
+            assessment = AssessmentSerializer.setup_eager_loading(Assessment.objects.all()).get(
+                id=assessment_id, classroom_id=classroom_id
+            )
         except Assessment.DoesNotExist:
             raise NotFound(detail="Assessment not found")
 
@@ -149,6 +162,8 @@ class AssessmentDetailView(generics.RetrieveAPIView):
         return assessment
 
     def retrieve(self, request, *args, **kwargs):
+        if request.user.role == "student":
+            return self.retrieve_for_student()
         instance = self.get_object()
         serializer = self.get_serializer(instance)
         return Response({
@@ -158,6 +173,35 @@ class AssessmentDetailView(generics.RetrieveAPIView):
             "errors": []
         })
 
+    def retrieve_for_student(self):
+        """Serve the published, answer-free payload from the versioned cache."""
+        classroom_id = self.kwargs.get("classroom_id")
+        assessment_id = self.kwargs.get("id")
+        row = Assessment.objects.filter(
+            id=assessment_id, classroom_id=classroom_id
+        ).values_list("is_published", "updated_at").first()
+        if row is None:
+            raise NotFound(detail="Assessment not found")
+        is_published, updated_at = row
+        if not is_published:
+            raise PermissionDenied(detail="Assessment is not published")
+
+        payload = AssessmentCacheService.get_student_payload(
+            assessment_id,
+            AssessmentCacheService.version_of(updated_at),
+            lambda: self.render_student_payload(assessment_id),
+        )
+        return HttpResponse(payload, content_type="application/json")
+
+    def render_student_payload(self, assessment_id):
+        assessment = StudentAssessmentSerializer.setup_eager_loading(Assessment.objects.all()).get(id=assessment_id)
+        return JSONRenderer().render({
+            "isSuccess": True,
+            "message": "Assessment retrieved successfully.",
+            "data": StudentAssessmentSerializer(assessment).data,
+            "errors": []
+        })
+
 class AddQuestionView(APIView):
     permission_classes = [IsAuthenticated]
 
@@ -327,8 +371,8 @@ class AddSubmissionView(APIView):
                 "errors": ["You have already submitted this assessment."]
             }, status=status.HTTP_400_BAD_REQUEST)
 
-        questions = assessment.questions.all().order_by('id')
-        if len(data["answers"]) != len(questions):
+        answer_key = GradingService.get_answer_key(assessment.id)
+        if len(data["answers"]) != len(answer_key):
             return Response({
                 "isSuccess": False,
                 "message": "Submission could not be created",
@@ -338,30 +382,16 @@ class AddSubmissionView(APIView):
         
 
         student_responses_map = data["answers"]
-        total_score = 0
-
-        for question in questions: # questions = assessment.questions.all().order_by('id')
-            student_response_for_q = student_responses_map.get(str(question.id))
+        # Short answers are auto-scored as 0; manual grading updates them later.
+        total_score = GradingService.score_submission(answer_key, student_responses_map)
 
-            if not student_response_for_q:
-                # Handle case where student didn't answer this question (though frontend should prevent)
-                continue
-
-            if question.question_type == 'multiple_choice':
-                correct_answer_option = question.answers.filter(is_correct=True).first()
-                if correct_answer_option and str(correct_answer_option.id) == student_response_for_q:
-                    total_score += question.weight
-            elif question.question_type == 'short_answer':
-                # Auto-score for short answer is 0 for now.
-                # Manual grading would update this later.
-                pass # Or some partial credit for completion if desired
-
-        submission = Submission.objects.create(
-            student=student,
-            assessment=assessment,
-            answers=student_responses_map, # Store the map directly
-            score=total_score
-        )
+        with transaction.atomic():
+            submission = Submission.objects.create(
+                student=student,
+                assessment=assessment,
+                answers=student_responses_map, # Store the map directly
+                score=total_score
+            )
 
         return Response({
             "isSuccess": True,
@@ -447,7 +477,8 @@ class GradeSubmissionView(APIView):
                 "errors": ["One or more provided IDs have an invalid format."]
             }, status=status.HTTP_400_BAD_REQUEST)
 
-        serializer = GradeShortAnswerSerializer(data=request.data)
+        answer_key = GradingService.get_answer_key(submission.assessment_id)
+        serializer = GradeShortAnswerSerializer(data=request.data, context={"answer_key": answer_key})
         if not serializer.is_valid():
             return Response({
                 "isSuccess": False,
@@ -462,33 +493,10 @@ class GradeSubmissionView(APIView):
             if not submission.graded_details:
                 submission.graded_details = {}
             
-            assessment_questions = submission.assessment.questions.all()
-            question_weights = {str(q.id): q.weight for q in assessment_questions}
-
             for q_id_str, score_val in manual_scores_input.items():
                 submission.graded_details[q_id_str] = float(score_val)
 
-            new_total_score = 0
-
-            for question in assessment_questions:
-                if question.question_type == 'multiple_choice':
-                    student_answer_id = submission.answers.get(str(question.id))
-                    correct_answer_option = question.answers.filter(is_correct=True).first()
-                    if correct_answer_option and student_answer_id == str(correct_answer_option.id):
-                        new_total_score += question.weight
-
-            for q_id_str, assigned_score in submission.graded_details.items():
-                try:
-                    q = Question.objects.get(id=q_id_str)
-                    if q.question_type == 'short_answer':
-                        if isinstance(assigned_score, (int, float)):
-                            new_total_score += assigned_score
-                except Question.DoesNotExist:
-                    pass 
-                except ValueError:
-                    pass
-
-            submission.score = new_total_score
+            submission.calculate_total_score()
             submission.save()
 
         return Response({
@@ -534,13 +542,9 @@ class AgregateAssessmentAnalyticsView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request, classroom_id):
-        assessments = Assessment.objects.filter(
-            classroom_id=classroom_id,
-            submissions__isnull=False
-        ).distinct()
-        print("Assessments with submissions:", assessments)
+        analysis = AnalyticsService.perform_classroom_analysis(classroom_id)
 
-        if not assessments.exists():
+        if not analysis:
             return Response({
                 "isSuccess": False,
                 "message": "No assessments with submissions found",
@@ -548,19 +552,10 @@ class AgregateAssessmentAnalyticsView(APIView):
                 "errors": ["No analytics available for this classroom"]
             }, status=status.HTTP_404_NOT_FOUND)
 
-        analytics_data = {}
-
-        for assessment in assessments:
-            data = AnalyticsService.perform_class_analysis(assessment.id)
-            if data:
-                analytics_data[str(assessment.id)] = {
-                    "data": data
-                }
-            else:
-                analytics_data[str(assessment.id)] = {
-                    "error": "No analytics data available"
-                }
-        print("Analytics data:j", analytics_data)
+        analytics_data = {
+            str(assessment_id): {"data": data}
+            for assessment_id, data in analysis.items()
+        }
         return Response({
             "isSuccess": True,
             "message": "Analytics retrieved successfully",
@@ -593,50 +588,43 @@ class AssessmentAnalyticsByTagView(APIView):
                 "errors": ["Tags must be a non-empty list."]
             }, status=status.HTTP_400_BAD_REQUEST)
 
-        assessments = Assessment.objects.filter(classroom_id=classroom_id)
-
-        analytics_result = []
-        for assessment in assessments:
-            if not Question.objects.filter(assessment=assessment, tags__overlap=tags).exists():
-                continue
-
-            submissions = Submission.objects.filter(assessment=assessment)
-
-            if submissions.exists():
-                scores = [s.score for s in submissions]
-                scores.sort()
-                total = len(scores)
-                mean_score = sum(scores) / total
-                median_score = scores[total // 2] if total % 2 != 0 else (scores[total//2 - 1] + scores[total//2]) / 2
-                mode_score = max(set(scores), key=scores.count) if scores else None
-
-                data = {
-                    "meanScore": mean_score,
-                    "medianScore": median_score,
-                    "modeScore": mode_score,
-                    "standardDeviation": float(Submission.objects.filter(assessment=assessment).aggregate(std=Avg("score"))["std"] or 0),
-                    "variance": float(sum((x - mean_score) ** 2 for x in scores) / total),
-                    "highestScore": max(scores),
-                    "lowestScore": min(scores),
-                    "range": max(scores) - min(scores),
-                    "totalSubmissions": total,
-                }
-
-                analytics_result.append(data)
-
-        serializer = AnalyticsSerializer(data=analytics_result, many=True)
-        serializer.is_valid(raise_exception=True)
+        if not all(isinstance(tag, str) for tag in tags):
+            return Response({
+                "isSuccess": False,
+                "message": "Tags are required",
+                "data": None,
+                "errors": ["Tags must be strings."]
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        data = AnalyticsService.perform_tag_analysis(classroom_id, list(dict.fromkeys(tags)))
         return Response({
             "isSuccess": True,
             "message": "Analytics retrieved successfully.",
-            "data": serializer.data,
+            "data": data,
             "errors": []
         })
 
+def parse_student_ids(value):
+    """Student ids from a JSON list; ValueError on anything else."""
+    if not isinstance(value, list):
+        raise ValueError("Expected a list of ids.")
+    return [int(item) for item in value]
+
+
 class GradeStudentsView(APIView):
+    """
+    Store each listed student's share of correctly answered questions (0-100) as
+    their submission score, as this endpoint always has. Unlike
+    ``RegradeAssessmentView`` it ignores question weights and manually graded
+    short answers.
+    """
+
     def post(self, request, classroom_id):
-        student_ids = request.data.get("studentIds", [])
         assessment_id = request.query_params.get("assessmentId")
+        try:
+            student_ids = parse_student_ids(request.data.get("studentIds", []))
+        except (TypeError, ValueError):
+            student_ids = None
 
         if not student_ids:
             return Response({
@@ -664,30 +652,53 @@ class GradeStudentsView(APIView):
                 "errors": ["Invalid assessment for this classroom."]
             }, status=status.HTTP_404_NOT_FOUND)
 
-        
-        updated = 0
-        for student_id in student_ids:
-            try:
-                submission = Submission.objects.get(student_id=student_id, assessment=assessment)
-            except Submission.DoesNotExist:
-                continue
+        result = GradingService.regrade_assessment(assessment.id, student_ids=student_ids, scoring="percentage")
+        updated = result["processed"]
 
-            correct_answers = 0
-            total_questions = assessment.questions.count()
-            answer_map = submission.answers
+        return Response({
+            "isSuccess": True,
+            "message": f"{updated} student(s) graded successfully.",
+            "data": True,
+            "errors": []
+        }, status=status.HTTP_200_OK)
 
-            for question in assessment.questions.all():
-                correct = question.answers.filter(is_correct=True).first()
-                if correct and str(question.id) in answer_map and str(correct.id) == str(answer_map[str(question.id)]):
-                    correct_answers += 1
 
-            submission.score = round((correct_answers / total_questions) * 100, 2) if total_questions else 0
-            submission.save()
-            updated += 1
+class RegradeAssessmentView(APIView):
+    permission_classes = [IsAuthenticated]
 
+    def post(self, request, classroom_id, assessment_id):
+        if request.user.role == 'student':
+            return Response({
+                "isSuccess": False,
+                "message": "Permission Denied.",
+                "data": None,
+                "errors": ["Students cannot regrade assessments."]
+            }, status=status.HTTP_403_FORBIDDEN)
+
+        student_ids = request.data.get("studentIds")
+        if student_ids is not None:
+            try:
+                student_ids = parse_student_ids(student_ids)
+            except (TypeError, ValueError):
+                return Response({
+                    "isSuccess": False,
+                    "message": "Invalid student ids",
+                    "data": None,
+                    "errors": ["studentIds must be a list of ids when provided."]
+                }, status=status.HTTP_400_BAD_REQUEST)
+
+        if not Assessment.objects.filter(id=assessment_id, classroom_id=classroom_id).exists():
+            return Response({
+                "isSuccess": False,
+                "message": "Assessment not found",
+                "data": None,
+                "errors": ["Invalid assessment for this classroom."]
+            }, status=status.HTTP_404_NOT_FOUND)
+
+        result = GradingService.regrade_assessment(assessment_id, student_ids=student_ids)
         return Response({
             "isSuccess": True,
-            "message": f"{updated} student(s) graded successfully.",
-            "data": True,
+            "message": f"{result['processed']} submission(s) regraded, {result['updated']} score(s) changed.",
+            "data": result,
             "errors": []
         }, status=status.HTTP_200_OK)
@@ -0,0 +1,95 @@
+import threading
+import time
+import uuid
+
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework import permissions
+
+from .models import ClassroomMembership
+
+ACCESS_CACHE_TIMEOUT = 5 * 60
+LOCAL_TTL = 5
+LOCAL_MAX_ENTRIES = 10000
+
+
+class ClassroomAccess:
+    """
+    Cached "may this user enter this classroom" decisions. A small per-process table
+    with a few seconds' TTL absorbs reconnect bursts; behind it the shared cache holds
+    decisions under a per-classroom generation token that membership changes replace.
+    """
+    _local = {}
+    _lock = threading.Lock()
+
+    @staticmethod
+    def generation_cache_key(classroom_id):
+        return f"classroom:{classroom_id}:access_generation"
+
+    @staticmethod
+    def decision_cache_key(user_id, classroom_id, generation):
+        return f"classroom:{classroom_id}:access:{user_id}:{generation}"
+
+    @staticmethod
+    def get_generation(classroom_id):
+        key = ClassroomAccess.generation_cache_key(classroom_id)
+        generation = cache.get(key)
+        if generation is None:
+            cache.add(key, uuid.uuid4().hex, None)
+            generation = cache.get(key)
+        return generation
+
+    @staticmethod
+    def invalidate(classroom_ids):
+        """
+        Forget the decisions for ``classroom_ids`` once the current transaction commits;
+        clearing them earlier would let a concurrent check cache the old membership again.
+        """
+        classroom_ids = {int(classroom_id) for classroom_id in classroom_ids}
+        if classroom_ids:
+            transaction.on_commit(lambda: ClassroomAccess.invalidate_now(classroom_ids))
+
+    @staticmethod
+    def invalidate_now(classroom_ids):
+        cache.set_many(
+            {ClassroomAccess.generation_cache_key(c_id): uuid.uuid4().hex for c_id in classroom_ids}, None
+        )
+        with ClassroomAccess._lock:
+            for key in [key for key in ClassroomAccess._local if key[1] in classroom_ids]:
+                del ClassroomAccess._local[key]
+
+    @staticmethod
+    def has_access(user_id, classroom_id):
+        key = (int(user_id), int(classroom_id))
+        now = time.monotonic()
+        entry = ClassroomAccess._local.get(key)
+        if entry is not None and entry[0] > now:
+            return entry[1]
+
+        decision_key = ClassroomAccess.decision_cache_key(*key, ClassroomAccess.get_generation(key[1]))
+        allowed = cache.get(decision_key)
+        if allowed is None:
+            allowed = ClassroomMembership.objects.filter(classroom_id=key[1], user_id=key[0]).exists()
+            cache.set(decision_key, allowed, ACCESS_CACHE_TIMEOUT)
+
+        with ClassroomAccess._lock:
+            if len(ClassroomAccess._local) >= LOCAL_MAX_ENTRIES:
+                ClassroomAccess._local.clear()
+            ClassroomAccess._local[key] = (now + LOCAL_TTL, allowed)
+        return allowed
+
+
+class IsClassroomMember(permissions.BasePermission):
+    """
+    Allows the classroom's teacher and students. The classroom id is read from the URL
+    kwarg named by the view's ``classroom_url_kwarg`` (default ``classroom_id``).
+    """
+    message = "You are not a member of this classroom."
+
+    def has_permission(self, request, view):
+        if not (request.user and request.user.is_authenticated):
+            return False
+        classroom_id = view.kwargs.get(getattr(view, "classroom_url_kwarg", "classroom_id"))
+        if classroom_id is None:
+            return False
+        return ClassroomAccess.has_access(request.user.id, classroom_id)
@@ -0,0 +1,150 @@
+import hashlib
+import os
+import uuid
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from .models import AttachmentBlob
+
+BLOB_DIR = "blobs"
+TEMP_DIR = "blobs/tmp"
+PURGE_BATCH_SIZE = 500
+
+
+class BlobStore:
+    """
+    Content-addressed attachment storage. Uploads are hashed in the same streaming
+    pass that copies them to a temporary file; content that is already stored only
+    gains a reference, so re-uploading the same syllabus to many announcements
+    writes its bytes once. New content is moved to its final name before its row is
+    inserted, so a committed blob always has its file; a rollback can only leave a
+    file without a row, which ``purge_stale_uploads`` sweeps.
+    """
+
+    @staticmethod
+    def storage():
+        return AttachmentBlob._meta.get_field("file").storage
+
+    @staticmethod
+    def temp_dir():
+        return BlobStore.storage().path(TEMP_DIR)
+
+    @staticmethod
+    def blob_name(sha256, filename):
+        extension = os.path.splitext(filename or "")[1].lower()[:16]
+        return f"{sha256[:2]}/{sha256}{extension}"
+
+    @staticmethod
+    def write_temp(file):
+        """Copy ``file`` to a temporary path; return the path, SHA-256 hex digest and size."""
+        os.makedirs(BlobStore.temp_dir(), exist_ok=True)
+        path = os.path.join(BlobStore.temp_dir(), uuid.uuid4().hex)
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            with open(path, "wb") as temp:
+                for chunk in file.chunks():
+                    digest.update(chunk)
+                    temp.write(chunk)
+                    size += len(chunk)
+        except BaseException:
+            BlobStore.discard(path)
+            raise
+        return path, digest.hexdigest(), size
+
+    @staticmethod
+    def store(file, sha256=None):
+        """Return the blob holding ``file``'s content with one more reference taken."""
+        path = None
+        if sha256 is None:
+            path, sha256, size = BlobStore.write_temp(file)
+        try:
+            blob = BlobStore.existing(sha256, file, path)
+            if blob is not None:
+                return blob
+            if path is None:
+                path, _, size = BlobStore.write_temp(file)
+
+            blob = AttachmentBlob(sha256=sha256, size=size, ref_count=1)
+            blob.file.name = blob.file.field.generate_filename(blob, BlobStore.blob_name(sha256, file.name))
+            BlobStore.place(path, BlobStore.storage().path(blob.file.name))
+            try:
+                with transaction.atomic():
+                    blob.save()
+            except IntegrityError:
+                # A concurrent upload of the same content won the race; share its blob.
+                return BlobStore.existing(sha256, file)
+            return blob
+        finally:
+            if path is not None:
+                BlobStore.discard(path)
+
+    @staticmethod
+    def existing(sha256, file, path=None):
+        """
+        The stored blob for ``sha256`` with one more reference taken, or None. A blob
+        whose file has gone missing gets ``file`` (or its copy at ``path``) back.
+        """
+        if not BlobStore.add_reference(sha256):
+            return None
+        blob = AttachmentBlob.objects.get(sha256=sha256)
+        final_path = BlobStore.storage().path(blob.file.name)
+        if not os.path.exists(final_path):
+            if path is None:
+                path, _, _ = BlobStore.write_temp(file)
+            BlobStore.place(path, final_path)
+        return blob
+
+    @staticmethod
+    def add_reference(sha256):
+        return AttachmentBlob.objects.filter(sha256=sha256).update(ref_count=F("ref_count") + 1)
+
+    @staticmethod
+    def place(path, final_path):
+        os.makedirs(os.path.dirname(final_path), exist_ok=True)
+        # Same name, same content: replacing a file left by an earlier attempt is harmless.
+        os.replace(path, final_path)
+
+    @staticmethod
+    def discard(path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    @staticmethod
+    def purge_orphans(cutoff):
+        """
+        Delete blob files and temporary copies last modified before ``cutoff`` that no
+        blob refers to, e.g. left by a transaction that rolled back; return how many.
+        """
+        root = BlobStore.storage().path(BLOB_DIR)
+        candidates = {}
+        for directory, _, names in os.walk(root):
+            for name in names:
+                path = os.path.join(directory, name)
+                if os.path.getmtime(path) < cutoff.timestamp():
+                    candidates[os.path.relpath(path, BlobStore.storage().location).replace(os.sep, "/")] = path
+        referenced = set()
+        names = list(candidates)
+        for start in range(0, len(names), PURGE_BATCH_SIZE):
+            referenced.update(AttachmentBlob.objects.filter(
+                file__in=names[start:start + PURGE_BATCH_SIZE]
+            ).values_list("file", flat=True))
+        for name, path in candidates.items():
+            if name not in referenced:
+                BlobStore.discard(path)
+        return len(candidates) - len(referenced)
+
+    @staticmethod
+    def release(blob_id):
+        """Drop one reference; delete the blob and its file when none remain."""
+        with transaction.atomic():
+            AttachmentBlob.objects.filter(pk=blob_id, ref_count__gt=0).update(ref_count=F("ref_count") - 1)
+            blob = AttachmentBlob.objects.select_for_update().filter(pk=blob_id).first()
+            if blob is None or blob.ref_count > 0 or blob.attachments.exists():
+                return
+            storage, name = blob.file.storage, blob.file.name
+            blob.delete()
+            transaction.on_commit(lambda: storage.delete(name))
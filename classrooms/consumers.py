@@ -2,9 +2,12 @@
 import json
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
-from django.utils import timezone
-from .models import Message, Classroom, MessageReadStatus, Teacher, Student
+from .access import ClassroomAccess
+from .message_writer import MessageWriter
+from .models import ChatReadWatermark
+from .read_receipts import ReadReceipts
 from django.contrib.auth import get_user_model
+from users.display_names import DisplayNames
 import logging
 logger = logging.getLogger(__name__)
 User = get_user_model()
@@ -43,6 +46,11 @@ class ChatConsumer(AsyncWebsocketConsumer):
                 self.channel_name
             )
             await self.accept()
+            self.display_name = await self.get_user_display_name(self.user)
+            await self.send(text_data=json.dumps({
+                'type': 'unread',
+                'count': await self.get_unread_count(),
+            }))
             logger.info(f"WebSocket connection accepted for user {self.user.id} in classroom {self.classroom_id}")
         except Exception as e:
             logger.error(f"Error during WebSocket connection: {str(e)}")
@@ -51,16 +59,7 @@ class ChatConsumer(AsyncWebsocketConsumer):
     @database_sync_to_async
     def verify_classroom_access(self):
         """Verify the user has access to this classroom"""
-        from django.core.exceptions import ObjectDoesNotExist
-        try:
-            classroom = Classroom.objects.get(id=self.classroom_id)
-            if self.user.role == 'teacher':
-                return classroom.teacher.user == self.user
-            elif self.user.role == 'student':
-                return classroom.get_all_student().filter(user=self.user).exists()
-            return False
-        except ObjectDoesNotExist:
-            return False
+        return ClassroomAccess.has_access(self.user.id, self.classroom_id)
 
     async def disconnect(self, close_code):
         await self.channel_layer.group_discard(
@@ -75,22 +74,20 @@ class ChatConsumer(AsyncWebsocketConsumer):
         if message_type == 'message':
             # Handle new messages
             message_content = data['message']
-            message = await self.save_message(
-                self.user.id, 
-                self.classroom_id, 
+            # Queued for a batched insert; the id and timestamp are final already.
+            message = await MessageWriter.current().submit(
+                self.user.id,
+                self.classroom_id,
                 message_content
             )
 
-            # Get user's display name
-            display_name = await self.get_user_display_name(self.user)
-
             # Broadcast message to group
             await self.channel_layer.group_send(
                 self.room_group_name,
                 {
                     'type': 'chat_message',
                     'message': message_content,
-                    'sender': display_name,
+                    'sender': self.display_name,
                     'sender_id': self.user.id,
                     'message_id': message.id,
                     'timestamp': message.timestamp.isoformat(),
@@ -98,23 +95,12 @@ class ChatConsumer(AsyncWebsocketConsumer):
             )
         
         elif message_type == 'read_receipt':
-            # Handle read receipts
-            message_id = data['message_id']
-            await self.mark_as_read(message_id, self.user.id)
-            
-            # Get user's display name
-            display_name = await self.get_user_display_name(self.user)
-
-            # Broadcast read receipt to sender
-            await self.channel_layer.group_send(
-                self.room_group_name,
-                {
-                    'type': 'read_receipt',
-                    'message_id': message_id,
-                    'reader_id': self.user.id,
-                    'reader_name': display_name,
-                }
-            )
+            # Coalesced into the user's watermark and announced with others' receipts.
+            try:
+                message_id = int(data['message_id'])
+            except (KeyError, TypeError, ValueError):
+                return
+            ReadReceipts.current().mark(self.classroom_id, self.user.id, message_id, self.display_name)
 
     async def chat_message(self, event):
         await self.send(text_data=json.dumps({
@@ -126,46 +112,17 @@ class ChatConsumer(AsyncWebsocketConsumer):
             'timestamp': event['timestamp'],
         }))
 
-    async def read_receipt(self, event):
+    async def read_receipts(self, event):
         await self.send(text_data=json.dumps({
-            'type': 'read_receipt',
-            'message_id': event['message_id'],
-            'reader_id': event['reader_id'],
-            'reader_name': event['reader_name'],
+            'type': 'read_receipts',
+            'receipts': event['receipts'],
         }))
 
     @database_sync_to_async
     def get_user_display_name(self, user):
         """Get the user's display name based on their role"""
-        if user.role == 'teacher':
-            teacher = Teacher.objects.filter(user=user).first()
-            if teacher:
-                return f"{teacher.first_name} {teacher.last_name}"
-        elif user.role == 'student':
-            student = Student.objects.filter(user=user).first()
-            if student:
-                return f"{student.first_name} {student.last_name}"
-        return user.email 
+        return DisplayNames.resolve(user.id) or user.email
 
     @database_sync_to_async
-    def save_message(self, user_id, classroom_id, content):  
-        user = User.objects.get(id=user_id)
-        classroom = Classroom.objects.get(id=classroom_id)
-        return Message.objects.create(
-            sender=user,
-            classroom=classroom,
-            content=content
-        )
-
-    @database_sync_to_async
-    def mark_as_read(self, message_id, user_id):
-        obj, created = MessageReadStatus.objects.get_or_create(
-            message_id=message_id,
-            user_id=user_id,
-            defaults={'is_read': True, 'read_at': timezone.now()}
-        )
-        if not created and not obj.is_read:
-            obj.is_read = True
-            obj.read_at = timezone.now()
-            obj.save()
-        return obj
+    def get_unread_count(self):
+        return ChatReadWatermark.unread_counts(self.user.id, [int(self.classroom_id)])[int(self.classroom_id)]
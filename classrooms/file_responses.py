@@ -0,0 +1,126 @@
+import hashlib
+import re
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import content_disposition_header, http_date, parse_etags
+
+STREAM_CHUNK_SIZE = 64 * 1024
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def file_etag(name, size, modified_at):
+    """Strong validator from the stored name, size and modification time."""
+    token = f"{name}:{size}:{modified_at.timestamp() if modified_at else ''}"
+    return '"%s"' % hashlib.sha256(token.encode()).hexdigest()[:32]
+
+
+def parse_range(header, size):
+    """
+    (start, end) inclusive for a single ``bytes=`` range, None to serve the whole
+    file (no header, multiple ranges or a malformed one) or "unsatisfiable".
+    """
+    if not header or size == 0:
+        return None
+    match = RANGE_RE.match(header.strip())
+    if not match or match.groups() == ("", ""):
+        return None
+    first, last = match.groups()
+    if first == "":
+        # Suffix range: the last N bytes.
+        length = int(last)
+        if length == 0:
+            return "unsatisfiable"
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or end < start:
+        return "unsatisfiable"
+    return start, end
+
+
+def iter_range(file, start, length, chunk_size=STREAM_CHUNK_SIZE):
+    try:
+        file.seek(start)
+        remaining = length
+        while remaining > 0:
+            data = file.read(min(chunk_size, remaining))
+            if not data:
+                break
+            remaining -= len(data)
+            yield data
+    finally:
+        file.close()
+
+
+def offload_response(file_field):
+    """
+    An empty response telling the front proxy to send the file itself, per
+    ATTACHMENT_SENDFILE_BACKEND ("x-accel-redirect" for nginx, "x-sendfile" for
+    Apache/lighttpd), or None when offloading is off or the storage is not local.
+    """
+    backend = getattr(settings, "ATTACHMENT_SENDFILE_BACKEND", None)
+    if backend == "x-accel-redirect":
+        response = HttpResponse()
+        prefix = getattr(settings, "ATTACHMENT_SENDFILE_PREFIX", "/protected-media/")
+        response["X-Accel-Redirect"] = prefix.rstrip("/") + "/" + file_field.name.lstrip("/")
+        return response
+    if backend == "x-sendfile":
+        try:
+            path = file_field.path
+        except NotImplementedError:
+            return None
+        response = HttpResponse()
+        response["X-Sendfile"] = path
+        return response
+    return None
+
+
+def serve_file(request, file_field, filename, content_type, modified_at=None, etag=None):
+    """
+    Serve a stored file with ETag/Last-Modified validators, conditional requests
+    (304/412), single byte ranges (206/416) and optional proxy offload. Without an
+    explicit ``etag`` one is derived from the file's metadata.
+    """
+    size = file_field.size
+    etag = etag or file_etag(file_field.name, size, modified_at)
+    # HTTP dates have one-second resolution.
+    last_modified = int(modified_at.timestamp()) if modified_at else None
+
+    not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if not_modified is not None:
+        return not_modified
+
+    response = offload_response(file_field)
+    if response is not None:
+        response["Content-Type"] = content_type
+    else:
+        byte_range = parse_range(request.META.get("HTTP_RANGE"), size)
+        if_range = request.META.get("HTTP_IF_RANGE")
+        if byte_range is not None and if_range and etag not in parse_etags(if_range):
+            # The client's partial copy is stale; send the whole file.
+            byte_range = None
+
+        if byte_range == "unsatisfiable":
+            response = HttpResponse(status=416)
+            response["Content-Range"] = f"bytes */{size}"
+            return response
+        if byte_range is None:
+            response = FileResponse(file_field.open("rb"), content_type=content_type)
+            response["Content-Length"] = size
+        else:
+            start, end = byte_range
+            length = end - start + 1
+            response = StreamingHttpResponse(
+                iter_range(file_field.open("rb"), start, length), status=206, content_type=content_type
+            )
+            response["Content-Range"] = f"bytes {start}-{end}/{size}"
+            response["Content-Length"] = length
+
+    response["Accept-Ranges"] = "bytes"
+    response["ETag"] = etag
+    if last_modified is not None:
+        response["Last-Modified"] = http_date(last_modified)
+    response["Content-Disposition"] = content_disposition_header(as_attachment=True, filename=filename)
+    return response
@@ -0,0 +1,36 @@
+import os
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from classrooms.blobs import BlobStore
+from classrooms.models import AttachmentUpload
+from classrooms.uploads import ChunkedUploads
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete resumable uploads untouched for --hours, temporary files with no upload left "
+        "and attachment files older than --hours that no blob refers to."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--hours", type=int, default=24)
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(hours=options["hours"])
+        stale = AttachmentUpload.objects.filter(updated_at__lt=cutoff)
+        expired = stale.count()
+        stale.delete()
+
+        removed = 0
+        temp_dir = ChunkedUploads.temp_dir()
+        if os.path.isdir(temp_dir):
+            live = {f"{upload_id}.part" for upload_id in AttachmentUpload.objects.values_list("id", flat=True)}
+            for name in os.listdir(temp_dir):
+                if name.endswith(".part") and name not in live:
+                    ChunkedUploads.discard(os.path.join(temp_dir, name))
+                    removed += 1
+        removed += BlobStore.purge_orphans(cutoff)
+        self.stdout.write(self.style.SUCCESS(f"Expired {expired} upload(s), removed {removed} temporary file(s)."))
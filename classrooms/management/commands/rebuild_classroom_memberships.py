@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from classrooms.access import ClassroomAccess
+from classrooms.models import Classroom, ClassroomMembership
+
+
+class Command(BaseCommand):
+    help = "Rebuild ClassroomMembership from teachers and batch rosters, or with --check only report drift."
+
+    def add_arguments(self, parser):
+        parser.add_argument("classroom_ids", nargs="*", type=int, help="Limit to these classrooms.")
+        parser.add_argument("--check", action="store_true", help="Report drift without writing.")
+
+    def handle(self, *args, **options):
+        classrooms = Classroom.objects.order_by("id")
+        if options["classroom_ids"]:
+            classrooms = classrooms.filter(id__in=options["classroom_ids"])
+        classroom_ids = list(classrooms.values_list("id", flat=True))
+
+        if not options["check"]:
+            # Orphaned rows of deleted classrooms are removed by the cascade, so only
+            # existing classrooms need syncing.
+            for start in range(0, len(classroom_ids), 100):
+                ClassroomAccess.invalidate(ClassroomMembership.sync_classrooms(classroom_ids[start:start + 100]))
+            self.stdout.write(self.style.SUCCESS(f"Rebuilt memberships for {len(classroom_ids)} classroom(s)."))
+            return
+
+        expected = ClassroomMembership.expected_rows(classroom_ids)
+        stored = dict(
+            ((classroom_id, user_id), role)
+            for classroom_id, user_id, role in ClassroomMembership.objects.filter(
+                classroom_id__in=classroom_ids
+            ).values_list("classroom_id", "user_id", "role")
+        )
+        drifted = sorted({key[0] for key in set(expected.items()) ^ set(stored.items())})
+        for classroom_id in drifted:
+            self.stdout.write(f"Classroom {classroom_id}: membership drift")
+        if drifted:
+            raise CommandError(f"{len(drifted)} classroom(s) have drifted memberships; run without --check to rebuild.")
+        self.stdout.write(self.style.SUCCESS("No drift found."))
@@ -0,0 +1,22 @@
+import asyncio
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from config.channel_layers import ChannelHub
+
+
+class Command(BaseCommand):
+    help = "Run the Unix-socket hub that relays channel layer messages between worker processes."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--path", default=getattr(settings, "CHANNEL_HUB_SOCKET", "") or "/tmp/plp-channel-hub.sock")
+
+    def handle(self, *args, **options):
+        asyncio.run(self.serve(options["path"]))
+
+    async def serve(self, path):
+        server = await ChannelHub(path).serve()
+        self.stdout.write(self.style.SUCCESS(f"Channel hub listening on {path}"))
+        async with server:
+            await server.serve_forever()
@@ -0,0 +1,241 @@
+import asyncio
+import atexit
+import concurrent.futures
+import logging
+import time
+import weakref
+from collections import deque
+
+from channels.db import database_sync_to_async
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.utils import timezone
+
+from .models import Message
+
+logger = logging.getLogger(__name__)
+
+ID_BLOCK_SIZE = 100
+RETRY_DELAY = 0.5
+MAX_RETRY_DELAY = 10.0
+
+
+def reserve_message_ids(count):
+    """
+    Take ``count`` primary keys for chat messages from the database, or None when
+    the backend has no way to hand them out before the rows are inserted.
+    """
+    table = Message._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            cursor.execute(
+                "SELECT nextval(pg_get_serial_sequence(%s, 'id')) FROM generate_series(1, %s)", [table, count]
+            )
+            return [row[0] for row in cursor.fetchall()]
+        if connection.vendor == "sqlite":
+            # AUTOINCREMENT keys never go below sqlite_sequence, so raising it
+            # reserves the block; the UPDATE holds the write lock until commit.
+            with transaction.atomic():
+                cursor.execute("UPDATE sqlite_sequence SET seq = seq + %s WHERE name = %s", [count, table])
+                if cursor.rowcount == 0:
+                    cursor.execute(
+                        f'INSERT INTO sqlite_sequence (name, seq) SELECT %s, COALESCE(MAX(id), 0) + %s FROM "{table}"',
+                        [table, count],
+                    )
+                cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = %s", [table])
+                last = cursor.fetchone()[0]
+            return list(range(last - count + 1, last + 1))
+    return None
+
+
+def write_messages(messages):
+    """Insert a batch of messages; rows that violate a constraint are logged and dropped."""
+    written_at = timezone.now()
+    for message in messages:
+        message.written_at = written_at
+    try:
+        with transaction.atomic():
+            Message.objects.bulk_create(messages)
+        return
+    except IntegrityError:
+        pass
+    # Usually a classroom or sender deleted while its messages were queued.
+    for message in messages:
+        try:
+            with transaction.atomic():
+                message.save(force_insert=True)
+        except IntegrityError:
+            logger.warning("Dropping chat message %s for classroom %s.", message.id, message.classroom_id)
+
+
+class MessageWriter:
+    """
+    Write-behind persistence for chat messages. ``submit`` gives a message its id
+    and timestamp immediately so it can be broadcast, and a background task inserts
+    queued messages with one ``bulk_create`` every CHAT_WRITE_BEHIND_INTERVAL_MS or
+    CHAT_WRITE_BEHIND_BATCH_SIZE messages. Producers wait once
+    CHAT_WRITE_BEHIND_MAX_PENDING messages are unwritten, so a lagging database
+    slows chat down instead of growing the queue without bound. Whatever is still
+    queued when the process exits normally is written by an ``atexit`` hook.
+
+    Queued messages exist only in this process's memory: if it is killed outright
+    (SIGKILL, the OOM killer) they are lost. That is normally the last
+    CHAT_WRITE_BEHIND_INTERVAL_MS of messages, and everything since the database
+    became unavailable while writes are failing.
+    """
+
+    _writers = weakref.WeakKeyDictionary()
+
+    def __init__(self):
+        self.interval = getattr(settings, "CHAT_WRITE_BEHIND_INTERVAL_MS", 50) / 1000
+        self.batch_size = getattr(settings, "CHAT_WRITE_BEHIND_BATCH_SIZE", 200)
+        self.max_pending = getattr(settings, "CHAT_WRITE_BEHIND_MAX_PENDING", 5000)
+        self.pending = deque()
+        self.in_flight = []
+        self.ids = deque()
+        self.preallocate = True
+        self._id_lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        self._written = asyncio.Condition()
+        self._task = None
+
+    @classmethod
+    def current(cls):
+        """The writer of the running event loop."""
+        loop = asyncio.get_running_loop()
+        writer = cls._writers.get(loop)
+        if writer is None:
+            writer = cls._writers[loop] = cls()
+        return writer
+
+    @property
+    def backlog(self):
+        return len(self.pending) + len(self.in_flight)
+
+    async def next_id(self):
+        async with self._id_lock:
+            if not self.ids and self.preallocate:
+                ids = await database_sync_to_async(reserve_message_ids)(ID_BLOCK_SIZE)
+                if ids is None:
+                    self.preallocate = False
+                else:
+                    self.ids.extend(ids)
+            return self.ids.popleft() if self.ids else None
+
+    async def submit(self, sender_id, classroom_id, content):
+        """Return the message with its id and timestamp set; it is written shortly after."""
+        async with self._written:
+            await self._written.wait_for(lambda: self.backlog < self.max_pending)
+
+        message = Message(sender_id=sender_id, classroom_id=classroom_id, content=content, timestamp=timezone.now())
+        message.id = await self.next_id()
+        if message.id is None:
+            await database_sync_to_async(message.save)()
+            return message
+
+        self.pending.append(message)
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+        if len(self.pending) >= self.batch_size:
+            self._wakeup.set()
+        return message
+
+    def is_pending(self, message_id):
+        return any(message.id == message_id for message in self.pending) or any(
+            message.id == message_id for message in self.in_flight
+        )
+
+    async def wait_written(self, message_id):
+        """Wait until a queued message is in the database (e.g. before referencing it)."""
+        if self.is_pending(message_id):
+            await self._wait_until(lambda: not self.is_pending(message_id))
+
+    async def _wait_until(self, done):
+        """Wait for ``done()``, keeping the writer from idling out its interval meanwhile."""
+        def check():
+            if done():
+                return True
+            # Messages queued after the wakeup was consumed would otherwise wait a full interval.
+            self._wakeup.set()
+            return False
+
+        async with self._written:
+            await self._written.wait_for(check)
+
+    async def _run(self):
+        delay = RETRY_DELAY
+        while self.pending:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            while self.pending:
+                count = min(len(self.pending), self.batch_size)
+                self.in_flight = [self.pending.popleft() for _ in range(count)]
+                try:
+                    await database_sync_to_async(write_messages)(self.in_flight)
+                except asyncio.CancelledError:
+                    self.requeue_in_flight()
+                    raise
+                except Exception:
+                    logger.exception("Writing %s chat messages failed; retrying in %.1fs.", count, delay)
+                    self.requeue_in_flight()
+                    # The batch is back in the queue; let waiters re-check where they stand.
+                    async with self._written:
+                        self._written.notify_all()
+                    await asyncio.sleep(delay)
+                    delay = min(delay * 2, MAX_RETRY_DELAY)
+                    continue
+                delay = RETRY_DELAY
+                self.in_flight = []
+                async with self._written:
+                    self._written.notify_all()
+
+    def requeue_in_flight(self):
+        self.pending.extendleft(reversed(self.in_flight))
+        self.in_flight = []
+
+    async def flush(self):
+        """Write everything queued so far."""
+        await self._wait_until(lambda: not self.backlog)
+
+    def flush_sync(self):
+        messages = list(self.in_flight) + list(self.pending)
+        self.pending.clear()
+        self.in_flight = []
+        for start in range(0, len(messages), self.batch_size):
+            write_messages(messages[start:start + self.batch_size])
+
+    @classmethod
+    def flush_all_from_thread(cls, timeout):
+        """
+        Flush the writers of this process's running event loops from a thread outside
+        them (e.g. a sync view of the same ASGI server), waiting at most ``timeout`` seconds.
+        """
+        try:
+            current = asyncio.get_running_loop()
+        except RuntimeError:
+            current = None
+        futures = [
+            asyncio.run_coroutine_threadsafe(writer.flush(), loop)
+            for loop, writer in list(cls._writers.items())
+            if writer.backlog and loop is not current and loop.is_running()
+        ]
+        deadline = time.monotonic() + timeout
+        for future in futures:
+            try:
+                future.result(max(deadline - time.monotonic(), 0))
+            except concurrent.futures.TimeoutError:
+                future.cancel()
+
+    @classmethod
+    def flush_all_sync(cls):
+        for writer in list(cls._writers.values()):
+            try:
+                writer.flush_sync()
+            except Exception:
+                logger.exception("Could not write queued chat messages at shutdown.")
+
+
+atexit.register(MessageWriter.flush_all_sync)
@@ -0,0 +1,60 @@
+from django.db import migrations
+
+
+POSTGRESQL_FORWARDS = [
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    'CREATE INDEX IF NOT EXISTS classrooms_classroom_name_trgm '
+    'ON classrooms_classroom USING gin (name gin_trgm_ops)',
+    'CREATE INDEX IF NOT EXISTS classrooms_classroom_courseno_trgm '
+    'ON classrooms_classroom USING gin ("courseNo" gin_trgm_ops)',
+]
+
+POSTGRESQL_BACKWARDS = [
+    'DROP INDEX IF EXISTS classrooms_classroom_courseno_trgm',
+    'DROP INDEX IF EXISTS classrooms_classroom_name_trgm',
+]
+
+# External-content FTS5 table mirrored from classrooms_classroom by triggers.
+SQLITE_FORWARDS = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS classrooms_classroom_fts USING fts5("
+    "name, courseNo, content='classrooms_classroom', content_rowid='id', tokenize='unicode61')",
+    "CREATE TRIGGER IF NOT EXISTS classrooms_classroom_fts_ai AFTER INSERT ON classrooms_classroom BEGIN "
+    "INSERT INTO classrooms_classroom_fts(rowid, name, courseNo) VALUES (new.id, new.name, new.courseNo); END",
+    "CREATE TRIGGER IF NOT EXISTS classrooms_classroom_fts_ad AFTER DELETE ON classrooms_classroom BEGIN "
+    "INSERT INTO classrooms_classroom_fts(classrooms_classroom_fts, rowid, name, courseNo) "
+    "VALUES ('delete', old.id, old.name, old.courseNo); END",
+    "CREATE TRIGGER IF NOT EXISTS classrooms_classroom_fts_au AFTER UPDATE OF name, courseNo ON classrooms_classroom BEGIN "
+    "INSERT INTO classrooms_classroom_fts(classrooms_classroom_fts, rowid, name, courseNo) "
+    "VALUES ('delete', old.id, old.name, old.courseNo); "
+    "INSERT INTO classrooms_classroom_fts(rowid, name, courseNo) VALUES (new.id, new.name, new.courseNo); END",
+    "INSERT INTO classrooms_classroom_fts(classrooms_classroom_fts) VALUES ('rebuild')",
+]
+
+SQLITE_BACKWARDS = [
+    'DROP TRIGGER IF EXISTS classrooms_classroom_fts_au',
+    'DROP TRIGGER IF EXISTS classrooms_classroom_fts_ad',
+    'DROP TRIGGER IF EXISTS classrooms_classroom_fts_ai',
+    'DROP TABLE IF EXISTS classrooms_classroom_fts',
+]
+
+
+def run_for_vendor(postgresql, sqlite):
+    def run(apps, schema_editor):
+        statements = {'postgresql': postgresql, 'sqlite': sqlite}.get(schema_editor.connection.vendor, [])
+        for statement in statements:
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('classrooms', '0012_faculty_department_faculty'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run_for_vendor(POSTGRESQL_FORWARDS, SQLITE_FORWARDS),
+            run_for_vendor(POSTGRESQL_BACKWARDS, SQLITE_BACKWARDS),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.1 on 2026-10-18 13:01
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_memberships(apps, schema_editor):
+    Classroom = apps.get_model('classrooms', 'Classroom')
+    ClassroomMembership = apps.get_model('classrooms', 'ClassroomMembership')
+    Student = apps.get_model('users', 'Student')
+
+    rows = {}
+    for classroom_id, user_id in Student.objects.filter(batch__classrooms__isnull=False).values_list(
+        'batch__classrooms__id', 'user_id'
+    ).iterator():
+        rows[(classroom_id, user_id)] = 'student'
+    for classroom_id, user_id in Classroom.objects.values_list('id', 'teacher__user_id').iterator():
+        rows[(classroom_id, user_id)] = 'teacher'
+    ClassroomMembership.objects.bulk_create(
+        [ClassroomMembership(classroom_id=c_id, user_id=u_id, role=role) for (c_id, u_id), role in rows.items()],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('classrooms', '0013_classroom_search_index'),
+        ('users', '0007_rename_department_teacher_faculty'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClassroomMembership',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('role', models.CharField(choices=[('teacher', 'Teacher'), ('student', 'Student')], max_length=10)),
+                ('classroom', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='memberships', to='classrooms.classroom')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='classroom_memberships', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['classroom', 'role'], name='classrooms__classro_c15fc5_idx'), models.Index(fields=['user', 'role'], name='classrooms__user_id_946711_idx')],
+                'constraints': [models.UniqueConstraint(fields=('classroom', 'user'), name='unique_classroom_membership')],
+            },
+        ),
+        migrations.RunPython(backfill_memberships, migrations.RunPython.noop),
+    ]
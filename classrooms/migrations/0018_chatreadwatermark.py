@@ -0,0 +1,52 @@
+# Generated by Django 5.2.1 on 2026-10-18 13:17
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_watermarks(apps, schema_editor):
+    MessageReadStatus = apps.get_model('classrooms', 'MessageReadStatus')
+    ChatReadWatermark = apps.get_model('classrooms', 'ChatReadWatermark')
+
+    latest = {}
+    reads = MessageReadStatus.objects.filter(
+        is_read=True, message__classroom__isnull=False, message__timestamp__isnull=False
+    ).values_list('user_id', 'message__classroom_id', 'message__timestamp', 'message_id')
+    for user_id, classroom_id, timestamp, message_id in reads.iterator():
+        key = (user_id, classroom_id)
+        if key not in latest or (timestamp, message_id) > latest[key]:
+            latest[key] = (timestamp, message_id)
+    ChatReadWatermark.objects.bulk_create(
+        [
+            ChatReadWatermark(user_id=user_id, classroom_id=classroom_id, last_read_at=timestamp, last_read_message_id=message_id)
+            for (user_id, classroom_id), (timestamp, message_id) in latest.items()
+        ],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('classrooms', '0017_message_timestamp_default'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChatReadWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_read_message_id', models.BigIntegerField()),
+                ('last_read_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('classroom', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='read_watermarks', to='classrooms.classroom')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chat_read_watermarks', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('user', 'classroom'), name='unique_chat_read_watermark')],
+            },
+        ),
+        migrations.RunPython(backfill_watermarks, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.1 on 2026-10-18 13:52
+
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F
+
+
+def backfill_written_at(apps, schema_editor):
+    Message = apps.get_model('classrooms', 'Message')
+    # Rows written before write-behind went in as they were sent.
+    Message.objects.update(written_at=F('timestamp'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('classrooms', '0018_chatreadwatermark'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='message',
+            name='written_at',
+            field=models.DateTimeField(blank=True, default=django.utils.timezone.now, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['classroom', 'written_at'], name='classrooms__classro_702afa_idx'),
+        ),
+        migrations.RunPython(backfill_written_at, migrations.RunPython.noop),
+    ]
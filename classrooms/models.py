@@ -1,5 +1,9 @@
-from django.db import models
+import uuid
+
+from django.db import connection, models, transaction
+from django.db.models import Count, Q
 from django.core.exceptions import ValidationError
+from django.utils import timezone
 from users.models import Teacher, Student
 from django.contrib.auth import get_user_model
 
@@ -51,10 +55,111 @@ class Classroom(models.Model):
             return self._cached_students
             
         self._cached_students = Student.objects.filter(
-            batch__in=self.batches.all()
-        ).distinct()
+            user__classroom_memberships__classroom=self,
+            user__classroom_memberships__role=ClassroomMembership.STUDENT,
+        )
         return self._cached_students
 
+    def student_user_ids(self):
+        """User ids of every student in the classroom, from the membership index."""
+        return ClassroomMembership.objects.filter(
+            classroom_id=self.id, role=ClassroomMembership.STUDENT
+        ).values_list('user_id', flat=True)
+
+
+class ClassroomMembership(models.Model):
+    """
+    Denormalized roster: one row per classroom for its teacher and for every student of
+    its batches, so access checks and recipient lookups are a single indexed query.
+    Kept in step by ``classrooms.signals``; ``rebuild_classroom_memberships`` repairs it.
+    """
+    TEACHER = 'teacher'
+    STUDENT = 'student'
+    ROLE_CHOICES = [
+        (TEACHER, 'Teacher'),
+        (STUDENT, 'Student'),
+    ]
+
+    classroom = models.ForeignKey(Classroom, on_delete=models.CASCADE, related_name='memberships')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='classroom_memberships')
+    role = models.CharField(max_length=10, choices=ROLE_CHOICES)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['classroom', 'user'], name='unique_classroom_membership'),
+        ]
+        indexes = [
+            models.Index(fields=['classroom', 'role']),
+            models.Index(fields=['user', 'role']),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} in {self.classroom_id} ({self.role})"
+
+    @classmethod
+    def expected_rows(cls, classroom_ids):
+        """{(classroom_id, user_id): role} derived from the classrooms' teachers and batches."""
+        expected = {}
+        students = Student.objects.filter(batch__classrooms__id__in=classroom_ids).values_list(
+            'batch__classrooms__id', 'user_id'
+        )
+        for classroom_id, user_id in students:
+            expected[(classroom_id, user_id)] = cls.STUDENT
+        teachers = Classroom.objects.filter(id__in=classroom_ids).values_list('id', 'teacher__user_id')
+        for classroom_id, user_id in teachers:
+            expected[(classroom_id, user_id)] = cls.TEACHER
+        return expected
+
+    @classmethod
+    def sync_classrooms(cls, classroom_ids):
+        """
+        Bring the rows of ``classroom_ids`` in line with their teachers and batches and
+        return the ids of the classrooms whose rows changed.
+        """
+        classroom_ids = list(classroom_ids)
+        if not classroom_ids:
+            return set()
+        expected = cls.expected_rows(classroom_ids)
+        existing = {
+            (classroom_id, user_id): (pk, role)
+            for pk, classroom_id, user_id, role in cls.objects.filter(classroom_id__in=classroom_ids)
+            .values_list('id', 'classroom_id', 'user_id', 'role')
+        }
+        stale = [pk for key, (pk, role) in existing.items() if expected.get(key) != role]
+        missing = [
+            cls(classroom_id=classroom_id, user_id=user_id, role=role)
+            for (classroom_id, user_id), role in expected.items()
+            if existing.get((classroom_id, user_id), (None, None))[1] != role
+        ]
+        with transaction.atomic():
+            if stale:
+                cls.objects.filter(id__in=stale).delete()
+            cls.objects.bulk_create(missing, batch_size=500, ignore_conflicts=True)
+        stale_ids = set(stale)
+        return {
+            classroom_id for (classroom_id, _), (pk, _) in existing.items() if pk in stale_ids
+        } | {row.classroom_id for row in missing}
+
+    @classmethod
+    def sync_student(cls, student):
+        """Move a student's rows to the classrooms of their current batch; return the changed classroom ids."""
+        expected = set()
+        if student.batch_id is not None:
+            expected = set(Classroom.objects.filter(batches__id=student.batch_id).values_list('id', flat=True))
+        current = set(
+            cls.objects.filter(user_id=student.user_id, role=cls.STUDENT).values_list('classroom_id', flat=True)
+        )
+        with transaction.atomic():
+            if current - expected:
+                cls.objects.filter(
+                    user_id=student.user_id, role=cls.STUDENT, classroom_id__in=current - expected
+                ).delete()
+            cls.objects.bulk_create(
+                [cls(classroom_id=c_id, user_id=student.user_id, role=cls.STUDENT) for c_id in expected - current],
+                ignore_conflicts=True,
+            )
+        return current ^ expected
+
 class Announcement(models.Model):
     title = models.CharField(max_length=255)
     content = models.TextField()
@@ -68,9 +173,28 @@ class Announcement(models.Model):
     def __str__(self):
         return self.title
     
+class AttachmentBlob(models.Model):
+    """
+    One stored copy of an attachment's bytes, addressed by its SHA-256. Attachments
+    with the same content share a blob; ``ref_count`` tracks how many do, and the
+    file is deleted when the last one goes.
+    """
+    sha256 = models.CharField(max_length=64, unique=True)
+    file = models.FileField(upload_to='blobs/')
+    size = models.BigIntegerField()
+    ref_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.sha256[:12]} ({self.ref_count} refs)"
+
+
 class Attachment(models.Model):
     announcement = models.ForeignKey(Announcement, on_delete=models.CASCADE, related_name='attachments')
     file = models.FileField(upload_to='announcements/')
+    # Set for uploads stored through BlobStore; ``file`` then names the blob's file.
+    blob = models.ForeignKey(AttachmentBlob, on_delete=models.PROTECT, null=True, blank=True, related_name='attachments')
+    original_name = models.CharField(max_length=255, blank=True)
     created_at = models.DateTimeField(auto_now_add=True ,blank=True, null=True)
     updated_at = models.DateTimeField(auto_now=True,blank=True, null=True)
   
@@ -78,6 +202,41 @@ class Attachment(models.Model):
         return f"Attachment for {self.announcement.title} - {self.file.name}"
 
 
+class AttachmentUpload(models.Model):
+    """
+    A resumable upload in progress. Chunks are written at their offsets into a
+    preallocated temporary file; ``complete`` turns it into an Attachment.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    announcement = models.ForeignKey(Announcement, on_delete=models.CASCADE, related_name='uploads')
+    uploader = models.ForeignKey(User, on_delete=models.CASCADE, related_name='attachment_uploads')
+    filename = models.CharField(max_length=255)
+    size = models.BigIntegerField()
+    chunk_size = models.PositiveIntegerField()
+    sha256 = models.CharField(max_length=64, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Upload {self.id} of {self.filename}"
+
+    @property
+    def total_chunks(self):
+        return max(1, -(-self.size // self.chunk_size))
+
+    def chunk_length(self, index):
+        return min(self.chunk_size, self.size - index * self.chunk_size)
+
+
+class AttachmentUploadChunk(models.Model):
+    upload = models.ForeignKey(AttachmentUpload, on_delete=models.CASCADE, related_name='chunks')
+    index = models.PositiveIntegerField()
+    sha256 = models.CharField(max_length=64)
+
+    class Meta:
+        unique_together = ('upload', 'index')
+
+
 class Message(models.Model):
     sender = models.ForeignKey(
         User,
@@ -95,12 +254,17 @@ class Message(models.Model):
         blank=True
     )
     content = models.TextField(null=True, blank=True)
-    timestamp = models.DateTimeField(auto_now_add=True, null=True,blank=True)
+    # Set when the message is broadcast, which can be before it is written.
+    timestamp = models.DateTimeField(default=timezone.now, null=True,blank=True)
+    # Set when the row is inserted. Messages queued in different workers reach the
+    # table in this order, not in timestamp order.
+    written_at = models.DateTimeField(default=timezone.now, null=True, blank=True)
 
     class Meta:
         ordering = ['timestamp']
         indexes = [
             models.Index(fields=['classroom', 'timestamp']),
+            models.Index(fields=['classroom', 'written_at']),
         ]
 
     def __str__(self):
@@ -127,4 +291,96 @@ class MessageReadStatus(models.Model):
         ]
 
     def __str__(self):
-        return f"{self.user} - {'Read' if self.is_read else 'Unread'}"
\ No newline at end of file
+        return f"{self.user} - {'Read' if self.is_read else 'Unread'}"
+
+class ChatReadWatermark(models.Model):
+    """
+    How far a user has read a classroom chat: everything up to and including the
+    message at (last_read_at, last_read_message_id). Replaces per-message
+    ``MessageReadStatus`` rows; unread counts are the messages after the mark.
+    The id is not a foreign key because the message may still be queued for writing.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='chat_read_watermarks')
+    classroom = models.ForeignKey(Classroom, on_delete=models.CASCADE, related_name='read_watermarks')
+    last_read_message_id = models.BigIntegerField()
+    last_read_at = models.DateTimeField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'classroom'], name='unique_chat_read_watermark'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} read {self.classroom_id} up to {self.last_read_message_id}"
+
+    @classmethod
+    def advance(cls, marks):
+        """
+        Move watermarks forward in one statement. ``marks`` is a list of
+        (user_id, classroom_id, message_id, message_timestamp); a mark behind the
+        stored one is ignored, so concurrent workers cannot move a watermark back.
+        """
+        if not marks:
+            return
+        now = timezone.now()
+        if connection.vendor not in ('postgresql', 'sqlite'):
+            for user_id, classroom_id, message_id, timestamp in marks:
+                with transaction.atomic():
+                    mark, created = cls.objects.select_for_update().get_or_create(
+                        user_id=user_id,
+                        classroom_id=classroom_id,
+                        defaults={'last_read_message_id': message_id, 'last_read_at': timestamp},
+                    )
+                    if not created and (timestamp, message_id) > (mark.last_read_at, mark.last_read_message_id):
+                        mark.last_read_message_id, mark.last_read_at = message_id, timestamp
+                        mark.save(update_fields=['last_read_message_id', 'last_read_at', 'updated_at'])
+            return
+
+        table = connection.ops.quote_name(cls._meta.db_table)
+        adapt = connection.ops.adapt_datetimefield_value
+        params = []
+        for user_id, classroom_id, message_id, timestamp in marks:
+            params += [user_id, classroom_id, message_id, adapt(timestamp), adapt(now)]
+        values = ', '.join(['(%s, %s, %s, %s, %s)'] * len(marks))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {table} (user_id, classroom_id, last_read_message_id, last_read_at, updated_at) '
+                f'VALUES {values} ON CONFLICT (user_id, classroom_id) DO UPDATE SET '
+                'last_read_message_id = excluded.last_read_message_id, '
+                'last_read_at = excluded.last_read_at, updated_at = excluded.updated_at '
+                f'WHERE (excluded.last_read_at, excluded.last_read_message_id) > '
+                f'({table}.last_read_at, {table}.last_read_message_id)',
+                params,
+            )
+
+    @classmethod
+    def marks_for(cls, user_id, classroom_ids):
+        """{classroom_id: (last_read_at, last_read_message_id)} for classrooms the user has read."""
+        return {
+            classroom_id: (last_read_at, message_id)
+            for classroom_id, last_read_at, message_id in cls.objects.filter(
+                user_id=user_id, classroom_id__in=classroom_ids
+            ).values_list('classroom_id', 'last_read_at', 'last_read_message_id')
+        }
+
+    @classmethod
+    def unread_counts(cls, user_id, classroom_ids, marks=None):
+        """{classroom_id: messages from others after the user's watermark}."""
+        if marks is None:
+            marks = cls.marks_for(user_id, classroom_ids)
+        after = Q(classroom_id__in=[c_id for c_id in classroom_ids if c_id not in marks])
+        for classroom_id, (last_read_at, message_id) in marks.items():
+            after |= Q(classroom_id=classroom_id) & (
+                Q(timestamp__gt=last_read_at) | Q(timestamp=last_read_at, id__gt=message_id)
+            )
+        counts = dict.fromkeys(classroom_ids, 0)
+        rows = (
+            Message.objects.filter(after)
+            .exclude(sender_id=user_id)
+            .values('classroom_id')
+            .annotate(unread=Count('id'))
+            .values_list('classroom_id', 'unread')
+        )
+        counts.update(rows)
+        return counts
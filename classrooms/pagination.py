@@ -0,0 +1,70 @@
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+from rest_framework.response import Response
+
+
+class MemberCursorPagination(CursorPagination):
+    """
+    Keyset pagination over students by id: each page is a single indexed range scan
+    however deep the client pages, and pages stay stable while the roster changes.
+    """
+    ordering = "id"
+    page_size = 50
+    page_size_query_param = "pageSize"
+    max_page_size = 200
+
+    def get_paginated_response(self, data):
+        return Response({
+            "isSuccess": True,
+            "message": None,
+            "data": {
+                "next": self.get_next_link(),
+                "previous": self.get_previous_link(),
+                "results": data,
+            },
+            "errors": None
+        })
+
+
+class MessageCursorPagination(CursorPagination):
+    """
+    Chat history newest first. The cursor is a position on the (classroom, timestamp)
+    index, so loading older messages stays one range scan however far back it goes.
+    """
+    ordering = ("-timestamp", "-id")
+    cursor_query_param = "before"
+    page_size = 50
+    page_size_query_param = "pageSize"
+    max_page_size = 100
+
+    def get_paginated_response(self, data, **extra):
+        return Response({
+            "isSuccess": True,
+            "message": None,
+            "data": {
+                "next": self.get_next_link(),
+                "previous": self.get_previous_link(),
+                "results": data,
+                **extra,
+            },
+            "errors": None
+        })
+
+
+class SearchPagination(PageNumberPagination):
+    """Page-number pagination for ranked search results, which have no stable keyset."""
+    page_size = 20
+    page_size_query_param = "pageSize"
+    max_page_size = 100
+
+    def get_paginated_response(self, data):
+        return Response({
+            "isSuccess": True,
+            "message": None,
+            "data": {
+                "count": self.page.paginator.count,
+                "next": self.get_next_link(),
+                "previous": self.get_previous_link(),
+                "results": data,
+            },
+            "errors": None
+        })
@@ -0,0 +1,174 @@
+import asyncio
+import atexit
+import logging
+import weakref
+
+from channels.db import database_sync_to_async
+from channels.layers import get_channel_layer
+from django.conf import settings
+
+from .message_writer import MessageWriter
+from .models import ChatReadWatermark, Message
+
+logger = logging.getLogger(__name__)
+
+MAX_RECEIPTS_PER_READER = 20
+MAX_RESOLVE_ATTEMPTS = 5
+
+
+def resolve_marks(receipts, known):
+    """
+    Pick each reader's latest message per classroom. ``receipts`` maps
+    (classroom_id, user_id) to {message_id: reader_name} and ``known`` maps ids of
+    still-queued messages to (classroom_id, timestamp).
+
+    Returns ``(marks, unresolved)``. ``marks`` maps each key to the (user_id,
+    classroom_id, message_id, timestamp) of its receipt with the highest
+    (timestamp, id), ready for ``ChatReadWatermark.advance``. ``unresolved``
+    has the same shape as ``receipts`` and holds receipts for messages that are not
+    in the database yet, e.g. because another worker still has them queued.
+    Receipts naming a message of another classroom, or one without a timestamp,
+    are dropped.
+    """
+    lookup = dict(known)
+    missing = {message_id for candidates in receipts.values() for message_id in candidates if message_id not in lookup}
+    if missing:
+        lookup.update(
+            (message_id, (classroom_id, timestamp))
+            for message_id, classroom_id, timestamp in Message.objects.filter(
+                id__in=missing
+            ).values_list('id', 'classroom_id', 'timestamp')
+        )
+    marks = {}
+    unresolved = {}
+    for (classroom_id, user_id), candidates in receipts.items():
+        latest = None
+        for message_id in candidates:
+            found = lookup.get(message_id)
+            if found is None:
+                unresolved.setdefault((classroom_id, user_id), {})[message_id] = candidates[message_id]
+            elif found[1] is not None and str(found[0]) == str(classroom_id):
+                if latest is None or (found[1], message_id) > latest[:2]:
+                    latest = (found[1], message_id, found[0])
+        if latest is not None:
+            timestamp, message_id, message_classroom_id = latest
+            marks[(classroom_id, user_id)] = (user_id, message_classroom_id, message_id, timestamp)
+    return marks, unresolved
+
+
+class ReadReceipts:
+    """
+    Coalesces read receipts into per-user watermarks. Every
+    CHAT_READ_RECEIPT_INTERVAL_MS the receipts a user sent per classroom are
+    resolved to their messages, the latest by (timestamp, id) is written with one
+    upsert, and the marks are announced to each classroom as one ``read_receipts``
+    event. Receipts for messages not written yet (another worker may still have
+    them queued) are kept and retried on the next few flushes.
+    """
+
+    _batchers = weakref.WeakKeyDictionary()
+
+    def __init__(self):
+        self.interval = getattr(settings, "CHAT_READ_RECEIPT_INTERVAL_MS", 1000) / 1000
+        # {(classroom_id, user_id): {message_id: reader_name}}
+        self.pending = {}
+        # {message_id: flushes it has gone unresolved}
+        self.attempts = {}
+        self._task = None
+
+    @classmethod
+    def current(cls):
+        """The batcher of the running event loop."""
+        loop = asyncio.get_running_loop()
+        batcher = cls._batchers.get(loop)
+        if batcher is None:
+            batcher = cls._batchers[loop] = cls()
+        return batcher
+
+    def mark(self, classroom_id, user_id, message_id, reader_name):
+        self.add({(classroom_id, user_id): {message_id: reader_name}})
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def add(self, receipts):
+        for key, candidates in receipts.items():
+            pending = self.pending.setdefault(key, {})
+            pending.update(candidates)
+            # Ids are not ordered by time across workers, so which receipt is the
+            # latest is only known once resolved; keep a bounded set until then.
+            while len(pending) > MAX_RECEIPTS_PER_READER:
+                del pending[min(pending)]
+
+    async def _run(self):
+        while self.pending:
+            await asyncio.sleep(self.interval)
+            await self.flush()
+
+    async def flush(self):
+        receipts, self.pending = self.pending, {}
+        if not receipts:
+            return
+        writer = MessageWriter.current()
+        known = {
+            message.id: (message.classroom_id, message.timestamp)
+            for message in list(writer.in_flight) + list(writer.pending)
+        }
+        try:
+            marks, unresolved = await database_sync_to_async(resolve_marks)(receipts, known)
+            await database_sync_to_async(ChatReadWatermark.advance)(list(marks.values()))
+        except Exception:
+            logger.exception("Writing %s read receipts failed; retrying.", len(receipts))
+            self.add(receipts)
+            return
+        self.retry(receipts, unresolved)
+
+        by_classroom = {}
+        for key, (user_id, classroom_id, message_id, _) in marks.items():
+            by_classroom.setdefault(classroom_id, []).append({
+                'message_id': message_id,
+                'reader_id': user_id,
+                'reader_name': receipts[key][message_id],
+            })
+        channel_layer = get_channel_layer()
+        for classroom_id, items in by_classroom.items():
+            await channel_layer.group_send(f'chat_{classroom_id}', {'type': 'read_receipts', 'receipts': items})
+
+    def retry(self, receipts, unresolved):
+        """Queue unresolved receipts again, giving up on ids that never resolve."""
+        unresolved_ids = {message_id for candidates in unresolved.values() for message_id in candidates}
+        for candidates in receipts.values():
+            for message_id in candidates:
+                if message_id not in unresolved_ids:
+                    self.attempts.pop(message_id, None)
+        expired = set()
+        for message_id in unresolved_ids:
+            attempts = self.attempts.get(message_id, 0) + 1
+            if attempts > MAX_RESOLVE_ATTEMPTS:
+                expired.add(message_id)
+                self.attempts.pop(message_id, None)
+            else:
+                self.attempts[message_id] = attempts
+        retried = {
+            key: {message_id: name for message_id, name in candidates.items() if message_id not in expired}
+            for key, candidates in unresolved.items()
+        }
+        self.add({key: candidates for key, candidates in retried.items() if candidates})
+
+    def flush_sync(self):
+        receipts, self.pending = self.pending, {}
+        if receipts:
+            marks, _ = resolve_marks(receipts, {})
+            ChatReadWatermark.advance(list(marks.values()))
+
+    @classmethod
+    def flush_all_sync(cls):
+        # Receipts may name messages that are still queued.
+        MessageWriter.flush_all_sync()
+        for batcher in list(cls._batchers.values()):
+            try:
+                batcher.flush_sync()
+            except Exception:
+                logger.exception("Could not write pending read receipts at shutdown.")
+
+
+atexit.register(ReadReceipts.flush_all_sync)
@@ -0,0 +1,96 @@
+from django.db import transaction
+from django.utils import timezone
+
+from notifications.models import Notification
+
+from .access import ClassroomAccess
+from .models import Classroom, ClassroomMembership, Student
+
+
+class ClassroomRoster:
+    """
+    Set-based roster changes. Whole batches are linked or unlinked with one M2M
+    statement and individual students are moved with one UPDATE. Each call runs in a
+    transaction and sends at most one notification to every affected student.
+    """
+
+    @staticmethod
+    def enroll(classroom, batch_ids=(), student_ids=(), target_batch_id=None, sender=None, move=False):
+        """
+        Link ``batch_ids`` to the classroom and move ``student_ids`` into
+        ``target_batch_id``, which is linked too. A student's batch places them in
+        every classroom linked to it, so students already in another batch are only
+        taken out of it when ``move`` is set; otherwise they are left where they are.
+        """
+        batch_ids = set(batch_ids)
+        if target_batch_id is not None:
+            batch_ids.add(target_batch_id)
+        with transaction.atomic():
+            before = set(classroom.student_user_ids())
+            linked = set(classroom.batches.values_list('id', flat=True))
+            if batch_ids - linked:
+                classroom.batches.add(*(batch_ids - linked))
+            moved = 0
+            if student_ids:
+                students = Student.objects.filter(id__in=student_ids)
+                if not move:
+                    students = students.filter(batch=None)
+                moved = ClassroomRoster._move_students(students, target_batch_id)
+            enrolled = set(classroom.student_user_ids()) - before
+            ClassroomRoster._notify(
+                classroom, enrolled, sender,
+                f"You have been added to {classroom.name}",
+                "/student/classroom/classroom-list",
+            )
+        return {
+            "batchesAdded": len(batch_ids - linked),
+            "studentsMoved": moved,
+            "studentsEnrolled": len(enrolled),
+        }
+
+    @staticmethod
+    def remove(classroom, batch_ids=(), student_ids=(), sender=None):
+        """Unlink ``batch_ids`` and take ``student_ids`` out of the classroom's batches."""
+        with transaction.atomic():
+            before = set(classroom.student_user_ids())
+            batch_ids = set(batch_ids) & set(classroom.batches.values_list('id', flat=True))
+            if batch_ids:
+                classroom.batches.remove(*batch_ids)
+            moved = 0
+            if student_ids:
+                # Students belong to classrooms through their batch, so removing one
+                # detaches them from it, as RemoveStudentFromClassroomAPIView does.
+                students = Student.objects.filter(id__in=student_ids, batch__classrooms=classroom)
+                moved = ClassroomRoster._move_students(students, None)
+            removed = before - set(classroom.student_user_ids())
+            ClassroomRoster._notify(
+                classroom, removed, sender,
+                f"You have been removed from {classroom.name}",
+                "/student/classroom/classroom-list",
+            )
+        return {
+            "batchesRemoved": len(batch_ids),
+            "studentsMoved": moved,
+            "studentsRemoved": len(removed),
+        }
+
+    @staticmethod
+    def _move_students(students, batch_id):
+        """Move ``students`` to ``batch_id`` in one UPDATE and resync the classrooms involved."""
+        students = students.exclude(batch_id=batch_id) if batch_id is not None else students.exclude(batch=None)
+        old_batch_ids = set(students.values_list('batch_id', flat=True))
+        moved = students.update(batch_id=batch_id, updated_at=timezone.now())
+        if moved:
+            # update() sends no signals, so sync the membership index explicitly.
+            affected = Classroom.objects.filter(
+                batches__id__in=(old_batch_ids | {batch_id}) - {None}
+            ).values_list('id', flat=True).distinct()
+            ClassroomAccess.invalidate(ClassroomMembership.sync_classrooms(affected))
+        return moved
+
+    @staticmethod
+    def _notify(classroom, user_ids, sender, message, url):
+        if not user_ids:
+            return
+        notification = Notification.objects.create(sender=sender, message=message, url=url)
+        notification.recipients.add(*user_ids)
@@ -0,0 +1,74 @@
+import re
+
+from django.db import connection
+from django.db.models import BooleanField, FloatField, Q
+from django.db.models.expressions import RawSQL
+
+from .models import Classroom
+
+# Minimum pg_trgm word similarity for a fuzzy (typo-tolerant) match.
+TRIGRAM_THRESHOLD = 0.3
+
+
+class ClassroomSearch:
+    """
+    Ranked classroom search on name and course number, backed by the indexes created
+    in migration 0013: pg_trgm GIN indexes on PostgreSQL and an FTS5 table on SQLite.
+    Other backends fall back to an unindexed ``icontains`` filter.
+    """
+
+    @staticmethod
+    def search(query, queryset=None):
+        if queryset is None:
+            queryset = Classroom.objects.all()
+        query = query.strip()
+        if not query:
+            return queryset.order_by("name", "id")
+
+        vendor = connection.vendor
+        if vendor == "postgresql":
+            return ClassroomSearch._search_postgresql(query, queryset)
+        if vendor == "sqlite":
+            return ClassroomSearch._search_sqlite(query, queryset)
+        return queryset.filter(Q(name__icontains=query) | Q(courseNo__icontains=query)).order_by("name", "id")
+
+    @staticmethod
+    def _search_postgresql(query, queryset):
+        # ILIKE substring/prefix matches and the word-similarity operator are all
+        # served by the gin_trgm_ops indexes.
+        pattern = "%" + query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        matches = RawSQL(
+            '(classrooms_classroom.name ILIKE %s OR classrooms_classroom."courseNo" ILIKE %s'
+            ' OR %s <%% classrooms_classroom.name)',
+            (pattern, pattern, query),
+            output_field=BooleanField(),
+        )
+        rank = RawSQL(
+            'GREATEST(word_similarity(%s, classrooms_classroom.name),'
+            ' word_similarity(%s, classrooms_classroom."courseNo"))',
+            (query, query),
+            output_field=FloatField(),
+        )
+        return queryset.filter(matches).annotate(rank=rank).order_by("-rank", "name", "id")
+
+    @staticmethod
+    def _search_sqlite(query, queryset):
+        tokens = re.findall(r"\w+", query)
+        if not tokens:
+            return queryset.none()
+        # Every token must match the start of a word in the name or course number.
+        match = " ".join(f'"{token}"*' for token in tokens)
+        matches = RawSQL(
+            "classrooms_classroom.id IN (SELECT rowid FROM classrooms_classroom_fts"
+            " WHERE classrooms_classroom_fts MATCH %s)",
+            (match,),
+            output_field=BooleanField(),
+        )
+        # bm25() is lower for better matches; negate it so higher rank sorts first.
+        rank = RawSQL(
+            "(SELECT -bm25(classrooms_classroom_fts) FROM classrooms_classroom_fts"
+            " WHERE classrooms_classroom_fts MATCH %s AND rowid = classrooms_classroom.id)",
+            (match,),
+            output_field=FloatField(),
+        )
+        return queryset.filter(matches).annotate(rank=rank).order_by("-rank", "name", "id")
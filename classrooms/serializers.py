@@ -1,5 +1,6 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
+from django.db.models import Count, Prefetch
 from .models import (
     Department,
     Batch,
@@ -9,6 +10,7 @@ from .models import (
     Message,
     Faculty,
 )
+from users.display_names import DisplayNameListSerializer, DisplayNames
 from users.models import Teacher, Student,User
 
 
@@ -79,6 +81,25 @@ class StudentInlineSerializer(serializers.ModelSerializer):
 
 
 
+class ClassroomMemberSerializer(StudentInlineSerializer):
+    """
+    A student in a classroom's roster. Pass ``fields`` to return only a subset of
+    ``Meta.fields``; unknown names raise ``ValueError``.
+    """
+
+    class Meta(StudentInlineSerializer.Meta):
+        fields = StudentInlineSerializer.Meta.fields + ["academic_status"]
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields:
+            unknown = set(fields) - set(self.fields)
+            if unknown:
+                raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}")
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+
 class BatchSerializer(serializers.ModelSerializer):
     department = serializers.PrimaryKeyRelatedField(
         queryset=Department.objects.all()
@@ -153,12 +174,76 @@ class ClassroomSerializer(serializers.ModelSerializer):
             if "batch_details" in self.fields:
                 self.fields["batches"].write_only = True
 
+    @staticmethod
+    def setup_eager_loading(queryset):
+        """
+        Load classrooms with their teacher, batches, departments and students in three
+        queries however many classrooms, batches or students there are.
+        """
+        students = Student.objects.select_related("user").order_by("id")
+        batches = (
+            Batch.objects.select_related("department")
+            .prefetch_related(Prefetch("students", queryset=students))
+            .order_by("id")
+        )
+        return queryset.select_related("teacher__user").prefetch_related(
+            Prefetch("batches", queryset=batches)
+        )
+
+
+class BatchSummarySerializer(serializers.ModelSerializer):
+    department = serializers.CharField(source="department.name", read_only=True)
+
+    class Meta:
+        model = Batch
+        fields = ["id", "section", "year", "department"]
+
+
+class ClassroomListSerializer(serializers.ModelSerializer):
+    """
+    Compact classroom representation for list endpoints. Rosters are reduced to
+    annotated counts; the students themselves come from the members endpoint.
+    """
+    teacher_details = TeacherInlineSerializer(source="teacher", read_only=True)
+    batch_details = BatchSummarySerializer(source="batches", many=True, read_only=True)
+    batch_count = serializers.IntegerField(read_only=True)
+    student_count = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = Classroom
+        fields = [
+            "id",
+            "name",
+            "courseNo",
+            "description",
+            "teacher_details",
+            "batch_details",
+            "batch_count",
+            "student_count",
+            "is_archived",
+            "created_at",
+            "updated_at",
+        ]
+
+    @staticmethod
+    def setup_eager_loading(queryset):
+        """Two queries: the annotated classrooms with their teacher, then their batches."""
+        batches = Batch.objects.select_related("department").order_by("id")
+        return (
+            queryset.select_related("teacher__user")
+            .prefetch_related(Prefetch("batches", queryset=batches))
+            .annotate(
+                batch_count=Count("batches", distinct=True),
+                student_count=Count("batches__students", distinct=True),
+            )
+        )
+
 
 class AttachmentSerializer(serializers.ModelSerializer):
     class Meta:
         model = Attachment
-        fields = ['id', 'file']
-        read_only_fields = ['id']
+        fields = ['id', 'file', 'original_name']
+        read_only_fields = ['id', 'original_name']
 
 class AnnouncementSerializer(serializers.ModelSerializer):
     attachments = AttachmentSerializer(many=True, read_only=True)
@@ -182,50 +267,39 @@ class AnnouncementSerializer(serializers.ModelSerializer):
         }
 
     def get_class_room_details(self, obj):
-        from classrooms.serializers import ClassroomSerializer
         return ClassroomSerializer(obj.class_room).data
 
+    @staticmethod
+    def setup_eager_loading(queryset):
+        """Load the classroom (once, with its roster) and attachments of every announcement."""
+        return queryset.prefetch_related(
+            Prefetch("class_room", queryset=ClassroomSerializer.setup_eager_loading(Classroom.objects.all())),
+            "attachments",
+        )
+
 
 class MessageSenderSerializer(serializers.ModelSerializer):
     display_name = serializers.SerializerMethodField()
+    display_name_source = 'id'
 
     class Meta:
         model = User
         fields = ['id', 'display_name'] # Add other fields if needed like 'email'
+        list_serializer_class = DisplayNameListSerializer
 
     def get_display_name(self, user_obj):
-        # Logic to get display name (similar to your consumer)
-        # Ensure your User model has a 'role' attribute or adapt this logic
-        if hasattr(user_obj, 'role'):
-            if user_obj.role == 'teacher':
-                teacher = Teacher.objects.filter(user=user_obj).first()
-                if teacher:
-                    return f"{teacher.first_name} {teacher.last_name}"
-            elif user_obj.role == 'student':
-                student = Student.objects.filter(user=user_obj).first()
-                if student:
-                    return f"{student.first_name} {student.last_name}"
-        return user_obj.email # Fallback or primary if no role/profile
+        entry = DisplayNames.from_context(self.context, user_obj.id)
+        return entry['display_name'] if entry else None
 
 class MessageSerializer(serializers.ModelSerializer):
-    sender_id = serializers.IntegerField(source='sender.id', read_only=True)
+    sender_id = serializers.IntegerField(read_only=True)
     sender_name = serializers.SerializerMethodField(read_only=True)
 
     class Meta:
         model = Message
         fields = ['id', 'content', 'sender_id', 'sender_name', 'timestamp']
-    
+        list_serializer_class = DisplayNameListSerializer
 
     def get_sender_name(self, message_obj):
-        user_obj = message_obj.sender
-       
-        if hasattr(user_obj, 'role'):
-            if user_obj.role == 'teacher':
-                teacher = Teacher.objects.filter(user=user_obj).first()
-                if teacher:
-                    return f"{teacher.first_name} {teacher.last_name}"
-            elif user_obj.role == 'student':
-                student = Student.objects.filter(user=user_obj).first()
-                if student:
-                    return f"{student.first_name} {student.last_name}"
-        return user_obj.email 
\ No newline at end of file
+        entry = DisplayNames.from_context(self.context, message_obj.sender_id)
+        return entry['display_name'] if entry else None
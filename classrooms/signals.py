@@ -0,0 +1,74 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from classrooms.access import ClassroomAccess
+from classrooms.blobs import BlobStore
+from classrooms.models import Attachment, Batch, Classroom, ClassroomMembership
+from users.models import Student
+
+
+def sync_classrooms(classroom_ids):
+    ClassroomAccess.invalidate(ClassroomMembership.sync_classrooms(classroom_ids))
+
+
+@receiver(post_save, sender=Classroom)
+def sync_memberships_on_classroom_save(sender, instance, **kwargs):
+    if kwargs.get('raw', False):
+        return
+    # Covers the teacher's row on create and when the classroom changes hands.
+    sync_classrooms([instance.id])
+
+
+@receiver(post_delete, sender=Classroom)
+def invalidate_access_on_classroom_delete(sender, instance, **kwargs):
+    ClassroomAccess.invalidate([instance.id])
+
+
+@receiver(m2m_changed, sender=Classroom.batches.through)
+def sync_memberships_on_batches_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear' and reverse:
+        # The cleared classrooms are gone by post_clear; remember them.
+        instance._membership_classroom_ids = list(instance.classrooms.values_list('id', flat=True))
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        sync_classrooms([instance.id])
+    elif action == 'post_clear':
+        sync_classrooms(getattr(instance, '_membership_classroom_ids', []))
+    else:
+        sync_classrooms(pk_set)
+
+
+@receiver(pre_delete, sender=Batch)
+def remember_batch_classrooms(sender, instance, **kwargs):
+    # Deleting a batch drops its classroom links and nulls Student.batch without signals.
+    instance._membership_classroom_ids = list(instance.classrooms.values_list('id', flat=True))
+
+
+@receiver(post_delete, sender=Batch)
+def sync_memberships_on_batch_delete(sender, instance, **kwargs):
+    sync_classrooms(getattr(instance, '_membership_classroom_ids', []))
+
+
+@receiver(post_save, sender=Student)
+def sync_memberships_on_student_save(sender, instance, update_fields=None, **kwargs):
+    if kwargs.get('raw', False):
+        return
+    if update_fields is not None and 'batch' not in update_fields:
+        return
+    ClassroomAccess.invalidate(ClassroomMembership.sync_student(instance))
+
+
+@receiver(post_delete, sender=Student)
+def remove_memberships_on_student_delete(sender, instance, **kwargs):
+    memberships = ClassroomMembership.objects.filter(user_id=instance.user_id, role=ClassroomMembership.STUDENT)
+    classroom_ids = list(memberships.values_list('classroom_id', flat=True))
+    memberships.delete()
+    ClassroomAccess.invalidate(classroom_ids)
+
+
+@receiver(post_delete, sender=Attachment)
+def release_attachment_blob(sender, instance, **kwargs):
+    # Also runs for attachments removed with their announcement or classroom.
+    if instance.blob_id is not None:
+        BlobStore.release(instance.blob_id)
@@ -0,0 +1,50 @@
+"""Fixtures shared by the test suites of the apps built on classrooms."""
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from users.models import Student, Teacher, User
+from .models import Classroom
+
+
+def create_teacher(email="teacher@bdu.edu.et"):
+    user = User.objects.create_user(email=email, password="secret", role="teacher")
+    return Teacher.objects.create(user=user, first_name="Abebe", last_name="Kebede", phone="0", faculty="CS")
+
+
+def create_classroom(teacher, name="Algorithms", course_no="CS301"):
+    return Classroom.objects.create(name=name, courseNo=course_no, description="", teacher=teacher)
+
+
+def create_students(count, batch=None):
+    """``count`` students with accounts student0@, student1@, ... in ``batch``."""
+    students = []
+    for i in range(count):
+        user = User.objects.create_user(email=f"student{i}@bdu.edu.et", password="secret", role="student")
+        students.append(Student.objects.create(
+            user=user, student_id=f"A{i}", first_name="S", last_name=str(i), phone="0", batch=batch
+        ))
+    return students
+
+
+class ClassroomTestCase(TestCase):
+    """
+    A teacher (``teacher``), their classroom (``classroom``; set ``classroom_name`` to
+    None for none) and ``student_count`` students (``students``), with the client
+    logged in as the teacher. Subclasses add their own data after
+    ``super().setUpTestData()``.
+    """
+    classroom_name = "Algorithms"
+    course_no = "CS301"
+    student_count = 0
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = create_teacher()
+        cls.classroom = None
+        if cls.classroom_name is not None:
+            cls.classroom = create_classroom(cls.teacher, cls.classroom_name, cls.course_no)
+        cls.students = create_students(cls.student_count)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.teacher.user)
@@ -1,3 +1,1040 @@
-from django.test import TestCase
+import asyncio
+import hashlib
+import os
+import tempfile
+import threading
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from channels.layers import get_channel_layer
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.core.management import CommandError, call_command
+from django.db import DatabaseError, connection, transaction
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from config.channel_layers import ChannelHub, UnixSocketChannelLayer
+from notifications.models import Notification
+from users.models import Student, User
+from .access import ClassroomAccess
+from .blobs import BlobStore
+from .message_writer import MessageWriter, reserve_message_ids, write_messages
+from .read_receipts import MAX_RESOLVE_ATTEMPTS, ReadReceipts
+from .routing import websocket_urlpatterns
+from .models import (
+    Announcement, Attachment, AttachmentBlob, AttachmentUpload, Batch, ChatReadWatermark, Classroom, ClassroomMembership,
+    Department, Message,
+)
+from .testing import ClassroomTestCase, create_classroom, create_teacher
+from .uploads import ChunkedUploads, UploadError
+
+
+class ClassroomQueryCountTests(ClassroomTestCase):
+    classroom_name = None
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.department = Department.objects.create(name="Computer Science")
+
+    def create_classrooms(self, count, batches=2, students=5):
+        classrooms = []
+        for i in range(count):
+            classroom = Classroom.objects.create(
+                name=f"Course {i}", courseNo=f"CS{i}", description="", teacher=self.teacher
+            )
+            for j in range(batches):
+                batch = Batch.objects.create(section=f"{classroom.id}-{j}", year=1, department=self.department)
+                users = User.objects.bulk_create([
+                    User(email=f"student-{batch.id}-{k}@bdu.edu.et", role="student") for k in range(students)
+                ])
+                Student.objects.bulk_create([
+                    Student(user=user, student_id=f"S{batch.id}-{k}", first_name="S", last_name=str(k), phone="0", batch=batch)
+                    for k, user in enumerate(users)
+                ])
+                classroom.batches.add(batch)
+            classrooms.append(classroom)
+        return classrooms
+
+    def test_teacher_classrooms_list_in_constant_queries(self):
+        self.create_classrooms(1, batches=1, students=1)
+        url = reverse("classroom-by-teacher", kwargs={"teacher_id": self.teacher.id})
+        with self.assertNumQueries(2):
+            small = self.client.get(url)
+
+        self.create_classrooms(4, batches=3, students=6)
+        with self.assertNumQueries(2):
+            large = self.client.get(url)
+
+        self.assertEqual(len(small.data["data"]), 1)
+        self.assertEqual(len(large.data["data"]), 5)
+        classroom = large.data["data"][-1]
+        self.assertNotIn("student_details", classroom["batch_details"][0])
+        self.assertEqual(classroom["batch_details"][0]["department"], "Computer Science")
+        self.assertEqual((classroom["batch_count"], classroom["student_count"]), (3, 18))
+        self.assertEqual(classroom["teacher_details"]["user_email"], "teacher@bdu.edu.et")
+
+    def test_student_classrooms_list_in_constant_queries(self):
+        classrooms = self.create_classrooms(3, batches=2, students=4)
+        student = classrooms[0].batches.first().students.first()
+        for classroom in classrooms[1:]:
+            classroom.batches.add(student.batch)
+
+        url = reverse("classroom-by-student", kwargs={"student_id": student.id})
+        with self.assertNumQueries(2):
+            response = self.client.get(url)
+
+        self.assertEqual([c["id"] for c in response.data["data"]], [c.id for c in classrooms])
+        # Counts cover the whole roster, not just the requesting student's batch.
+        self.assertEqual(response.data["data"][1]["student_count"], 12)
+
+    def test_announcements_embed_the_full_classroom_in_constant_queries(self):
+        classroom = self.create_classrooms(1, batches=2, students=5)[0]
+        url = reverse("announcement-list-create", kwargs={"class_room_id": classroom.id})
+        Announcement.objects.create(title="Welcome", content="", class_room=classroom)
+        with CaptureQueriesContext(connection) as one:
+            self.client.get(url)
+
+        for i in range(4):
+            Announcement.objects.create(title=f"Week {i}", content="", class_room=classroom)
+        with self.assertNumQueries(len(one)):
+            data = self.client.get(url).data["data"]
+
+        self.assertEqual(len(data), 5)
+        batch = data[-1]["class_room_details"]["batch_details"][0]
+        self.assertEqual(len(batch["student_details"]), 5)
+        self.assertEqual(batch["student_details"][0]["department"], "Computer Science")
+        self.assertEqual(data[-1]["class_room_details"]["teacher_details"]["user_email"], "teacher@bdu.edu.et")
+
+    def test_archiving_returns_the_full_classroom(self):
+        classroom = self.create_classrooms(1, batches=2, students=5)[0]
+
+        response = self.client.post(reverse("classroom-archive", kwargs={"pk": classroom.id}))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data["data"]["is_archived"])
+        self.assertEqual(len(response.data["data"]["batch_details"][1]["student_details"]), 5)
+
+class ClassroomMembersTests(ClassroomTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        department = Department.objects.create(name="Computer Science")
+        for section in ("A", "B"):
+            batch = Batch.objects.create(section=section, year=3, department=department)
+            cls.classroom.batches.add(batch)
+            users = User.objects.bulk_create([
+                User(email=f"student-{section}-{i}@bdu.edu.et", role="student") for i in range(30)
+            ])
+            Student.objects.bulk_create([
+                Student(
+                    user=user, student_id=f"{section}{i}", first_name="S", last_name=str(i), phone="0", batch=batch,
+                    academic_status="deferred" if i % 10 == 0 else "active",
+                )
+                for i, user in enumerate(users)
+            ])
+
+    def setUp(self):
+        super().setUp()
+        self.url = reverse("classroom-members", kwargs={"id": self.classroom.id})
+
+    def test_pages_through_every_member_once(self):
+        seen = []
+        url, params = self.url, {"pageSize": 25}
+        while url:
+            with self.assertNumQueries(2):
+                response = self.client.get(url, params)
+            self.assertEqual(response.status_code, 200)
+            seen.extend(member["id"] for member in response.data["data"]["results"])
+            url, params = response.data["data"]["next"], None
+
+        self.assertEqual(seen, sorted(Student.objects.values_list("id", flat=True)))
+
+    def test_filters_by_academic_status_and_selects_fields(self):
+        response = self.client.get(self.url, {"academic_status": "deferred", "fields": "id,student_id"})
+
+        results = response.data["data"]["results"]
+        self.assertEqual(len(results), 6)
+        self.assertEqual(set(results[0]), {"id", "student_id"})
+
+    def test_rejects_unknown_fields_and_statuses(self):
+        self.assertEqual(self.client.get(self.url, {"fields": "id,password"}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {"academic_status": "expelled"}).status_code, 400)
+
+    def test_detail_embeds_first_member_page(self):
+        response = self.client.get(reverse("classroom-detail", kwargs={"id": self.classroom.id}))
+
+        data = response.data["data"]
+        self.assertEqual(data["student_count"], 60)
+        self.assertEqual(len(data["members"]), 50)
+        self.assertIn("/members/", data["membersNext"])
+
+    def test_detail_leaves_members_out_for_non_members(self):
+        user = User.objects.create_user(email="outsider@bdu.edu.et", password="secret", role="student")
+        self.client.force_authenticate(user)
+
+        response = self.client.get(reverse("classroom-detail", kwargs={"id": self.classroom.id}))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["data"]["student_count"], 60)
+        self.assertNotIn("members", response.data["data"])
+        self.assertNotIn("membersNext", response.data["data"])
+
+
+class ClassroomSearchTests(ClassroomTestCase):
+    classroom_name = None
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        for name, course_no in [
+            ("Data Structures", "CS201"),
+            ("Database Systems", "CS305"),
+            ("Distributed Systems", "CS402"),
+            ("Linear Algebra", "MATH201"),
+        ]:
+            Classroom.objects.create(name=name, courseNo=course_no, description="", teacher=cls.teacher)
+
+    def search(self, query, **params):
+        response = self.client.get(reverse("classroom-search"), {"query": query, **params})
+        self.assertEqual(response.status_code, 200)
+        return response.data["data"]
+
+    def test_matches_word_prefixes_in_name_and_course_number(self):
+        self.assertEqual([c["name"] for c in self.search("data")["results"]], ["Data Structures", "Database Systems"])
+        self.assertEqual([c["courseNo"] for c in self.search("cs4")["results"]], ["CS402"])
+        self.assertEqual(self.search("sys dist")["results"][0]["name"], "Distributed Systems")
+
+    def test_sees_renamed_classrooms_and_paginates(self):
+        Classroom.objects.filter(courseNo="MATH201").update(name="Numerical Methods")
+
+        self.assertEqual(self.search("linear")["count"], 0)
+        self.assertEqual(self.search("numer")["count"], 1)
+        page = self.search("", pageSize=3)
+        self.assertEqual((page["count"], len(page["results"])), (4, 3))
+        self.assertIsNotNone(page["next"])
+
+
+class ClassroomMembershipTests(ClassroomTestCase):
+    classroom_name = None
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.department = Department.objects.create(name="Computer Science")
+
+    def create_batch(self, section, students=3):
+        batch = Batch.objects.create(section=section, year=2, department=self.department)
+        for i in range(students):
+            user = User.objects.create_user(email=f"{section}-{i}@bdu.edu.et", password="secret", role="student")
+            Student.objects.create(user=user, student_id=f"{section}{i}", first_name="S", last_name=str(i), phone="0", batch=batch)
+        return batch
+
+    def members(self, classroom):
+        return set(classroom.memberships.values_list("user__email", "role"))
+
+    def test_tracks_batches_students_and_teacher(self):
+        batch_a, batch_b = self.create_batch("A"), self.create_batch("B", students=2)
+        classroom = Classroom.objects.create(name="Networks", courseNo="CS350", description="", teacher=self.teacher)
+        self.assertEqual(self.members(classroom), {("teacher@bdu.edu.et", "teacher")})
+
+        classroom.batches.add(batch_a, batch_b)
+        self.assertEqual(len(self.members(classroom)), 6)
+
+        mover = batch_a.students.first()
+        mover.batch = None
+        mover.save()
+        self.assertNotIn((mover.user.email, "student"), self.members(classroom))
+
+        batch_b.classrooms.remove(classroom)
+        self.assertEqual(len(self.members(classroom)), 3)
+
+        batch_a.delete()
+        self.assertEqual(self.members(classroom), {("teacher@bdu.edu.et", "teacher")})
+
+    def test_recipient_lookup_uses_the_membership_table(self):
+        classroom = Classroom.objects.create(name="Compilers", courseNo="CS410", description="", teacher=self.teacher)
+        classroom.batches.add(self.create_batch("C"))
+
+        with self.assertNumQueries(1):
+            recipients = list(classroom.student_user_ids())
+        self.assertEqual(len(recipients), 3)
+        self.assertEqual(classroom.get_all_student().count(), 3)
+
+    def test_rebuild_command_repairs_drift(self):
+        classroom = Classroom.objects.create(name="Security", courseNo="CS420", description="", teacher=self.teacher)
+        classroom.batches.add(self.create_batch("D"))
+        ClassroomMembership.objects.filter(role=ClassroomMembership.STUDENT).delete()
+
+        with self.assertRaises(CommandError):
+            call_command("rebuild_classroom_memberships", "--check", stdout=StringIO())
+        call_command("rebuild_classroom_memberships", stdout=StringIO())
+        call_command("rebuild_classroom_memberships", "--check", stdout=StringIO())
+        self.assertEqual(len(self.members(classroom)), 4)
+
+
+class ClassroomAccessTests(ClassroomTestCase):
+    classroom_name = "Robotics"
+    course_no = "CS480"
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        department = Department.objects.create(name="Computer Science")
+        cls.batch = Batch.objects.create(section="A", year=4, department=department)
+        student_user = User.objects.create_user(email="student@bdu.edu.et", password="secret", role="student")
+        cls.student = Student.objects.create(
+            user=student_user, student_id="A1", first_name="Sara", last_name="Tesfaye", phone="0", batch=cls.batch
+        )
+
+    def test_decisions_are_cached_and_invalidated_by_roster_changes(self):
+        student_id = self.student.user_id
+        self.assertFalse(ClassroomAccess.has_access(student_id, self.classroom.id))
+        with self.assertNumQueries(0):
+            self.assertFalse(ClassroomAccess.has_access(student_id, self.classroom.id))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.classroom.batches.add(self.batch)
+            # The old decision stands until the change commits.
+            self.assertFalse(ClassroomAccess.has_access(student_id, self.classroom.id))
+        self.assertTrue(ClassroomAccess.has_access(student_id, self.classroom.id))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.student.batch = None
+            self.student.save()
+        self.assertFalse(ClassroomAccess.has_access(student_id, self.classroom.id))
+        self.assertTrue(ClassroomAccess.has_access(self.teacher.user_id, self.classroom.id))
+
+    def test_members_endpoint_requires_membership(self):
+        client = APIClient()
+        client.force_authenticate(self.student.user)
+        url = reverse("classroom-members", kwargs={"id": self.classroom.id})
+
+        self.assertEqual(client.get(url).status_code, 403)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.classroom.batches.add(self.batch)
+        self.assertEqual(client.get(url).status_code, 200)
+
+
+class ClassroomRosterTests(ClassroomTestCase):
+    classroom_name = None
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.department = Department.objects.create(name="Computer Science")
+
+    def create_batch(self, section, students):
+        batch = Batch.objects.create(section=section, year=1, department=self.department)
+        users = User.objects.bulk_create([
+            User(email=f"{section}-{i}@bdu.edu.et", role="student") for i in range(students)
+        ])
+        Student.objects.bulk_create([
+            Student(user=user, student_id=f"{section}{i}", first_name="S", last_name=str(i), phone="0", batch=batch)
+            for i, user in enumerate(users)
+        ])
+        return batch
+
+    def enroll(self, batch):
+        classroom = Classroom.objects.create(name=f"Course {batch.section}", courseNo="CS1", description="", teacher=self.teacher)
+        payload = {
+            "classRoomId": classroom.id,
+            "batch": {"year": batch.year, "section": batch.section, "department": self.department.id},
+        }
+        return classroom, payload
+
+    def test_enrolling_a_cohort_takes_constant_queries(self):
+        small_classroom, small = self.enroll(self.create_batch("A", 5))
+        large_classroom, large = self.enroll(self.create_batch("B", 300))
+        url = reverse("classroom-add-student")
+
+        with CaptureQueriesContext(connection) as small_queries:
+            self.client.post(url, small, format="json")
+        with CaptureQueriesContext(connection) as large_queries:
+            response = self.client.post(url, large, format="json")
+
+        self.assertEqual(len(small_queries), len(large_queries))
+        self.assertEqual(response.data["data"]["studentsEnrolled"], 300)
+        self.assertEqual(large_classroom.memberships.filter(role="student").count(), 300)
+        notification = Notification.objects.get(message=f"You have been added to {large_classroom.name}")
+        self.assertEqual(notification.recipients.count(), 300)
+
+    def test_removes_listed_students_and_batches(self):
+        batch_a, batch_b = self.create_batch("C", 4), self.create_batch("D", 3)
+        classroom = Classroom.objects.create(name="Graphics", courseNo="CS2", description="", teacher=self.teacher)
+        classroom.batches.add(batch_a, batch_b)
+        leaving = list(batch_a.students.values_list("id", flat=True)[:2])
+
+        response = self.client.delete(
+            reverse("classroom-remove-student"),
+            {"classroomId": classroom.id, "studentIds": leaving, "batchIds": [batch_b.id]},
+            format="json",
+        )
+
+        self.assertEqual(response.data["data"], {"batchesRemoved": 1, "studentsMoved": 2, "studentsRemoved": 5})
+        self.assertEqual(classroom.get_all_student().count(), 2)
+        self.assertFalse(Student.objects.filter(id__in=leaving, batch__isnull=False).exists())
+
+    def test_moves_students_out_of_another_batch_only_when_asked(self):
+        old_batch = self.create_batch("E", 2)
+        other_classroom = Classroom.objects.create(name="Networks", courseNo="CS4", description="", teacher=self.teacher)
+        other_classroom.batches.add(old_batch)
+        classroom, payload = self.enroll(self.create_batch("F", 1))
+        payload["studentIds"] = list(old_batch.students.values_list("id", flat=True))
+        url = reverse("classroom-add-student")
+
+        response = self.client.post(url, payload, format="json")
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data["errors"]["studentIds"], payload["studentIds"])
+        self.assertEqual(other_classroom.get_all_student().count(), 2)
+        self.assertFalse(classroom.batches.exists())
+
+        response = self.client.post(url, {**payload, "moveStudents": True}, format="json")
+
+        self.assertEqual(response.data["data"]["studentsMoved"], 2)
+        self.assertEqual(classroom.get_all_student().count(), 3)
+        self.assertEqual(other_classroom.get_all_student().count(), 0)
+
+    def test_rejects_unknown_ids(self):
+        classroom = Classroom.objects.create(name="Vision", courseNo="CS3", description="", teacher=self.teacher)
+        response = self.client.post(
+            reverse("classroom-add-student"), {"classRoomId": classroom.id, "batchIds": [999]}, format="json"
+        )
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.data["errors"]["batchIds"], [999])
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class AttachmentDownloadTests(ClassroomTestCase):
+    classroom_name = "Optics"
+    course_no = "PH201"
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.announcement = Announcement.objects.create(title="Notes", content="", class_room=cls.classroom)
+        cls.content = bytes(range(256)) * 40
+        cls.attachment = Attachment.objects.create(
+            announcement=cls.announcement, file=SimpleUploadedFile("notes.pdf", cls.content)
+        )
+
+    def setUp(self):
+        super().setUp()
+        self.url = reverse("attachment-download", kwargs={
+            "class_room_id": self.classroom.id, "id": self.announcement.id, "attachment_id": self.attachment.id,
+        })
+
+    def test_full_download_carries_validators(self):
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b"".join(response.streaming_content), self.content)
+        self.assertEqual(response["Accept-Ranges"], "bytes")
+        self.assertEqual(response["Content-Type"], "application/pdf")
+
+        etag = response["ETag"]
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(
+            self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=response["Last-Modified"]).status_code, 304
+        )
+
+    def test_byte_ranges(self):
+        response = self.client.get(self.url, HTTP_RANGE="bytes=100-199")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response["Content-Range"], f"bytes 100-199/{len(self.content)}")
+        self.assertEqual(b"".join(response.streaming_content), self.content[100:200])
+
+        suffix = self.client.get(self.url, HTTP_RANGE="bytes=-10")
+        self.assertEqual(b"".join(suffix.streaming_content), self.content[-10:])
+
+        self.assertEqual(self.client.get(self.url, HTTP_RANGE="bytes=999999-").status_code, 416)
+        stale = self.client.get(self.url, HTTP_RANGE="bytes=0-9", HTTP_IF_RANGE='"stale"')
+        self.assertEqual(stale.status_code, 200)
+
+    @override_settings(ATTACHMENT_SENDFILE_BACKEND="x-accel-redirect")
+    def test_offloads_to_the_proxy(self):
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["X-Accel-Redirect"], f"/protected-media/{self.attachment.file.name}")
+        self.assertEqual(response.content, b"")
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class AttachmentBlobTests(ClassroomTestCase):
+    classroom_name = "Thermo"
+    course_no = "PH301"
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.announcements = [
+            Announcement.objects.create(title=f"Week {i}", content="", class_room=cls.classroom) for i in range(2)
+        ]
+
+    def upload(self, announcement, name, content):
+        url = reverse("attachment-create", kwargs={"class_room_id": self.classroom.id, "id": announcement.id})
+        response = self.client.post(url, {"attachments": SimpleUploadedFile(name, content)}, format="multipart")
+        self.assertEqual(response.status_code, 201)
+        return Attachment.objects.get(id=response.data["data"]["id"])
+
+    def delete(self, attachment):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.delete(reverse("attachment-delete", kwargs={"attachment_id": attachment.id}))
+        self.assertEqual(response.status_code, 200)
+
+    def test_duplicate_uploads_share_one_reference_counted_blob(self):
+        first = self.upload(self.announcements[0], "syllabus.pdf", b"%PDF-1.4 syllabus")
+        second = self.upload(self.announcements[1], "syllabus-copy.pdf", b"%PDF-1.4 syllabus")
+        other = self.upload(self.announcements[1], "notes.pdf", b"%PDF-1.4 notes")
+
+        self.assertEqual(first.blob_id, second.blob_id)
+        self.assertNotEqual(first.blob_id, other.blob_id)
+        self.assertEqual(first.file.name, second.file.name)
+        self.assertEqual(AttachmentBlob.objects.get(id=first.blob_id).ref_count, 2)
+
+        storage, name = first.file.storage, first.file.name
+        self.delete(first)
+        self.assertTrue(storage.exists(name))
+        self.assertEqual(AttachmentBlob.objects.get(id=second.blob_id).ref_count, 1)
+
+        self.delete(second)
+        self.assertFalse(AttachmentBlob.objects.filter(id=second.blob_id).exists())
+        self.assertFalse(storage.exists(name))
+
+    def test_rolled_back_upload_leaves_only_a_file_to_purge(self):
+        content = b"%PDF-1.4 draft"
+        with self.assertRaises(DatabaseError):
+            with transaction.atomic():
+                blob = BlobStore.store(SimpleUploadedFile("draft.pdf", content))
+                raise DatabaseError("lost connection")
+
+        storage = blob.file.storage
+        self.assertFalse(AttachmentBlob.objects.exists())
+        self.assertTrue(storage.exists(blob.file.name))
+        self.assertEqual(os.listdir(BlobStore.temp_dir()), [])
+        kept = self.upload(self.announcements[1], "kept.pdf", b"%PDF-1.4 kept")
+
+        call_command("purge_stale_uploads", hours=0, stdout=StringIO())
+        self.assertFalse(storage.exists(blob.file.name))
+        self.assertTrue(storage.exists(kept.file.name))
+
+        attachment = self.upload(self.announcements[0], "draft.pdf", content)
+        self.assertEqual(attachment.file.name, blob.file.name)
+        with attachment.file.open("rb") as stored:
+            self.assertEqual(stored.read(), content)
+
+    def test_duplicate_upload_restores_a_missing_blob_file(self):
+        first = self.upload(self.announcements[0], "syllabus.pdf", b"%PDF-1.4 syllabus")
+        first.file.storage.delete(first.file.name)
+
+        second = self.upload(self.announcements[1], "syllabus.pdf", b"%PDF-1.4 syllabus")
+
+        self.assertEqual(second.blob_id, first.blob_id)
+        with first.file.open("rb") as stored:
+            self.assertEqual(stored.read(), b"%PDF-1.4 syllabus")
+
+    def test_download_uses_original_name_and_content_hash(self):
+        attachment = self.upload(self.announcements[0], "lab-manual.pdf", b"%PDF-1.4 manual")
+        url = reverse("attachment-download", kwargs={
+            "class_room_id": self.classroom.id, "id": self.announcements[0].id, "attachment_id": attachment.id,
+        })
+
+        response = self.client.get(url)
+        self.assertEqual(response["Content-Disposition"], 'attachment; filename="lab-manual.pdf"')
+        self.assertEqual(response["ETag"], f'"{attachment.blob.sha256}"')
+
+        attachment.original_name = 'lab "final".pdf'
+        attachment.save()
+        response = self.client.get(url)
+        self.assertEqual(response["Content-Disposition"], 'attachment; filename="lab \\"final\\".pdf"')
+
+    def test_deleting_an_announcement_releases_its_blobs(self):
+        attachment = self.upload(self.announcements[0], "slides.pdf", b"%PDF-1.4 slides")
+        self.upload(self.announcements[1], "slides.pdf", b"%PDF-1.4 slides")
+
+        self.announcements[0].delete()
+        self.assertEqual(AttachmentBlob.objects.get(id=attachment.blob_id).ref_count, 1)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class ChunkedUploadTests(ClassroomTestCase):
+    classroom_name = "Acoustics"
+    course_no = "PH401"
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.announcement = Announcement.objects.create(title="Recordings", content="", class_room=cls.classroom)
+
+    def setUp(self):
+        super().setUp()
+        self.chunk_size = 64 * 1024
+        self.content = os.urandom(self.chunk_size * 2 + 1000)
+
+    def start(self, **extra):
+        url = reverse("attachment-upload-start", kwargs={"class_room_id": self.classroom.id, "id": self.announcement.id})
+        payload = {"filename": "lecture.mp3", "size": len(self.content), "chunkSize": self.chunk_size, **extra}
+        response = self.client.post(url, payload, format="json")
+        self.assertEqual(response.status_code, 201)
+        return response.data["data"]["uploadId"]
+
+    def put_chunk(self, upload_id, index, data, **headers):
+        url = reverse("attachment-upload-chunk", kwargs={"upload_id": upload_id, "index": index})
+        return self.client.put(url, data, content_type="application/octet-stream", **headers)
+
+    def chunk(self, index):
+        return self.content[index * self.chunk_size:(index + 1) * self.chunk_size]
+
+    def test_resumes_after_an_interrupted_chunk(self):
+        upload_id = self.start(sha256=hashlib.sha256(self.content).hexdigest())
+
+        self.assertEqual(self.put_chunk(upload_id, 2, self.chunk(2)).status_code, 200)
+        self.assertEqual(self.put_chunk(upload_id, 0, self.chunk(0)[:1000]).status_code, 400)
+        bad_checksum = self.put_chunk(upload_id, 1, self.chunk(1), HTTP_X_CHUNK_SHA256="0" * 64)
+        self.assertEqual(bad_checksum.status_code, 400)
+
+        status = self.client.get(reverse("attachment-upload-status", kwargs={"upload_id": upload_id}))
+        self.assertEqual(status.data["data"]["missingChunks"], [0, 1])
+        complete_url = reverse("attachment-upload-complete", kwargs={"upload_id": upload_id})
+        self.assertEqual(self.client.post(complete_url).status_code, 400)
+
+        for index in status.data["data"]["missingChunks"]:
+            self.assertEqual(self.put_chunk(upload_id, index, self.chunk(index)).status_code, 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(complete_url)
+
+        self.assertEqual(response.status_code, 201)
+        attachment = Attachment.objects.get(id=response.data["data"]["id"])
+        with attachment.file.open("rb") as stored:
+            self.assertEqual(stored.read(), self.content)
+        self.assertEqual(attachment.original_name, "lecture.mp3")
+        self.assertFalse(AttachmentUpload.objects.filter(id=upload_id).exists())
+        self.assertNotIn(f"{upload_id}.part", os.listdir(ChunkedUploads.temp_dir()))
+
+    def test_completing_again_after_a_rollback(self):
+        upload_id = self.start()
+        for index in range(3):
+            self.put_chunk(upload_id, index, self.chunk(index))
+        upload = AttachmentUpload.objects.get(id=upload_id)
+
+        with mock.patch.object(Attachment.objects, "create", side_effect=DatabaseError("lost connection")):
+            with self.assertRaises(DatabaseError):
+                ChunkedUploads.complete(upload)
+
+        self.assertTrue(AttachmentUpload.objects.filter(id=upload_id).exists())
+        self.assertIn(f"{upload_id}.part", os.listdir(ChunkedUploads.temp_dir()))
+        with self.captureOnCommitCallbacks(execute=True):
+            attachment = ChunkedUploads.complete(upload)
+        with attachment.file.open("rb") as stored:
+            self.assertEqual(stored.read(), self.content)
+        self.assertNotIn(f"{upload_id}.part", os.listdir(ChunkedUploads.temp_dir()))
+
+    def test_completes_an_upload_only_once(self):
+        upload_id = self.start()
+        for index in range(3):
+            self.put_chunk(upload_id, index, self.chunk(index))
+        upload = AttachmentUpload.objects.get(id=upload_id)
+
+        ChunkedUploads.complete(upload)
+        with self.assertRaises(UploadError):
+            ChunkedUploads.complete(upload)
+        self.assertEqual(Attachment.objects.count(), 1)
+
+    def test_writing_a_chunk_keeps_the_upload_from_being_purged(self):
+        upload_id = self.start()
+        AttachmentUpload.objects.filter(id=upload_id).update(updated_at=timezone.now() - timedelta(hours=2))
+
+        self.put_chunk(upload_id, 0, self.chunk(0))
+        call_command("purge_stale_uploads", hours=1, stdout=StringIO())
+
+        self.assertTrue(AttachmentUpload.objects.filter(id=upload_id).exists())
+
+    def test_rejects_a_file_whose_checksum_does_not_match(self):
+        upload_id = self.start(sha256="f" * 64)
+        for index in range(3):
+            self.put_chunk(upload_id, index, self.chunk(index))
+
+        response = self.client.post(reverse("attachment-upload-complete", kwargs={"upload_id": upload_id}))
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Attachment.objects.exists())
+
+    def test_uploads_belong_to_their_uploader(self):
+        upload_id = self.start()
+        other = User.objects.create_user(email="other@bdu.edu.et", password="secret", role="teacher")
+        self.client.force_authenticate(other)
+        self.assertEqual(self.put_chunk(upload_id, 0, self.chunk(0)).status_code, 404)
+
+
+class UnixSocketChannelLayerTests(SimpleTestCase):
+    """Two layer instances stand in for two worker processes sharing one hub."""
+
+    def run_with_hub(self, scenario):
+        async def main():
+            with tempfile.TemporaryDirectory() as directory:
+                path = os.path.join(directory, "hub.sock")
+                hub = ChannelHub(path)
+                await hub.serve()
+                first, second = UnixSocketChannelLayer(path=path), UnixSocketChannelLayer(path=path)
+                try:
+                    await scenario(first, second)
+                finally:
+                    await first.close()
+                    await second.close()
+                    await hub.close()
+
+        asyncio.run(main())
+
+    def test_group_send_reaches_other_processes(self):
+        async def scenario(first, second):
+            local, remote = await first.new_channel(), await second.new_channel()
+            await first.group_add("chat_1", local)
+            await second.group_add("chat_1", remote)
+
+            await first.group_send("chat_1", {"type": "chat.message", "message": "hello"})
+
+            self.assertEqual((await first.receive(local))["message"], "hello")
+            received = await asyncio.wait_for(second.receive(remote), timeout=2)
+            self.assertEqual(received["message"], "hello")
+
+        self.run_with_hub(scenario)
+
+    def test_send_routes_to_the_owning_process(self):
+        async def scenario(first, second):
+            remote = await second.new_channel()
+            await second.group_add("chat_2", remote)
+
+            await first.send(remote, {"type": "chat.message", "message": "direct"})
+
+            received = await asyncio.wait_for(second.receive(remote), timeout=2)
+            self.assertEqual(received["message"], "direct")
+
+        self.run_with_hub(scenario)
+
+    def test_delivers_locally_without_a_hub(self):
+        async def scenario():
+            layer = UnixSocketChannelLayer(path=os.path.join(tempfile.gettempdir(), "missing-hub.sock"))
+            channel = await layer.new_channel()
+            with self.assertLogs("config.channel_layers", "WARNING"):
+                await layer.group_add("chat_3", channel)
+            await layer.group_send("chat_3", {"type": "chat.message", "message": "local"})
+            self.assertEqual((await layer.receive(channel))["message"], "local")
+
+        asyncio.run(scenario())
+
+
+class MessageWriterTests(TransactionTestCase):
+    def setUp(self):
+        teacher = create_teacher()
+        self.user = teacher.user
+        self.classroom = create_classroom(teacher, "Robotics", "CS480")
+
+    def test_reserved_ids_are_not_reused_by_ordinary_inserts(self):
+        reserved = reserve_message_ids(10)
+        self.assertEqual(len(set(reserved)), 10)
+        message = Message.objects.create(sender=self.user, classroom=self.classroom, content="hi")
+        self.assertGreater(message.id, max(reserved))
+        self.assertEqual(reserve_message_ids(5)[0], message.id + 1)
+
+    def test_messages_are_broadcast_ready_before_they_are_written(self):
+        async def scenario():
+            writer = MessageWriter.current()
+            messages = [await writer.submit(self.user.id, self.classroom.id, f"m{i}") for i in range(5)]
+            self.assertEqual(len({message.id for message in messages}), 5)
+            self.assertEqual(writer.backlog, 5)
+            await writer.flush()
+            return messages
+
+        messages = asyncio.run(scenario())
+        stored = {message.id: message.timestamp for message in Message.objects.all()}
+        self.assertEqual(stored, {message.id: message.timestamp for message in messages})
+
+    @override_settings(CHAT_WRITE_BEHIND_MAX_PENDING=2, CHAT_WRITE_BEHIND_INTERVAL_MS=10000)
+    def test_producers_wait_while_the_backlog_is_full(self):
+        async def scenario():
+            writer = MessageWriter.current()
+            await writer.submit(self.user.id, self.classroom.id, "one")
+            await writer.submit(self.user.id, self.classroom.id, "two")
+            third = asyncio.ensure_future(writer.submit(self.user.id, self.classroom.id, "three"))
+            await asyncio.sleep(0.05)
+            self.assertFalse(third.done())
+            await writer.flush()
+            await asyncio.wait_for(third, timeout=2)
+            await writer.flush()
+
+        asyncio.run(scenario())
+        self.assertEqual(Message.objects.count(), 3)
+
+    @override_settings(CHAT_WRITE_BEHIND_INTERVAL_MS=10)
+    def test_failed_writes_are_requeued_and_retried(self):
+        failures = [RuntimeError("connection reset")]
+
+        def flaky_write(messages):
+            if failures:
+                raise failures.pop()
+            write_messages(messages)
+
+        async def scenario():
+            writer = MessageWriter.current()
+            message = await writer.submit(self.user.id, self.classroom.id, "retried")
+            await asyncio.wait_for(writer.wait_written(message.id), timeout=5)
+            return message
+
+        with mock.patch("classrooms.message_writer.write_messages", flaky_write), \
+                mock.patch("classrooms.message_writer.RETRY_DELAY", 0.01), \
+                self.assertLogs("classrooms.message_writer", "ERROR"):
+            message = asyncio.run(scenario())
+        self.assertEqual(list(Message.objects.values_list("id", "content")), [(message.id, "retried")])
+
+    def test_rows_for_deleted_classrooms_are_dropped_without_losing_the_batch(self):
+        ids = reserve_message_ids(2)
+        messages = [
+            Message(id=ids[0], sender=self.user, classroom_id=self.classroom.id, content="kept"),
+            Message(id=ids[1], sender=self.user, classroom_id=self.classroom.id + 1000, content="dropped"),
+        ]
+        with self.assertLogs("classrooms.message_writer", "WARNING"):
+            write_messages(messages)
+        self.assertEqual(list(Message.objects.values_list("content", flat=True)), ["kept"])
+
+
+@override_settings(CHAT_READ_RECEIPT_INTERVAL_MS=20)
+class ChatReadWatermarkTests(TransactionTestCase):
+    def setUp(self):
+        self.teacher = create_teacher()
+        department = Department.objects.create(name="Computer Science")
+        batch = Batch.objects.create(section="A", year=4, department=department)
+        self.student = User.objects.create_user(email="student@bdu.edu.et", password="secret", role="student")
+        Student.objects.create(user=self.student, student_id="A1", first_name="Sara", last_name="Tesfaye", phone="0", batch=batch)
+        self.classroom = create_classroom(self.teacher, "Robotics", "CS480")
+        self.classroom.batches.add(batch)
+        self.messages = [
+            Message.objects.create(sender=self.teacher.user, classroom=self.classroom, content=f"m{i}") for i in range(5)
+        ]
+
+    def mark(self, message):
+        return (self.student.id, self.classroom.id, message.id, message.timestamp)
+
+    def test_watermarks_only_move_forward(self):
+        with self.assertNumQueries(1):
+            ChatReadWatermark.advance([self.mark(self.messages[3])])
+        ChatReadWatermark.advance([self.mark(self.messages[1])])
+
+        mark = ChatReadWatermark.objects.get(user=self.student, classroom=self.classroom)
+        self.assertEqual(mark.last_read_message_id, self.messages[3].id)
+
+    def test_unread_counts_come_from_the_watermark(self):
+        Message.objects.create(sender=self.student, classroom=self.classroom, content="own")
+        self.assertEqual(ChatReadWatermark.unread_counts(self.student.id, [self.classroom.id]), {self.classroom.id: 5})
+
+        ChatReadWatermark.advance([self.mark(self.messages[2])])
+        with self.assertNumQueries(2):
+            counts = ChatReadWatermark.unread_counts(self.student.id, [self.classroom.id])
+        self.assertEqual(counts, {self.classroom.id: 2})
+
+    def test_receipts_are_coalesced_into_one_write_and_one_event(self):
+        async def scenario():
+            channel_layer = get_channel_layer()
+            channel = await channel_layer.new_channel()
+            await channel_layer.group_add(f"chat_{self.classroom.id}", channel)
+            batcher = ReadReceipts.current()
+            for message in self.messages:
+                batcher.mark(str(self.classroom.id), self.student.id, message.id, "Sara Tesfaye")
+            batcher.mark(str(self.classroom.id), self.teacher.user_id, self.messages[0].id, "Abebe Kebede")
+            event = await asyncio.wait_for(channel_layer.receive(channel), timeout=2)
+            await channel_layer.group_discard(f"chat_{self.classroom.id}", channel)
+            return event
+
+        event = asyncio.run(scenario())
+        self.assertEqual(event["type"], "read_receipts")
+        self.assertCountEqual(
+            [(receipt["reader_id"], receipt["message_id"]) for receipt in event["receipts"]],
+            [(self.student.id, self.messages[-1].id), (self.teacher.user_id, self.messages[0].id)],
+        )
+        self.assertEqual(ChatReadWatermark.unread_counts(self.student.id, [self.classroom.id]), {self.classroom.id: 0})
+
+    def test_latest_receipt_is_chosen_by_timestamp_not_id(self):
+        # Workers hand out ids from their own reserved blocks, so a later message can have a lower id.
+        ids = reserve_message_ids(2)
+        now = timezone.now()
+        later = Message.objects.create(
+            id=ids[0], sender=self.teacher.user, classroom=self.classroom, content="later", timestamp=now + timedelta(seconds=5)
+        )
+        earlier = Message.objects.create(
+            id=ids[1], sender=self.teacher.user, classroom=self.classroom, content="earlier", timestamp=now
+        )
+
+        async def scenario():
+            batcher = ReadReceipts()
+            batcher.add({(str(self.classroom.id), self.student.id): {earlier.id: "Sara", later.id: "Sara"}})
+            await batcher.flush()
+
+        asyncio.run(scenario())
+        mark = ChatReadWatermark.objects.get(user=self.student, classroom=self.classroom)
+        self.assertEqual(mark.last_read_message_id, later.id)
+
+    def test_receipts_for_messages_queued_elsewhere_are_retried(self):
+        queued_id = reserve_message_ids(1)[0]
+        key = (str(self.classroom.id), self.student.id)
+
+        async def flush(batcher):
+            await batcher.flush()
+            return dict(batcher.pending)
+
+        batcher = ReadReceipts()
+        batcher.add({key: {queued_id: "Sara", self.messages[1].id: "Sara"}})
+        # The written message is marked now; the queued one is kept for the next flush.
+        self.assertEqual(asyncio.run(flush(batcher)), {key: {queued_id: "Sara"}})
+        self.assertEqual(
+            ChatReadWatermark.objects.get(user=self.student).last_read_message_id, self.messages[1].id
+        )
+
+        Message.objects.create(id=queued_id, sender=self.teacher.user, classroom=self.classroom, content="late")
+        self.assertEqual(asyncio.run(flush(batcher)), {})
+        self.assertEqual(ChatReadWatermark.objects.get(user=self.student).last_read_message_id, queued_id)
+
+    def test_receipts_for_unknown_messages_are_eventually_dropped(self):
+        batcher = ReadReceipts()
+        batcher.add({(str(self.classroom.id), self.student.id): {10 ** 9: "Sara"}})
+
+        async def flush_until_empty():
+            flushes = 0
+            while batcher.pending:
+                await batcher.flush()
+                flushes += 1
+            return flushes
+
+        self.assertEqual(asyncio.run(flush_until_empty()), MAX_RESOLVE_ATTEMPTS + 1)
+        self.assertEqual(batcher.attempts, {})
+        self.assertFalse(ChatReadWatermark.objects.exists())
+
+    def test_consumer_reports_unread_messages_and_batches_receipts(self):
+        async def scenario():
+            communicator = WebsocketCommunicator(
+                URLRouter(websocket_urlpatterns), f"/ws/chat/classroom/{self.classroom.id}/"
+            )
+            communicator.scope["user"] = self.student
+            connected, _ = await communicator.connect()
+            self.assertTrue(connected)
+            unread = await communicator.receive_json_from()
+            for message in self.messages:
+                await communicator.send_json_to({"type": "read_receipt", "message_id": message.id})
+            receipts = await communicator.receive_json_from(timeout=2)
+            await communicator.disconnect()
+            return unread, receipts
+
+        unread, receipts = asyncio.run(scenario())
+        self.assertEqual(unread, {"type": "unread", "count": 5})
+        self.assertEqual(
+            receipts["receipts"],
+            [{"message_id": self.messages[-1].id, "reader_id": self.student.id, "reader_name": "Sara Tesfaye"}],
+        )
+
+
+@override_settings(CHAT_WRITE_BEHIND_INTERVAL_MS=60000)
+class ChatCatchUpTests(TransactionTestCase):
+    def setUp(self):
+        teacher = create_teacher()
+        self.user = teacher.user
+        self.classroom = create_classroom(teacher, "Robotics", "CS480")
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever)
+        self.thread.start()
+
+    def tearDown(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+
+    def submit(self, content):
+        async def submit():
+            return await MessageWriter.current().submit(self.user.id, self.classroom.id, content)
+        return asyncio.run_coroutine_threadsafe(submit(), self.loop).result(timeout=5)
+
+    def test_since_a_message_still_queued_in_this_process(self):
+        queued = self.submit("queued")
+        after = self.submit("after")
+        self.assertFalse(Message.objects.filter(id=queued.id).exists())
+
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.get(reverse("classroom-messages", kwargs={"classroom_id": self.classroom.id}), {"since": queued.id})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([m["id"] for m in response.data["data"]["results"]], [after.id])
+
+
+class ChatHistoryTests(ClassroomTestCase):
+    classroom_name = "Robotics"
+    course_no = "CS480"
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        user = cls.teacher.user
+        cls.outsider = User.objects.create_user(email="outsider@bdu.edu.et", password="secret", role="teacher")
+        start = timezone.now() - timedelta(hours=1)
+        # Pairs share a timestamp so the id breaks ties.
+        cls.messages = [
+            Message.objects.create(
+                sender=user, classroom=cls.classroom, content=f"m{i}", timestamp=start + timedelta(seconds=i // 2)
+            )
+            for i in range(7)
+        ]
+        ChatReadWatermark.advance([(user.id, cls.classroom.id, cls.messages[2].id, cls.messages[2].timestamp)])
+
+    def setUp(self):
+        super().setUp()
+        self.url = reverse("classroom-messages", kwargs={"classroom_id": self.classroom.id})
+
+    def test_pages_back_from_the_newest_message(self):
+        first = self.client.get(self.url, {"pageSize": 4}).data["data"]
+        self.assertEqual([m["content"] for m in first["results"]], ["m6", "m5", "m4", "m3"])
+        self.assertEqual(first["results"][0]["sender_name"], "Abebe Kebede")
+        self.assertEqual(first["watermark"]["lastReadMessageId"], self.messages[2].id)
+        self.assertEqual(first["unreadCount"], 0)
+
+        second = self.client.get(first["next"]).data["data"]
+        self.assertEqual([m["content"] for m in second["results"]], ["m2", "m1", "m0"])
+        self.assertIsNone(second["next"])
+
+    def test_page_queries_do_not_grow_with_page_size(self):
+        # Warm the access and display-name caches.
+        self.client.get(self.url, {"pageSize": 1})
+        with self.assertNumQueries(3):
+            self.client.get(self.url, {"pageSize": 2})
+        with self.assertNumQueries(3):
+            self.client.get(self.url, {"pageSize": 7})
+
+    def test_since_returns_newer_messages_oldest_first(self):
+        data = self.client.get(self.url, {"since": self.messages[2].id, "pageSize": 3}).data["data"]
+        self.assertEqual([m["content"] for m in data["results"]], ["m3", "m4", "m5"])
+        self.assertTrue(data["hasMore"])
+
+        data = self.client.get(self.url, {"since": data["results"][-1]["id"], "pageSize": 3}).data["data"]
+        self.assertEqual([m["content"] for m in data["results"]], ["m6"])
+        self.assertFalse(data["hasMore"])
+
+    def test_since_follows_write_order_not_timestamps(self):
+        # Queued in another worker: sent before the anchor was, written after it.
+        late = Message.objects.create(
+            sender=self.teacher.user, classroom=self.classroom, content="late", timestamp=self.messages[0].timestamp
+        )
+
+        data = self.client.get(self.url, {"since": self.messages[6].id}).data["data"]
+
+        self.assertEqual([m["id"] for m in data["results"]], [late.id])
+
+    @override_settings(CHAT_HISTORY_ANCHOR_WAIT_MS=0)
+    def test_rejects_unknown_since_and_non_members(self):
+        self.assertEqual(self.client.get(self.url, {"since": "abc"}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {"since": self.messages[-1].id + 100}).status_code, 400)
+
+        self.client.force_authenticate(self.outsider)
+        self.assertEqual(self.client.get(self.url).status_code, 403)
@@ -0,0 +1,147 @@
+import hashlib
+import os
+
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from django.utils import timezone
+
+from .blobs import BlobStore
+from .models import Attachment, AttachmentUpload, AttachmentUploadChunk
+
+DEFAULT_CHUNK_SIZE = 5 * 1024 * 1024
+MIN_CHUNK_SIZE = 64 * 1024
+MAX_CHUNK_SIZE = 50 * 1024 * 1024
+IO_BLOCK_SIZE = 64 * 1024
+
+
+class UploadError(Exception):
+    pass
+
+
+class ChunkedUploads:
+    """
+    Resumable uploads: ``start`` preallocates a temporary file, ``write_chunk`` streams
+    a request body to its offset while hashing it, and ``complete`` verifies the
+    whole file and stores it as a content-addressed attachment.
+    """
+
+    @staticmethod
+    def temp_dir():
+        return getattr(settings, "ATTACHMENT_UPLOAD_TEMP_DIR", os.path.join(settings.MEDIA_ROOT, "upload-tmp"))
+
+    @staticmethod
+    def temp_path(upload):
+        return os.path.join(ChunkedUploads.temp_dir(), f"{upload.id}.part")
+
+    @staticmethod
+    def start(announcement, uploader, filename, size, chunk_size=None, sha256=""):
+        max_size = getattr(settings, "ATTACHMENT_MAX_UPLOAD_SIZE", 500 * 1024 * 1024)
+        if size < 0 or size > max_size:
+            raise UploadError(f"File size must be between 0 and {max_size} bytes.")
+        chunk_size = chunk_size or DEFAULT_CHUNK_SIZE
+        if not MIN_CHUNK_SIZE <= chunk_size <= MAX_CHUNK_SIZE:
+            raise UploadError(f"Chunk size must be between {MIN_CHUNK_SIZE} and {MAX_CHUNK_SIZE} bytes.")
+        upload = AttachmentUpload.objects.create(
+            announcement=announcement,
+            uploader=uploader,
+            filename=os.path.basename(filename)[:255] or "attachment",
+            size=size,
+            chunk_size=chunk_size,
+            sha256=(sha256 or "").lower(),
+        )
+        os.makedirs(ChunkedUploads.temp_dir(), exist_ok=True)
+        with open(ChunkedUploads.temp_path(upload), "wb") as part:
+            part.truncate(size)
+        return upload
+
+    @staticmethod
+    def write_chunk(upload, index, stream, expected_sha256=None):
+        """Write chunk ``index`` from a file-like ``stream``; rewriting a chunk is allowed."""
+        if not 0 <= index < upload.total_chunks:
+            raise UploadError(f"Chunk index must be between 0 and {upload.total_chunks - 1}.")
+        expected_length = upload.chunk_length(index)
+        digest = hashlib.sha256()
+        written = 0
+        with open(ChunkedUploads.temp_path(upload), "r+b") as part:
+            part.seek(index * upload.chunk_size)
+            while written <= expected_length:
+                data = stream.read(min(IO_BLOCK_SIZE, expected_length + 1 - written))
+                if not data:
+                    break
+                if written + len(data) > expected_length:
+                    raise UploadError(f"Chunk {index} must be {expected_length} bytes.")
+                part.write(data)
+                digest.update(data)
+                written += len(data)
+        if written != expected_length:
+            raise UploadError(f"Chunk {index} must be {expected_length} bytes, got {written}.")
+        checksum = digest.hexdigest()
+        if expected_sha256 and expected_sha256.lower() != checksum:
+            raise UploadError(f"Chunk {index} checksum mismatch.")
+        AttachmentUploadChunk.objects.update_or_create(upload=upload, index=index, defaults={"sha256": checksum})
+        # Keeps purge_stale_uploads off uploads that are still receiving chunks.
+        AttachmentUpload.objects.filter(pk=upload.pk).update(updated_at=timezone.now())
+        return checksum
+
+    @staticmethod
+    def received_chunks(upload):
+        return sorted(upload.chunks.values_list("index", flat=True))
+
+    @staticmethod
+    def status(upload):
+        received = ChunkedUploads.received_chunks(upload)
+        received_set = set(received)
+        return {
+            "uploadId": str(upload.id),
+            "filename": upload.filename,
+            "size": upload.size,
+            "chunkSize": upload.chunk_size,
+            "totalChunks": upload.total_chunks,
+            "receivedChunks": received,
+            "missingChunks": [i for i in range(upload.total_chunks) if i not in received_set],
+        }
+
+    @staticmethod
+    def complete(upload):
+        """Verify the assembled file and attach it to the announcement."""
+        path = ChunkedUploads.temp_path(upload)
+        with transaction.atomic():
+            # Concurrent completions of one upload queue here; only the first finds it.
+            upload = AttachmentUpload.objects.select_for_update().select_related("announcement").filter(
+                pk=upload.pk
+            ).first()
+            if upload is None:
+                raise UploadError("The upload has already been completed.")
+            missing = ChunkedUploads.status(upload)["missingChunks"]
+            if missing:
+                raise UploadError(f"Missing chunks: {', '.join(map(str, missing))}.")
+
+            digest = hashlib.sha256()
+            with open(path, "rb") as part:
+                for block in iter(lambda: part.read(IO_BLOCK_SIZE), b""):
+                    digest.update(block)
+            sha256 = digest.hexdigest()
+            if upload.sha256 and upload.sha256 != sha256:
+                raise UploadError("File checksum mismatch.")
+
+            # BlobStore copies the file rather than moving it: if the transaction rolls
+            # back, the upload row survives and a retry needs its assembled file.
+            with open(path, "rb") as part:
+                blob = BlobStore.store(File(part, name=upload.filename), sha256=sha256)
+            attachment = Attachment.objects.create(
+                announcement=upload.announcement,
+                file=blob.file.name,
+                blob=blob,
+                original_name=upload.filename,
+            )
+            upload.delete()
+            transaction.on_commit(lambda: ChunkedUploads.discard(path))
+        return attachment
+
+    @staticmethod
+    def discard(path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
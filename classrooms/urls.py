@@ -3,6 +3,8 @@ from .views import (
     ClassroomView,
     TeacherClassroomView,
     StudentClassroomView,
+    ClassroomMembersView,
+    ClassroomMessageHistoryView,
     AddBatchView,
     SearchClassroomView,
     AddStudentView,
@@ -13,6 +15,10 @@ from .views import (
     AnnouncementDetailView,
     AttachmentView,
     AttachmentDownloadView,
+    AttachmentUploadStartView,
+    AttachmentUploadStatusView,
+    AttachmentUploadChunkView,
+    AttachmentUploadCompleteView,
     AttachmentDeleteView,
     ArchiveClassroomAPIView,
     UnarchiveClassroomAPIView,
@@ -25,6 +31,8 @@ from .views import (
 urlpatterns = [
     path('', ClassroomView.as_view(), name='classroom-list-create-update'),
     path('<int:id>/', ClassroomView.as_view(), name='classroom-detail'),
+    path('<int:id>/members/', ClassroomMembersView.as_view(), name='classroom-members'),
+    path('<int:classroom_id>/messages/', ClassroomMessageHistoryView.as_view(), name='classroom-messages'),
     path('teacher/<int:teacher_id>/', TeacherClassroomView.as_view(), name='classroom-by-teacher'),
     path('student/<int:student_id>/', StudentClassroomView.as_view(), name='classroom-by-student'),
     path('add-batch/', AddBatchView.as_view(), name='classroom-add-batch'),
@@ -39,6 +47,10 @@ urlpatterns = [
     path('<int:class_room_id>/announcements/attach/<int:id>/', AttachmentView.as_view(), name='attachment-create'),
     path('<int:class_room_id>/announcements/<int:id>/attachments/<int:attachment_id>/', AttachmentDownloadView.as_view(), name='attachment-download'),
     path('announcements/attachments/<int:attachment_id>/delete/', AttachmentDeleteView.as_view(), name='attachment-delete'),
+    path('<int:class_room_id>/announcements/<int:id>/uploads/', AttachmentUploadStartView.as_view(), name='attachment-upload-start'),
+    path('announcements/uploads/<uuid:upload_id>/', AttachmentUploadStatusView.as_view(), name='attachment-upload-status'),
+    path('announcements/uploads/<uuid:upload_id>/chunks/<int:index>/', AttachmentUploadChunkView.as_view(), name='attachment-upload-chunk'),
+    path('announcements/uploads/<uuid:upload_id>/complete/', AttachmentUploadCompleteView.as_view(), name='attachment-upload-complete'),
     path('<int:classroom_id>/assessment/', include('assessments.urls'), name='classroom-assessments'),
     path('<int:pk>/archive/', ArchiveClassroomAPIView.as_view(), name='classroom-archive'),
     path('<int:pk>/unarchive/', UnarchiveClassroomAPIView.as_view(), name='classroom-unarchive'),
@@ -1,29 +1,49 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status, permissions
-from django.shortcuts import get_object_or_404
+from django.conf import settings
+from django.db import transaction
 from django.db.models import Q
-from .models import( Classroom, Faculty, Student, Batch,Department, Announcement, Attachment)
-from .serializers import (ClassroomSerializer,DepartmentSerializer,
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from .models import( Classroom, Faculty, Student, Batch,Department, Announcement, Attachment, AttachmentUpload,
+                     ChatReadWatermark, Message)
+from .access import ClassroomAccess, IsClassroomMember
+from .blobs import BlobStore
+from .file_responses import serve_file
+from .message_writer import MessageWriter
+from .pagination import MemberCursorPagination, MessageCursorPagination, SearchPagination
+from .roster import ClassroomRoster
+from .search import ClassroomSearch
+from .uploads import ChunkedUploads, UploadError
+from .serializers import (ClassroomSerializer,ClassroomListSerializer,ClassroomMemberSerializer,DepartmentSerializer,
                            AnnouncementSerializer,
-                           AttachmentSerializer,FacultySerializer)
-from django.http import FileResponse
+                           AttachmentSerializer,FacultySerializer,MessageSerializer)
 import os
+import time
 from rest_framework.views import exception_handler
 import mimetypes
 
+ANCHOR_POLL_INTERVAL = 0.05
+
 class ClassroomView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def get(self, request, id=None):
         try:
             if id:
-                classroom = get_object_or_404(Classroom, id=id)
-                serializer = ClassroomSerializer(classroom)
-                data = serializer.data
-                data['members'] = []
-                for batch in classroom.batches.all():
-                    data['members'].extend(batch.students.values())
+                classroom = get_object_or_404(
+                    ClassroomListSerializer.setup_eager_loading(Classroom.objects.all()), id=id
+                )
+                data = ClassroomListSerializer(classroom).data
+                # Only the first page of the roster, and only for members (as the members
+                # endpoint requires); the rest is paged from the members endpoint.
+                if ClassroomAccess.has_access(request.user.id, classroom.id):
+                    paginator = MemberCursorPagination()
+                    page = paginator.paginate_queryset(ClassroomMembersView.get_queryset(id), request, view=self)
+                    paginator.base_url = request.build_absolute_uri(reverse('classroom-members', kwargs={'id': id}))
+                    data['members'] = ClassroomMemberSerializer(page, many=True).data
+                    data['membersNext'] = paginator.get_next_link()
                 return Response({
                     "isSuccess": True,
                     "message": None,
@@ -31,7 +51,7 @@ class ClassroomView(APIView):
                     "errors": None
                 })
             else:
-                classrooms = Classroom.objects.all()
+                classrooms = ClassroomSerializer.setup_eager_loading(Classroom.objects.all())
                 serializer = ClassroomSerializer(classrooms, many=True)
                 Response({
                     "isSuccess": True,
@@ -90,8 +110,10 @@ class TeacherClassroomView(APIView):
 
     def get(self, request, teacher_id):
         try:
-            classrooms = Classroom.objects.filter(teacher__id=teacher_id)
-            serializer = ClassroomSerializer(classrooms, many=True)
+            classrooms = ClassroomListSerializer.setup_eager_loading(
+                Classroom.objects.filter(teacher__id=teacher_id).order_by("id")
+            )
+            serializer = ClassroomListSerializer(classrooms, many=True)
             return Response({
                 "isSuccess": True,
                 "message": None,
@@ -110,8 +132,12 @@ class StudentClassroomView(APIView):
 
     def get(self, request, student_id):
         try:
-            classrooms = Classroom.objects.filter(batches__students__id=student_id,is_archived=False).distinct()
-            serializer = ClassroomSerializer(classrooms, many=True)
+            # Filter through a subquery so the join does not narrow the roster counts.
+            enrolled = Classroom.objects.filter(batches__students__id=student_id).values("id")
+            classrooms = ClassroomListSerializer.setup_eager_loading(
+                Classroom.objects.filter(id__in=enrolled, is_archived=False).order_by("id")
+            )
+            serializer = ClassroomListSerializer(classrooms, many=True)
             return Response({
                 "isSuccess": True,
                 "message": None,
@@ -126,6 +152,129 @@ class StudentClassroomView(APIView):
                 "errors": [str(e)]
             }, status=status.HTTP_400_BAD_REQUEST)  
 
+class ClassroomMembersView(APIView):
+    permission_classes = [permissions.IsAuthenticated, IsClassroomMember]
+    classroom_url_kwarg = 'id'
+    pagination_class = MemberCursorPagination
+
+    @staticmethod
+    def get_queryset(classroom_id):
+        # A student belongs to one batch, so the batch join cannot produce duplicates.
+        return Student.objects.filter(batch__classrooms__id=classroom_id).select_related(
+            'user', 'batch__department'
+        )
+
+    def get(self, request, id):
+        get_object_or_404(Classroom.objects.only('id'), id=id)
+        members = self.get_queryset(id)
+
+        statuses = [value for value in request.query_params.get('academic_status', '').split(',') if value]
+        if statuses:
+            valid = {choice for choice, _ in Student.ACADEMIC_STATUS_CHOICES}
+            invalid = [value for value in statuses if value not in valid]
+            if invalid:
+                return Response({
+                    "isSuccess": False,
+                    "message": "Invalid academic status.",
+                    "data": None,
+                    "errors": [f"Unknown academic status: {', '.join(invalid)}"]
+                }, status=status.HTTP_400_BAD_REQUEST)
+            members = members.filter(academic_status__in=statuses)
+
+        fields = [value for value in request.query_params.get('fields', '').split(',') if value]
+        paginator = self.pagination_class()
+        page = paginator.paginate_queryset(members, request, view=self)
+        try:
+            serializer = ClassroomMemberSerializer(page, many=True, fields=fields)
+        except ValueError as e:
+            return Response({
+                "isSuccess": False,
+                "message": "Invalid fields.",
+                "data": None,
+                "errors": [str(e)]
+            }, status=status.HTTP_400_BAD_REQUEST)
+        return paginator.get_paginated_response(serializer.data)
+
+
+class ClassroomMessageHistoryView(APIView):
+    """
+    Chat history, newest first, paged back with the ``before`` cursor. With
+    ``since=<message id>`` it returns the messages written after that one instead,
+    in the order they were written, for catching up after a reconnect; repeat with
+    the last id while ``hasMore``. Both include the caller's read watermark and
+    unread count.
+    """
+    permission_classes = [permissions.IsAuthenticated, IsClassroomMember]
+    pagination_class = MessageCursorPagination
+
+    @staticmethod
+    def read_state(user_id, classroom_id):
+        marks = ChatReadWatermark.marks_for(user_id, [classroom_id])
+        mark = marks.get(classroom_id)
+        return {
+            "watermark": {"lastReadMessageId": mark[1], "lastReadAt": mark[0]} if mark else None,
+            "unreadCount": ChatReadWatermark.unread_counts(user_id, [classroom_id], marks=marks)[classroom_id],
+        }
+
+    @staticmethod
+    def written_at(messages, message_id):
+        """When ``message_id`` was written, waiting briefly for one that may still be queued."""
+        lookup = messages.filter(id=message_id).values_list('written_at', flat=True)
+        written_at = lookup.first()
+        if written_at is not None:
+            return written_at
+        # Clients anchor on ids they got over the socket, which are broadcast before
+        # they are written: flush this process's chat writers and give other
+        # workers' queues a moment to drain.
+        wait = getattr(settings, 'CHAT_HISTORY_ANCHOR_WAIT_MS', 500) / 1000
+        deadline = time.monotonic() + wait
+        MessageWriter.flush_all_from_thread(wait)
+        while True:
+            written_at = lookup.first()
+            if written_at is not None or time.monotonic() >= deadline:
+                return written_at
+            time.sleep(ANCHOR_POLL_INTERVAL)
+
+    def get(self, request, classroom_id):
+        messages = Message.objects.filter(classroom_id=classroom_id, timestamp__isnull=False)
+        paginator = self.pagination_class()
+
+        since = request.query_params.get('since')
+        if since is None:
+            page = paginator.paginate_queryset(messages, request, view=self)
+            return paginator.get_paginated_response(
+                MessageSerializer(page, many=True).data, **self.read_state(request.user.id, classroom_id)
+            )
+
+        messages = messages.filter(written_at__isnull=False)
+        anchor = self.written_at(messages, int(since)) if since.isdigit() else None
+        if anchor is None:
+            return Response({
+                "isSuccess": False,
+                "message": "Unknown message.",
+                "data": None,
+                "errors": [f"No message {since} in this classroom."]
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        # Anchored on write order, not timestamps: a message another worker wrote
+        # after the anchor can carry an earlier timestamp and must not be skipped.
+        limit = paginator.get_page_size(request)
+        newer = list(
+            messages.filter(Q(written_at__gt=anchor) | Q(written_at=anchor, id__gt=int(since)))
+            .order_by('written_at', 'id')[:limit + 1]
+        )
+        return Response({
+            "isSuccess": True,
+            "message": None,
+            "data": {
+                "results": MessageSerializer(newer[:limit], many=True).data,
+                "hasMore": len(newer) > limit,
+                **self.read_state(request.user.id, classroom_id),
+            },
+            "errors": None
+        })
+
+
 class AddBatchView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
@@ -152,16 +301,11 @@ class SearchClassroomView(APIView):
     def get(self, request):
         try:  
             query = request.query_params.get('query', '')
-            classrooms = Classroom.objects.filter(
-                Q(name__icontains=query) | Q(course_no__icontains=query)
-            )
-            serializer = ClassroomSerializer(classrooms, many=True)
-            return Response({
-                "isSuccess": True,
-                "message": None,
-                "data": serializer.data,
-                "errors": None
-            })
+            classrooms = ClassroomListSerializer.setup_eager_loading(ClassroomSearch.search(query))
+            paginator = SearchPagination()
+            page = paginator.paginate_queryset(classrooms, request, view=self)
+            serializer = ClassroomListSerializer(page, many=True)
+            return paginator.get_paginated_response(serializer.data)
         except Exception as e:
             return Response({
                 "isSuccess": False,
@@ -170,32 +314,112 @@ class SearchClassroomView(APIView):
                 "errors": [str(e)]
             }, status=status.HTTP_400_BAD_REQUEST)
 
+def parse_id_list(value):
+    """Ids from a JSON list or a comma-separated string; ValueError on anything else."""
+    if value in (None, ''):
+        return []
+    if isinstance(value, str):
+        value = value.split(',')
+    if not isinstance(value, (list, tuple)):
+        raise ValueError("Expected a list of ids.")
+    return [int(item) for item in value]
+
+
+def roster_error(message, errors, status_code=status.HTTP_400_BAD_REQUEST):
+    return Response({
+        "isSuccess": False,
+        "message": message,
+        "data": None,
+        "errors": errors
+    }, status=status_code)
+
+
 class AddStudentView(APIView):
+    """
+    Enroll whole batches (``batchIds``, or the legacy ``batch`` year/section/department)
+    and, optionally, move ``studentIds`` into that ``batch``, in one transaction.
+    Students already in another batch would leave every classroom linked to it, so
+    they are rejected unless ``moveStudents`` is true.
+    """
     permission_classes = [permissions.IsAuthenticated]
+
     def post(self, request):
+        classroom = get_object_or_404(Classroom, id=request.data.get('classRoomId'))
+        try:
+            batch_ids = parse_id_list(request.data.get('batchIds'))
+            student_ids = parse_id_list(request.data.get('studentIds'))
+        except (TypeError, ValueError):
+            return roster_error("Invalid request.", ["batchIds and studentIds must be lists of ids."])
+
+        target_batch_id = None
         rqbatch = request.data.get('batch')
-        batch = Batch.objects.filter(year=rqbatch['year'], section=rqbatch['section'], department=rqbatch['department']).first()
-        students = Student.objects.filter(batch=batch)
-        classroom_id = request.data.get('classRoomId')
-        classroom = get_object_or_404(Classroom, id=classroom_id)
-        
-        for student in students:
-            classroom.students.add(student)
-        
-        return Response({'detail': 'Student added successfully.'})
+        if rqbatch:
+            target_batch_id = Batch.objects.filter(
+                year=rqbatch.get('year'), section=rqbatch.get('section'), department=rqbatch.get('department')
+            ).values_list('id', flat=True).first()
+            if target_batch_id is None:
+                return roster_error("Batch not found.", ["No batch matches the given year, section and department."],
+                                    status.HTTP_404_NOT_FOUND)
+        if student_ids and target_batch_id is None:
+            return roster_error("Invalid request.", ["studentIds need a target batch."])
+        if not (batch_ids or student_ids or target_batch_id):
+            return roster_error("Invalid request.", ["Nothing to add."])
+
+        unknown_batches = set(batch_ids) - set(Batch.objects.filter(id__in=batch_ids).values_list('id', flat=True))
+        unknown_students = set(student_ids) - set(Student.objects.filter(id__in=student_ids).values_list('id', flat=True))
+        if unknown_batches or unknown_students:
+            return roster_error("Unknown batches or students.", {
+                "batchIds": sorted(unknown_batches),
+                "studentIds": sorted(unknown_students),
+            }, status.HTTP_404_NOT_FOUND)
+
+        move = request.data.get('moveStudents') is True
+        if student_ids and not move:
+            batched = Student.objects.filter(id__in=student_ids, batch__isnull=False).exclude(batch_id=target_batch_id)
+            batched = sorted(batched.values_list('id', flat=True))
+            if batched:
+                return roster_error(
+                    "Students already belong to another batch.",
+                    {"studentIds": batched, "detail": "Set moveStudents to move them out of their current batch."},
+                    status.HTTP_409_CONFLICT,
+                )
+
+        counts = ClassroomRoster.enroll(
+            classroom, batch_ids, student_ids, target_batch_id=target_batch_id, sender=request.user, move=move
+        )
+        return Response({
+            "isSuccess": True,
+            "message": "Students added successfully.",
+            "data": counts,
+            "errors": None
+        })
 
 class RemoveStudentView(APIView):
+    """
+    Remove ``studentIds`` (or the legacy single ``studentId``) and whole ``batchIds``
+    from a classroom in one transaction.
+    """
     permission_classes = [permissions.IsAuthenticated]
 
     def delete(self, request):
-        student_id = request.query_params.get('studentId')
-        classroom_id = request.query_params.get('classroomId')
-        classroom = get_object_or_404(Classroom, id=classroom_id)
-        student = get_object_or_404(Student, id=student_id)
-        for batch in classroom.batches.all():
-            batch.students.remove(student)
-        # Optionally publish event here
-        return Response({'detail': 'Student removed successfully.'})
+        params = request.query_params
+        classroom = get_object_or_404(Classroom, id=params.get('classroomId') or request.data.get('classroomId'))
+        try:
+            student_ids = parse_id_list(request.data.get('studentIds') or params.get('studentIds'))
+            student_ids += parse_id_list(params.get('studentId'))
+            batch_ids = parse_id_list(request.data.get('batchIds') or params.get('batchIds'))
+        except (TypeError, ValueError):
+            return roster_error("Invalid request.", ["batchIds and studentIds must be lists of ids."])
+        if not (student_ids or batch_ids):
+            return roster_error("Invalid request.", ["Nothing to remove."])
+
+        counts = ClassroomRoster.remove(classroom, batch_ids, student_ids, sender=request.user)
+        return Response({
+            "isSuccess": True,
+            "message": "Students removed successfully.",
+            "data": counts,
+            "errors": None
+        })
     
 class DepartmentListCreateView(APIView):
     permission_classes = [permissions.AllowAny]
@@ -238,7 +462,9 @@ class AnnouncementListCreateView(APIView):
 
     def get(self, request, class_room_id):
         classroom = get_object_or_404(Classroom, id=class_room_id)
-        announcements = Announcement.objects.filter(class_room=classroom).order_by('created_at')
+        announcements = AnnouncementSerializer.setup_eager_loading(
+            Announcement.objects.filter(class_room=classroom).order_by('created_at')
+        )
         serializer = AnnouncementSerializer(announcements, many=True)
         
         response_data = {
@@ -277,7 +503,9 @@ class AnnouncementDetailView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def get(self, request, class_room_id, id):
-        announcement = get_object_or_404(Announcement, id=id, class_room_id=class_room_id)
+        announcement = get_object_or_404(
+            AnnouncementSerializer.setup_eager_loading(Announcement.objects.all()), id=id, class_room_id=class_room_id
+        )
         serializer = AnnouncementSerializer(announcement)
         
         response_data = {
@@ -348,10 +576,14 @@ class AttachmentView(APIView):
                     "errors": ["File size exceeds 10MB limit"]
                 }, status=status.HTTP_400_BAD_REQUEST)
 
-            attachment = Attachment.objects.create(
-                announcement=announcement,
-                file=file
-            )
+            with transaction.atomic():
+                blob = BlobStore.store(file)
+                attachment = Attachment.objects.create(
+                    announcement=announcement,
+                    file=blob.file.name,
+                    blob=blob,
+                    original_name=file.name[:255]
+                )
 
             return Response({
                 "isSuccess": True,
@@ -369,12 +601,113 @@ class AttachmentView(APIView):
                 "errors": [str(e)]
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
         
+def upload_error(error, status_code=status.HTTP_400_BAD_REQUEST):
+    return Response({
+        "isSuccess": False,
+        "message": "Upload failed",
+        "data": None,
+        "errors": [error]
+    }, status=status_code)
+
+
+def get_upload(request, upload_id):
+    return get_object_or_404(
+        AttachmentUpload.objects.select_related('announcement'), id=upload_id, uploader=request.user
+    )
+
+
+class AttachmentUploadStartView(APIView):
+    """
+    Start a resumable upload: POST {filename, size, chunkSize?, sha256?}. Chunks then
+    go to AttachmentUploadChunkView and the upload ends with AttachmentUploadCompleteView.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request, class_room_id, id):
+        announcement = get_object_or_404(Announcement, id=id, class_room_id=class_room_id)
+        try:
+            upload = ChunkedUploads.start(
+                announcement,
+                request.user,
+                str(request.data.get('filename') or ''),
+                int(request.data.get('size')),
+                chunk_size=int(request.data.get('chunkSize') or 0) or None,
+                sha256=str(request.data.get('sha256') or ''),
+            )
+        except (TypeError, ValueError):
+            return upload_error("size and chunkSize must be integers.")
+        except UploadError as e:
+            return upload_error(str(e))
+        return Response({
+            "isSuccess": True,
+            "message": "Upload started",
+            "data": ChunkedUploads.status(upload),
+            "errors": None
+        }, status=status.HTTP_201_CREATED)
+
+
+class AttachmentUploadStatusView(APIView):
+    """Which chunks have arrived, so an interrupted client resumes with the missing ones."""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, upload_id):
+        upload = get_upload(request, upload_id)
+        return Response({
+            "isSuccess": True,
+            "message": None,
+            "data": ChunkedUploads.status(upload),
+            "errors": None
+        })
+
+
+class AttachmentUploadChunkView(APIView):
+    """
+    PUT the raw bytes of chunk ``index`` as the request body, optionally with an
+    X-Chunk-SHA256 header. The body is streamed to disk, never parsed or buffered.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def put(self, request, upload_id, index):
+        upload = get_upload(request, upload_id)
+        try:
+            checksum = ChunkedUploads.write_chunk(
+                upload, index, request._request, expected_sha256=request.headers.get('X-Chunk-SHA256')
+            )
+        except UploadError as e:
+            return upload_error(str(e))
+        return Response({
+            "isSuccess": True,
+            "message": "Chunk stored",
+            "data": {"index": index, "sha256": checksum},
+            "errors": None
+        })
+
+
+class AttachmentUploadCompleteView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request, upload_id):
+        upload = get_upload(request, upload_id)
+        try:
+            attachment = ChunkedUploads.complete(upload)
+        except UploadError as e:
+            return upload_error(str(e))
+        return Response({
+            "isSuccess": True,
+            "message": "Attachment created successfully",
+            "data": AttachmentSerializer(attachment).data,
+            "errors": None
+        }, status=status.HTTP_201_CREATED)
+
+
 class AttachmentDownloadView(APIView):
     permission_classes = [permissions.IsAuthenticated]
     def get(self, request, class_room_id, id, attachment_id):
         try:
             announcement = get_object_or_404(Announcement, id=id, class_room_id=class_room_id)
-            attachment = get_object_or_404(Attachment, id=attachment_id, announcement=announcement)
+            attachment = get_object_or_404(
+                Attachment.objects.select_related('blob'), id=attachment_id, announcement=announcement
+            )
 
             if not attachment.file:
                 return Response({
@@ -385,8 +718,8 @@ class AttachmentDownloadView(APIView):
                 }, status=status.HTTP_404_NOT_FOUND)
 
             file_obj = attachment.file
-            original_filename = "attachment"
-            if file_obj.name:
+            original_filename = attachment.original_name or "attachment"
+            if file_obj.name and not attachment.original_name:
                 try:
                     original_filename = os.path.basename(file_obj.name)
                 except:
@@ -414,8 +747,15 @@ class AttachmentDownloadView(APIView):
                 mime_type = 'application/vndxmlformats-officedocument.spreadsheetml.sheet'
 
             try:
-                file = file_obj.open('rb')
-            except Exception as e:
+                modified_at = file_obj.storage.get_modified_time(file_obj.name)
+            except (NotImplementedError, OSError):
+                modified_at = attachment.updated_at or attachment.created_at
+
+            try:
+                # Blob content never changes, so its hash is the strongest validator.
+                etag = f'"{attachment.blob.sha256}"' if attachment.blob_id else None
+                return serve_file(request, file_obj, original_filename, mime_type, modified_at, etag=etag)
+            except OSError as e:
                 return Response({
                     "isSuccess": False,
                     "message": "Could not open file",
@@ -423,12 +763,6 @@ class AttachmentDownloadView(APIView):
                     "errors": [str(e)]
                 }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-            response = FileResponse(file, content_type=mime_type)
-            response['Content-Disposition'] = f'attachment; filename="{original_filename}"'
-            response['Content-Length'] = file_obj.size
-
-            return response
-
         except Exception as e:
             print(f"Error downloading file: {str(e)}")  # Debug log
             return Response({
@@ -449,7 +783,9 @@ class AttachmentDeleteView(APIView):
                 id=attachment_id
             )
             
-            attachment.file.delete(save=False)
+            # Blob-backed files may be shared; deleting the row releases the reference.
+            if attachment.blob_id is None:
+                attachment.file.delete(save=False)
             attachment.delete()
             
             return Response({
@@ -474,7 +810,7 @@ class ArchiveClassroomAPIView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def post(self, request, pk):
-        classroom = get_object_or_404(Classroom, pk=pk)
+        classroom = get_object_or_404(ClassroomSerializer.setup_eager_loading(Classroom.objects.all()), pk=pk)
         if classroom.is_archived:
             return Response({
                 "isSuccess": False,
@@ -499,7 +835,7 @@ class UnarchiveClassroomAPIView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def post(self, request, pk):
-        classroom = get_object_or_404(Classroom, pk=pk)
+        classroom = get_object_or_404(ClassroomSerializer.setup_eager_loading(Classroom.objects.all()), pk=pk)
         if not classroom.is_archived:
             return Response({
                 "isSuccess": False,
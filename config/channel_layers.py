@@ -0,0 +1,250 @@
+"""
+A channel layer that fans group messages out across worker processes on one host
+through a small Unix-domain-socket hub (``manage.py run_channel_hub``), so several
+daphne/uvicorn workers can serve the same chat rooms without Redis.
+
+Each worker keeps its own sockets' channels and groups in the inherited in-memory
+layer and tells the hub which groups it has members in. A ``group_send`` is
+delivered locally at once and relayed by the hub to the other subscribed workers;
+a ``send`` to another worker's channel is routed by the client id embedded in the
+channel name. While the hub is unreachable the layer keeps working as a plain
+in-memory layer and retries in the background.
+"""
+import asyncio
+import logging
+import os
+import struct
+import time
+import uuid
+
+import msgpack
+from channels.exceptions import ChannelFull
+from channels.layers import InMemoryChannelLayer
+
+logger = logging.getLogger(__name__)
+
+HEADER = struct.Struct(">I")
+MAX_FRAME_SIZE = 16 * 1024 * 1024
+# A worker whose unsent backlog grows past this is disconnected rather than
+# letting one stalled process hold memory in the hub.
+MAX_CLIENT_BACKLOG = 64 * 1024 * 1024
+
+
+def encode_frame(frame):
+    payload = msgpack.packb(frame, use_bin_type=True)
+    return HEADER.pack(len(payload)) + payload
+
+
+async def read_frame(reader):
+    header = await reader.readexactly(HEADER.size)
+    (length,) = HEADER.unpack(header)
+    if length > MAX_FRAME_SIZE:
+        raise ValueError(f"Frame of {length} bytes exceeds the limit.")
+    return msgpack.unpackb(await reader.readexactly(length), raw=False)
+
+
+def client_id_of(channel):
+    """The worker id in a process-specific channel name, or None for general channels."""
+    if "!" not in channel:
+        return None
+    return channel.split("!", 1)[0].rsplit(".", 1)[-1]
+
+
+class UnixSocketChannelLayer(InMemoryChannelLayer):
+    def __init__(self, path="/tmp/plp-channel-hub.sock", reconnect_interval=1.0, **kwargs):
+        super().__init__(**kwargs)
+        self.path = path
+        self.reconnect_interval = reconnect_interval
+        self.client_id = uuid.uuid4().hex[:12]
+        self._loop = None
+        self._writer = None
+        self._reader_task = None
+        self._connect_lock = None
+        self._next_attempt = 0.0
+        self._warned = False
+
+    async def new_channel(self, prefix="specific."):
+        channel = await super().new_channel(prefix)
+        return channel.replace(".inmemory!", f".{self.client_id}!", 1)
+
+    def is_local(self, channel):
+        client_id = client_id_of(channel)
+        return client_id is None or client_id in (self.client_id, "inmemory")
+
+    # Hub connection
+
+    async def _connection(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # async_to_sync callers may hand us a fresh event loop.
+            self._loop, self._writer, self._reader_task = loop, None, None
+            self._connect_lock = asyncio.Lock()
+        if self._writer is not None and not self._writer.is_closing():
+            return self._writer
+        if time.monotonic() < self._next_attempt:
+            return None
+        async with self._connect_lock:
+            if self._writer is not None and not self._writer.is_closing():
+                return self._writer
+            try:
+                reader, writer = await asyncio.open_unix_connection(self.path)
+            except OSError as e:
+                self._next_attempt = time.monotonic() + self.reconnect_interval
+                if not self._warned:
+                    logger.warning("Channel hub at %s unavailable (%s); delivering locally only.", self.path, e)
+                    self._warned = True
+                return None
+            # Announce ourselves and resubscribe whatever groups we already serve.
+            writer.write(encode_frame({"op": "hello", "client": self.client_id}))
+            for group in self.groups:
+                writer.write(encode_frame({"op": "subscribe", "group": group}))
+            await writer.drain()
+            self._writer = writer
+            self._warned = False
+            self._reader_task = loop.create_task(self._read(reader, writer))
+            return writer
+
+    async def _publish(self, frame):
+        writer = await self._connection()
+        if writer is None:
+            return False
+        try:
+            writer.write(encode_frame(frame))
+            await writer.drain()
+        except (ConnectionError, OSError):
+            self._drop(writer)
+            return False
+        return True
+
+    def _drop(self, writer):
+        if self._writer is writer:
+            self._writer = None
+        writer.close()
+
+    async def _read(self, reader, writer):
+        try:
+            while True:
+                frame = await read_frame(reader)
+                try:
+                    if frame["op"] == "group_send":
+                        await InMemoryChannelLayer.group_send(self, frame["group"], frame["message"])
+                    elif frame["op"] == "send":
+                        await InMemoryChannelLayer.send(self, frame["channel"], frame["message"])
+                except ChannelFull:
+                    pass
+        except (asyncio.IncompleteReadError, ConnectionError, OSError, ValueError):
+            if self._writer is writer:
+                logger.warning("Lost connection to channel hub at %s.", self.path)
+        finally:
+            self._drop(writer)
+
+    # Channel layer API
+
+    async def send(self, channel, message):
+        if self.is_local(channel):
+            return await super().send(channel, message)
+        assert isinstance(message, dict), "message is not a dict"
+        self.require_valid_channel_name(channel)
+        await self._publish({"op": "send", "channel": channel, "message": message})
+
+    async def group_add(self, group, channel):
+        first = group not in self.groups
+        await super().group_add(group, channel)
+        if first:
+            await self._publish({"op": "subscribe", "group": group})
+
+    async def group_discard(self, group, channel):
+        await super().group_discard(group, channel)
+        if group not in self.groups:
+            await self._publish({"op": "unsubscribe", "group": group})
+
+    async def group_send(self, group, message):
+        await super().group_send(group, message)
+        await self._publish({"op": "group_send", "group": group, "message": message})
+
+    async def close(self):
+        if self._writer is not None:
+            self._drop(self._writer)
+        if self._reader_task is not None:
+            await asyncio.gather(self._reader_task, return_exceptions=True)
+            self._reader_task = None
+
+
+class ChannelHub:
+    """The relay process: tracks which workers serve which groups and forwards frames."""
+
+    def __init__(self, path):
+        self.path = path
+        self.clients = {}
+        self.groups = {}
+        self.handlers = {}
+        self.server = None
+        self.closing = False
+
+    async def serve(self):
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self.server = await asyncio.start_unix_server(self.handle, path=self.path)
+        os.chmod(self.path, 0o660)
+        return self.server
+
+    async def close(self):
+        """Stop accepting workers, disconnect the connected ones and wait for their handlers."""
+        self.server.close()
+        self.closing = True
+        # Let handlers for just-accepted connections start and register.
+        await asyncio.sleep(0)
+        for writer in list(self.handlers):
+            writer.close()
+        await asyncio.gather(*self.handlers.values(), return_exceptions=True)
+        await self.server.wait_closed()
+
+    def forward(self, writer, frame):
+        if writer.is_closing():
+            return
+        if writer.transport.get_write_buffer_size() > MAX_CLIENT_BACKLOG:
+            logger.warning("Dropping a channel hub client that stopped reading.")
+            writer.close()
+            return
+        writer.write(encode_frame(frame))
+
+    async def handle(self, reader, writer):
+        if self.closing:
+            writer.close()
+            return
+        self.handlers[writer] = asyncio.current_task()
+        client_id = None
+        try:
+            while True:
+                frame = await read_frame(reader)
+                op = frame.get("op")
+                if op == "hello":
+                    client_id = frame["client"]
+                    self.clients[client_id] = writer
+                elif op == "subscribe":
+                    self.groups.setdefault(frame["group"], set()).add(writer)
+                elif op == "unsubscribe":
+                    members = self.groups.get(frame["group"])
+                    if members is not None:
+                        members.discard(writer)
+                        if not members:
+                            del self.groups[frame["group"]]
+                elif op == "group_send":
+                    for member in list(self.groups.get(frame["group"], ())):
+                        if member is not writer:
+                            self.forward(member, frame)
+                elif op == "send":
+                    target = self.clients.get(client_id_of(frame["channel"]))
+                    if target is not None:
+                        self.forward(target, frame)
+        except (asyncio.IncompleteReadError, ConnectionError, OSError, ValueError):
+            pass
+        finally:
+            if client_id is not None and self.clients.get(client_id) is writer:
+                del self.clients[client_id]
+            for group in [group for group, members in self.groups.items() if writer in members]:
+                self.groups[group].discard(writer)
+                if not self.groups[group]:
+                    del self.groups[group]
+            self.handlers.pop(writer, None)
+            writer.close()
@@ -152,12 +152,43 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
-CHANNEL_LAYERS = {
+# Local memory by default; point CACHE_BACKEND at e.g.
+# django.core.cache.backends.filebased.FileBasedCache (with CACHE_LOCATION set to a
+# directory) to share cached payloads between worker processes on one host.
+CACHES = {
     "default": {
-        "BACKEND": "channels.layers.InMemoryChannelLayer",
-    },
+        "BACKEND": config("CACHE_BACKEND", default="django.core.cache.backends.locmem.LocMemCache"),
+        "LOCATION": config("CACHE_LOCATION", default="plp-default"),
+    }
 }
 
+# In-memory unless CHANNEL_HUB_SOCKET is set; then group broadcasts reach every
+# worker process on the host through the hub started by `manage.py run_channel_hub`.
+CHANNEL_HUB_SOCKET = config("CHANNEL_HUB_SOCKET", default="")
+
+if CHANNEL_HUB_SOCKET:
+    CHANNEL_LAYERS = {
+        "default": {
+            "BACKEND": "config.channel_layers.UnixSocketChannelLayer",
+            "CONFIG": {"path": CHANNEL_HUB_SOCKET},
+        },
+    }
+else:
+    CHANNEL_LAYERS = {
+        "default": {
+            "BACKEND": "channels.layers.InMemoryChannelLayer",
+        },
+    }
+
+# Chat messages are broadcast at once and written in batches by each worker.
+CHAT_WRITE_BEHIND_INTERVAL_MS = config("CHAT_WRITE_BEHIND_INTERVAL_MS", default=50, cast=int)
+CHAT_WRITE_BEHIND_BATCH_SIZE = config("CHAT_WRITE_BEHIND_BATCH_SIZE", default=200, cast=int)
+CHAT_WRITE_BEHIND_MAX_PENDING = config("CHAT_WRITE_BEHIND_MAX_PENDING", default=5000, cast=int)
+# How long chat catch-up waits for an anchor message that is still queued.
+CHAT_HISTORY_ANCHOR_WAIT_MS = config("CHAT_HISTORY_ANCHOR_WAIT_MS", default=500, cast=int)
+# Read receipts are merged into per-user watermarks and announced once per interval.
+CHAT_READ_RECEIPT_INTERVAL_MS = config("CHAT_READ_RECEIPT_INTERVAL_MS", default=1000, cast=int)
+
 ASGI_APPLICATION = "config.asgi.application"
 
 # Internationalization
@@ -183,6 +214,12 @@ STATICFILES_STORAGE = "whitenoise.storage.CompressedManifestStaticFilesStorage"
 MEDIA_URL = "/media/"
 MEDIA_ROOT = BASE_DIR / "media"
 
+# Let the front proxy send attachment bytes: "x-accel-redirect" (nginx, with an
+# internal location at ATTACHMENT_SENDFILE_PREFIX aliased to MEDIA_ROOT) or
+# "x-sendfile" (Apache/lighttpd). Unset, Django streams the file itself.
+ATTACHMENT_SENDFILE_BACKEND = config("ATTACHMENT_SENDFILE_BACKEND", default=None)
+ATTACHMENT_SENDFILE_PREFIX = config("ATTACHMENT_SENDFILE_PREFIX", default="/protected-media/")
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
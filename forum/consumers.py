@@ -4,6 +4,7 @@ from channels.db import database_sync_to_async
 from .models import ForumMessage
 from classrooms.models import Classroom
 from django.contrib.auth import get_user_model
+from users.display_names import DisplayNames
 
 User = get_user_model()
 
@@ -64,7 +65,7 @@ class ForumConsumer(AsyncWebsocketConsumer):
     @database_sync_to_async
     def edit_message(self, message_id, sender_id, new_content):
         try:
-            message = ForumMessage.objects.get(id=message_id, sender_id=sender_id)
+            message = ForumMessage.objects.select_related('sender').get(id=message_id, sender_id=sender_id)
             message.content = new_content
             message.save()
             return message
@@ -75,22 +76,16 @@ class ForumConsumer(AsyncWebsocketConsumer):
     @database_sync_to_async
     def serialize_message(self, forum_message):
         sender = forum_message.sender
-        role = sender.role
-        first_name = last_name = None
-
-        if role == "teacher" and hasattr(sender, "teacher_profile"):
-            first_name = sender.teacher_profile.first_name
-            last_name = sender.teacher_profile.last_name
-        elif role == "student" and hasattr(sender, "student_profile"):
-            first_name = sender.student_profile.first_name
-            last_name = sender.student_profile.last_name
+        names = DisplayNames.get(sender.id) or {}
+        first_name = names.get("first_name")
+        last_name = names.get("last_name")
 
         return {
             "id": forum_message.id,
             "content": forum_message.content,
             "timestamp": forum_message.timestamp.isoformat(),
             "updatedAt": forum_message.updatedAt.isoformat(),
-            "classroom": forum_message.classroom.id,
+            "classroom": forum_message.classroom_id,
             "sender": {
                 "id": sender.id,
                 "email": sender.email,
@@ -2,6 +2,7 @@
 from rest_framework import serializers
 from .models import ForumMessage
 from django.contrib.auth import get_user_model
+from users.display_names import DisplayNameListSerializer
 from users.serializers import UserProfileSerializer
 
 User = get_user_model()
@@ -12,4 +13,5 @@ class ForumMessageSerializer(serializers.ModelSerializer):
     class Meta:
         model = ForumMessage
         fields = '__all__'
-        read_only_fields = ['classroom', 'sender', 'created_at', 'updatedAt']
\ No newline at end of file
+        read_only_fields = ['classroom', 'sender', 'created_at', 'updatedAt']
+        list_serializer_class = DisplayNameListSerializer
\ No newline at end of file
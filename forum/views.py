@@ -10,7 +10,7 @@ class ForumMessageListCreateAPIView(APIView):
 
     def get(self, request, classroom_id):
         try:
-            messages = ForumMessage.objects.filter(classroom_id=classroom_id).order_by('updatedAt')
+            messages = ForumMessage.objects.filter(classroom_id=classroom_id).select_related('sender').order_by('updatedAt')
             serializer = ForumMessageSerializer(messages, many=True)
             return success_response(data=serializer.data)
         except Exception as e:
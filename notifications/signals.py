@@ -20,7 +20,7 @@ def create_announcement_notification(sender, instance, created, **kwargs):
             message=f"New announcement in {instance.class_room.name}: {instance.title}",
             url=f"/student/classroom/{instance.class_room.id}/announcement"
         )
-        recipients = classroom.get_all_student().values_list('user', flat=True)
+        recipients = classroom.student_user_ids()
         notification.recipients.add(*recipients)
 
 @receiver(post_save, sender=Classroom)
@@ -34,7 +34,7 @@ def create_classroom_notification(sender,instance,created,**kwargs):
         message=f"New classroom : {instance.name} created",
         url=f"/student/classroom/classroom-list"
           )
-        recipients = instance.get_all_student().values_list('user', flat=True)
+        recipients = instance.student_user_ids()
         notification.recipients.add(*recipients)
 @receiver(post_save, sender=Attachment)
 def create_attachment_notification(sender,instance,created,**kwargs):
@@ -49,7 +49,7 @@ def create_attachment_notification(sender,instance,created,**kwargs):
         message=f"New Attachment in {announcement.title} is added",
         url=f"/student/classroom/{classroom.id}/announcement"
           )
-        recipients = classroom.get_all_student().values_list('user', flat=True)
+        recipients = classroom.student_user_ids()
         notification.recipients.add(*recipients)
 @receiver(post_save, sender=Assessment)
 def notify_on_assessment_publish(sender, instance, created, **kwargs):
@@ -63,7 +63,7 @@ def notify_on_assessment_publish(sender, instance, created, **kwargs):
             message=f"New assessment published in {classroom.name}: {instance.name}",
             url=f"/student/classroom/{classroom.id}/assessment"
         )
-        recipients = classroom.get_all_student().values_list('user', flat=True)
+        recipients = classroom.student_user_ids()
         notification.recipients.add(*recipients)
 
     # If updated and just now published (was unpublished before)
@@ -77,7 +77,7 @@ def notify_on_assessment_publish(sender, instance, created, **kwargs):
                 message=f"Assessment now published in {classroom.name}: {instance.name}",
                 url=f"/student/classroom/{classroom.id}/assessment"
             )
-            recipients = classroom.get_all_student().values_list('user', flat=True)
+            recipients = classroom.student_user_ids()
             notification.recipients.add(*recipients)
 @receiver(post_save, sender=Submission)
 def notify_teacher_on_submission(sender, instance, created, **kwargs):
@@ -103,7 +103,7 @@ def notify_classroom_on_forum_message(sender, instance, created, **kwargs):
         return 
     classroom = instance.classroom
     sender_user = instance.sender
-    students_users = classroom.get_all_student().values_list('user', flat=True)
+    students_users = classroom.student_user_ids()
     teacher_user_id = classroom.teacher.user.id if hasattr(classroom.teacher, 'user') else None
     recipient_ids = set(students_users)
     if teacher_user_id:
@@ -0,0 +1,131 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import cache
+from django.db.models.manager import BaseManager
+from rest_framework import serializers
+
+from .models import User
+
+DISPLAY_NAME_CACHE_TIMEOUT = 60 * 60
+LOCAL_TTL = 60
+LOCAL_MAX_ENTRIES = 5000
+
+
+class DisplayNames:
+    """
+    Names shown next to chat and forum messages: the teacher or student profile's
+    "First Last", or the email for users without one. An LRU per process sits in
+    front of the shared cache; profile and user saves invalidate both (other
+    processes' LRU entries expire within LOCAL_TTL seconds).
+    """
+    _local = OrderedDict()
+    _lock = threading.Lock()
+
+    @staticmethod
+    def cache_key(user_id):
+        return f"user:{user_id}:display_name"
+
+    @staticmethod
+    def load(user_ids):
+        """{user_id: entry} straight from the database, in one query."""
+        rows = User.objects.filter(id__in=user_ids).values_list(
+            'id', 'email', 'role',
+            'teacher_profile__first_name', 'teacher_profile__last_name',
+            'student_profile__first_name', 'student_profile__last_name',
+        )
+        entries = {}
+        for user_id, email, role, teacher_first, teacher_last, student_first, student_last in rows:
+            first_name = last_name = None
+            if role == 'teacher' and teacher_first is not None:
+                first_name, last_name = teacher_first, teacher_last
+            elif role == 'student' and student_first is not None:
+                first_name, last_name = student_first, student_last
+            entries[user_id] = {
+                'first_name': first_name,
+                'last_name': last_name,
+                'display_name': f"{first_name} {last_name}" if first_name is not None else email,
+            }
+        return entries
+
+    @staticmethod
+    def get_many(user_ids):
+        """{user_id: {"first_name", "last_name", "display_name"}} for the users that exist."""
+        user_ids = {int(user_id) for user_id in user_ids if user_id is not None}
+        now = time.monotonic()
+        found = {}
+        with DisplayNames._lock:
+            for user_id in user_ids:
+                entry = DisplayNames._local.get(user_id)
+                if entry is not None and entry[0] > now:
+                    DisplayNames._local.move_to_end(user_id)
+                    found[user_id] = entry[1]
+
+        missing = user_ids - found.keys()
+        if missing:
+            cached = cache.get_many([DisplayNames.cache_key(user_id) for user_id in missing])
+            loaded = {}
+            for user_id in missing:
+                entry = cached.get(DisplayNames.cache_key(user_id))
+                if entry is not None:
+                    loaded[user_id] = entry
+            from_db = DisplayNames.load(missing - loaded.keys())
+            if from_db:
+                cache.set_many(
+                    {DisplayNames.cache_key(user_id): entry for user_id, entry in from_db.items()},
+                    DISPLAY_NAME_CACHE_TIMEOUT,
+                )
+            loaded.update(from_db)
+            found.update(loaded)
+
+            with DisplayNames._lock:
+                for user_id, entry in loaded.items():
+                    DisplayNames._local[user_id] = (now + LOCAL_TTL, entry)
+                    DisplayNames._local.move_to_end(user_id)
+                while len(DisplayNames._local) > LOCAL_MAX_ENTRIES:
+                    DisplayNames._local.popitem(last=False)
+        return found
+
+    @staticmethod
+    def get(user_id):
+        return DisplayNames.get_many([user_id]).get(int(user_id)) if user_id is not None else None
+
+    @staticmethod
+    def resolve(user_id):
+        entry = DisplayNames.get(user_id)
+        return entry['display_name'] if entry else None
+
+    @staticmethod
+    def resolve_many(user_ids):
+        return {user_id: entry['display_name'] for user_id, entry in DisplayNames.get_many(user_ids).items()}
+
+    @staticmethod
+    def from_context(context, user_id):
+        """The entry preloaded by ``DisplayNameListSerializer``, or a single lookup."""
+        preloaded = context.get('display_names')
+        if preloaded is not None and user_id in preloaded:
+            return preloaded[user_id]
+        return DisplayNames.get(user_id)
+
+    @staticmethod
+    def invalidate(user_ids):
+        user_ids = {int(user_id) for user_id in user_ids}
+        cache.delete_many([DisplayNames.cache_key(user_id) for user_id in user_ids])
+        with DisplayNames._lock:
+            for user_id in user_ids:
+                DisplayNames._local.pop(user_id, None)
+
+
+class DisplayNameListSerializer(serializers.ListSerializer):
+    """
+    Resolves the names of every user in the page at once and leaves them in the
+    context for ``DisplayNames.from_context``. The child serializer names the
+    attribute holding the user id in ``display_name_source`` (default ``sender_id``).
+    """
+
+    def to_representation(self, data):
+        items = list(data.all() if isinstance(data, BaseManager) else data)
+        source = getattr(self.child, 'display_name_source', 'sender_id')
+        self.context['display_names'] = DisplayNames.get_many(getattr(item, source) for item in items)
+        return super().to_representation(items)
@@ -4,6 +4,7 @@ from rest_framework_simplejwt.exceptions import AuthenticationFailed
 
 from django.contrib.auth import authenticate
 
+from .display_names import DisplayNames
 from .models import User, Teacher, Student
 from django.conf import settings
 from classrooms.models import Batch
@@ -199,16 +200,11 @@ class UserProfileSerializer(serializers.ModelSerializer):
         model = User
         fields = ['id', 'email', 'role', 'is_active', 'is_staff', 'firstName', 'lastName']
 
+    def get_names(self, obj):
+        return DisplayNames.from_context(self.context, obj.id) or {}
+
     def get_firstName(self, obj):
-        if obj.role == 'student' and hasattr(obj, 'student_profile'):
-            return obj.student_profile.first_name
-        elif obj.role == 'teacher' and hasattr(obj, 'teacher_profile'):
-            return obj.teacher_profile.first_name
-        return None
+        return self.get_names(obj).get('first_name')
 
     def get_lastName(self, obj):
-        if obj.role == 'student' and hasattr(obj, 'student_profile'):
-            return obj.student_profile.last_name
-        elif obj.role == 'teacher' and hasattr(obj, 'teacher_profile'):
-            return obj.teacher_profile.last_name
-        return None       
\ No newline at end of file
+        return self.get_names(obj).get('last_name')
@@ -0,0 +1,21 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .display_names import DisplayNames
+from .models import Student, Teacher, User
+
+
+@receiver(post_save, sender=Teacher)
+@receiver(post_delete, sender=Teacher)
+@receiver(post_save, sender=Student)
+@receiver(post_delete, sender=Student)
+def invalidate_profile_display_name(sender, instance, **kwargs):
+    DisplayNames.invalidate([instance.user_id])
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_display_name(sender, instance, update_fields=None, **kwargs):
+    # Logins only touch last_login.
+    if update_fields is not None and not {'email', 'role'} & set(update_fields):
+        return
+    DisplayNames.invalidate([instance.id])
@@ -1,3 +1,49 @@
+from django.core.cache import cache
 from django.test import TestCase
 
-# Create your tests here.
+from classrooms.models import Message
+from classrooms.serializers import MessageSerializer
+from classrooms.testing import create_classroom, create_students, create_teacher
+from .display_names import DisplayNames
+from .models import User
+
+
+class DisplayNamesTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = create_teacher()
+        cls.students = create_students(3)
+        cls.admin = User.objects.create_user(email="admin@bdu.edu.et", password="secret", role="admin")
+        cls.classroom = create_classroom(cls.teacher, "Robotics", "CS480")
+
+    def setUp(self):
+        cache.clear()
+        DisplayNames.invalidate([self.teacher.user_id, self.admin.id] + [s.user_id for s in self.students])
+
+    def test_names_are_cached_per_process_and_shared(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(DisplayNames.resolve(self.teacher.user_id), "Abebe Kebede")
+        with self.assertNumQueries(0):
+            self.assertEqual(DisplayNames.resolve(self.teacher.user_id), "Abebe Kebede")
+
+        DisplayNames._local.clear()
+        with self.assertNumQueries(0):
+            self.assertEqual(DisplayNames.resolve(self.teacher.user_id), "Abebe Kebede")
+        self.assertEqual(DisplayNames.resolve(self.admin.id), "admin@bdu.edu.et")
+
+    def test_profile_changes_invalidate_the_name(self):
+        DisplayNames.resolve(self.teacher.user_id)
+        self.teacher.first_name = "Almaz"
+        self.teacher.save()
+        self.assertEqual(DisplayNames.resolve(self.teacher.user_id), "Almaz Kebede")
+
+    def test_message_pages_resolve_all_senders_in_one_query(self):
+        senders = [self.teacher.user] + [student.user for student in self.students]
+        for i in range(12):
+            Message.objects.create(sender=senders[i % len(senders)], classroom=self.classroom, content=f"m{i}")
+
+        with self.assertNumQueries(2):
+            data = MessageSerializer(Message.objects.filter(classroom=self.classroom), many=True).data
+        self.assertEqual(data[0]["sender_name"], "Abebe Kebede")
+        self.assertEqual(data[1]["sender_name"], "S 0")
+        self.assertEqual(data[1]["sender_id"], self.students[0].user_id)